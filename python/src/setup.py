@@ -24,7 +24,8 @@ setup(
         'aws-parallelcluster==3.2.1',
         'f90nml>=1.4',
         'netCDF4>=1.5.0',
-        'matplotlib>=3.3.0',
+        'matplotlib>=3.6.0',
+        'contourpy>=1.0.1',
         'numpy==1.23.5',
         'requests>=2.20',
         'pytz>=2020.4',
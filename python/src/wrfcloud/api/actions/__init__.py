@@ -4,8 +4,8 @@ This module contains all the Action classes for the API.
 
 __all__ = ['Action', 'Login', 'ChangePassword', 'CreateUser', 'ActivateUser', 'ListUsers',
            'UpdateUser', 'DeleteUser', 'WhoAmI', 'ResetPassword', 'RefreshToken', 'GetWrfMetaData',
-           'GetWrfGeoJson', 'RunWrf', 'ListJobs', 'RequestPasswordRecoveryToken', 'ListJobs',
-           'SubscribeJobs', 'ListModelConfigurations', 'AddModelConfiguration', 'DeleteModelConfiguration',
+           'GetWrfGeoJson', 'GetWrfGeoJsonBatch', 'GetWrfTile', 'RunWrf', 'ListJobs', 'RequestPasswordRecoveryToken',
+           'ListJobs', 'SubscribeJobs', 'ListModelConfigurations', 'AddModelConfiguration', 'DeleteModelConfiguration',
            'UpdateModelConfiguration', 'DeleteCluster', 'CancelJob', 'DeleteJob', 'ListLogs', 'GetLog']
 
 from wrfcloud.api.actions.action import Action
@@ -23,6 +23,8 @@ from wrfcloud.api.actions.users import RequestPasswordRecoveryToken
 from wrfcloud.api.actions.wrf import DeleteCluster
 from wrfcloud.api.actions.wrf import GetWrfMetaData
 from wrfcloud.api.actions.wrf import GetWrfGeoJson
+from wrfcloud.api.actions.wrf import GetWrfGeoJsonBatch
+from wrfcloud.api.actions.wrf import GetWrfTile
 from wrfcloud.api.actions.wrf import RunWrf
 from wrfcloud.api.actions.jobs import ListJobs
 from wrfcloud.api.actions.jobs import SubscribeJobs
@@ -5,7 +5,7 @@ The Action base class for all other actions to extend
 from typing import List, Union
 from wrfcloud.log import Logger
 from wrfcloud.user import User
-from wrfcloud.system import get_aws_session
+from wrfcloud.system import get_aws_client
 
 
 class Action:
@@ -117,8 +117,7 @@ class Action:
         :return: Object data
         """
         # get an s3 client
-        session = get_aws_session()
-        self.s3 = session.client('s3')
+        self.s3 = get_aws_client('s3')
 
         # read the object
         key = key[1:] if key.startswith('/') else key
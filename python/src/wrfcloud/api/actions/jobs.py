@@ -6,6 +6,8 @@ from typing import List
 from wrfcloud.api.actions.action import Action
 from wrfcloud.jobs import WrfJob
 from wrfcloud.jobs import get_all_jobs_in_system
+from wrfcloud.jobs import get_user_jobs_in_system
+from wrfcloud.jobs import get_jobs_in_system_by_status
 from wrfcloud.jobs import get_job_from_system
 from wrfcloud.jobs import update_job_in_system
 from wrfcloud.jobs import delete_job_from_system
@@ -27,7 +29,7 @@ class ListJobs(Action):
         required = []
 
         # optional parameters
-        optional = ['job_id']
+        optional = ['job_id', 'user_email', 'status_code']
 
         # validate the request
         return self.check_request_fields(required, optional)
@@ -38,9 +40,15 @@ class ListJobs(Action):
         :return: True if the action ran successfully
         """
         try:
-            # get the job(s) from the system
-            jobs = get_all_jobs_in_system(full_load=False) if 'job_id' not in self.request \
-                else [get_job_from_system(self.request['job_id'])]
+            # get the job(s) from the system, using an index to find the jobs for a user or status
+            if 'job_id' in self.request:
+                jobs = [get_job_from_system(self.request['job_id'])]
+            elif 'user_email' in self.request:
+                jobs = get_user_jobs_in_system(self.request['user_email'], full_load=False)
+            elif 'status_code' in self.request:
+                jobs = get_jobs_in_system_by_status(int(self.request['status_code']), full_load=False)
+            else:
+                jobs = get_all_jobs_in_system(full_load=False)
 
             # check for the job ID not found case
             if 'job_id' in self.request and None in jobs:
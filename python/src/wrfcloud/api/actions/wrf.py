@@ -3,15 +3,29 @@ API actions that are responsible for reading WRF data
 """
 import os
 import base64
+import math
 import gzip
+import json
 import pkgutil
-from typing import Union
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Tuple, List
 from datetime import datetime, timedelta
 from pytz import utc
+from botocore.exceptions import ClientError
 from wrfcloud.api.auth import create_jwt
 from wrfcloud.api.actions.action import Action
 from wrfcloud.aws.pcluster import WrfCloudCluster, CustomAction
-from wrfcloud.jobs import WrfJob, JobDao, LatLonPoint
+from wrfcloud.jobs import WrfJob, WrfLayer, JobDao, LatLonPoint, get_job_from_system, get_all_jobs_in_system
+from wrfcloud.system import get_aws_client
+from wrfcloud.jobs.tiles import get_meters_per_pixel, get_tile_range
+
+
+# S3 bucket and key prefix of the layer files of recently read jobs, from the least to the most recently
+# used, reused across warm Lambda invocations
+_LAYER_LOCATIONS: OrderedDict[str, Tuple[str, str]] = OrderedDict()
+_MAX_LAYER_LOCATIONS: int = 1024
 
 
 class GetWrfMetaData(Action):
@@ -32,11 +46,8 @@ class GetWrfMetaData(Action):
         :return: True if the action ran successfully
         """
         try:
-            # get a data access object
-            dao = JobDao()
-
-            # get all the jobs in the system
-            jobs = dao.get_all_jobs()
+            # get all the jobs in the system, with the layers of finished jobs from the job cache
+            jobs = get_all_jobs_in_system()
 
             # add the list of jobs to the response
             self.response['jobs'] = [job.sanitized_data for job in jobs]
@@ -52,14 +63,48 @@ class GetWrfGeoJson(Action):
     """
     Get meta data for all the available WRF runs
     """
+
+    # Ways to deliver the layer data: base64 of the unzipped data in the response, base64 of the data still
+    # gzipped as it is stored in S3, or a short-lived pre-signed URL that the client reads the data from
+    DELIVERY_INLINE: str = 'inline'
+    DELIVERY_GZIP: str = 'gzip'
+    DELIVERY_URL: str = 'url'
+    DELIVERIES: List[str] = [DELIVERY_INLINE, DELIVERY_GZIP, DELIVERY_URL]
+
+    # Seconds before a pre-signed layer URL expires
+    URL_EXPIRATION: int = 300
+
     def validate_request(self) -> bool:
         """
         Validate the request object
         :return: True if the request is valid, otherwise False
         """
         required_fields = ['job_id', 'valid_time', 'variable']
-        allowed_fields = ['z_level']
-        return self.check_request_fields(required_fields, allowed_fields)
+        allowed_fields = ['z_level', 'encoding', 'zoom', 'delivery']
+        return self.check_request_fields(required_fields, allowed_fields) and self._validate_layer_options()
+
+    def _validate_layer_options(self) -> bool:
+        """
+        Validate the optional encoding, zoom, and delivery fields of the request
+        :return: True if the fields are valid, otherwise False
+        """
+        # make sure the requested encoding is supported
+        if 'encoding' in self.request and self.request['encoding'] not in WrfLayer.ENCODINGS:
+            self.errors.append(f'Invalid encoding: {self.request["encoding"]}')
+            return False
+
+        # make sure the requested delivery is supported
+        if 'delivery' in self.request and self.request['delivery'] not in GetWrfGeoJson.DELIVERIES:
+            self.errors.append(f'Invalid delivery: {self.request["delivery"]}')
+            return False
+
+        # make sure the map zoom level is a number
+        if 'zoom' in self.request and (isinstance(self.request['zoom'], bool) or
+                                       not isinstance(self.request['zoom'], (int, float))):
+            self.errors.append(f'Invalid zoom: {self.request["zoom"]}')
+            return False
+
+        return True
 
     def perform_action(self) -> bool:
         """
@@ -72,10 +117,22 @@ class GetWrfGeoJson(Action):
             valid_time: int = self.request['valid_time']
             variable: str = self.request['variable']
             z_level: int = self.request['z_level'] if 'z_level' in self.request else 0
-            data = self._read_geojson_data(job_id, valid_time, variable, z_level)
+            encoding: str = self.request['encoding'] if 'encoding' in self.request else WrfLayer.ENCODING_GEOJSON
+            zoom: Union[float, None] = self.request['zoom'] if 'zoom' in self.request else None
+            delivery: str = self.request['delivery'] if 'delivery' in self.request else GetWrfGeoJson.DELIVERY_INLINE
+            data, encoding, detail_level, density = self._read_geojson_data(job_id, valid_time, variable, z_level,
+                                                                            encoding, zoom, delivery)
             if data is None:
                 return False
-            self.response['geojson'] = base64.b64encode(data).decode()
+            if delivery == GetWrfGeoJson.DELIVERY_URL:
+                self.response['url'] = data
+                self.response['expires_in'] = GetWrfGeoJson.URL_EXPIRATION
+            else:
+                self.response['geojson'] = base64.b64encode(data).decode()
+            self.response['delivery'] = delivery
+            self.response['encoding'] = encoding
+            self.response['detail_level'] = detail_level
+            self.response['density'] = density
 
             # put the request parameters back in the response
             self.response['job_id'] = job_id
@@ -89,50 +146,432 @@ class GetWrfGeoJson(Action):
 
         return True
 
-    def _read_geojson_data(self, job_id: str, valid_time: int, variable: str, z_level: int) -> Union[bytes, None]:
+    def _read_geojson_data(self, job_id: str, valid_time: int, variable: str, z_level: int,
+                           encoding: str = WrfLayer.ENCODING_GEOJSON, zoom: Union[float, None] = None,
+                           delivery: str = DELIVERY_INLINE) -> (Union[bytes, str, None], str, str, Union[str, None]):
         """
         Read a geojson file from S3
         :param job_id: The model configuration name
         :param valid_time: The data valid time requested
         :param variable: The model variable requested
         :param z_level: Pressure level, or zero for 2D variable
-        :return: GeoJSON data as stored in S3 (probably gzipped)
+        :param encoding: Requested encoding, falls back to GeoJSON if the layer is not available in it
+        :param zoom: Map zoom level of the client, or None for the full resolution
+        :param delivery: Requested delivery, see GetWrfGeoJson.DELIVERIES
+        :return: Layer data for the delivery (see _deliver_layer), the encoding of the data, the level of
+                 detail of the data, and the density of vector data, or None if the layer has only the
+                 default density
         """
+        detail_level: str = WrfLayer.DETAIL_FULL
+        density: Union[str, None] = None
+
+        # read the layer straight from its S3 key when the request is enough to choose the file, and only
+        # load the job and its layers if the object is not there
+        if zoom is None:
+            data, resolved_encoding = self._read_resolved_layer(job_id, valid_time, variable, z_level, encoding,
+                                                                delivery)
+            if data is not None:
+                return data, resolved_encoding, detail_level, density
+
         # get the job configuration
-        dao = JobDao()
-        job: WrfJob = dao.get_job_by_id(job_id)
+        job: WrfJob = get_job_from_system(job_id)
 
         # make sure we found the right job ID
         if job is None:
             self.errors.append(f'Could not find job ID: {job_id}')
             self.log.error(f'Could not find job ID: {job_id}')
-            return None
+            return None, encoding, detail_level, density
 
         # find the requested valid time
         s3_url: Union[str, None] = None
-        for layer in job.layers:
-            match_valid_time: bool = valid_time == layer.dt
-            match_variable: bool = variable == layer.variable_name
-            match_z_level: bool = (z_level == 0 and layer.z_level is None) or z_level == layer.z_level
-            if match_valid_time and match_variable and match_z_level:
-                s3_url = layer.layer_data
-                break
+        layer = _find_layer(job, valid_time, variable, z_level)
+        if layer is not None:
+            s3_url, encoding, detail_level, density = _get_layer_url(job, layer, encoding, zoom)
 
         # make sure we found the requested valid time
         if s3_url is None:
             self.errors.append('Could not find requested data layer.')
             self.log.error(f'Could not find requested data layer: {job_id} {valid_time} {variable} {z_level}')
-            return None
+            return None, encoding, detail_level, density
 
         # get the key from the S3 url
         bucket: str = s3_url.split('/')[2]
         key: str = '/'.join(s3_url.split('/')[3:])
+        _set_layer_location(job_id, bucket, key)
+
+        # read the object from S3, or sign a URL to it
+        return self._deliver_layer(bucket, key, encoding, delivery), encoding, detail_level, density
+
+    def _read_resolved_layer(self, job_id: str, valid_time: int, variable: str, z_level: int,
+                             encoding: str, delivery: str = DELIVERY_INLINE) -> (Union[bytes, str, None], str):
+        """
+        Read a layer from the S3 key that the post-processor writes it to, without reading the job's layers
+        :param job_id: The job ID
+        :param valid_time: The data valid time requested
+        :param variable: The model variable requested
+        :param z_level: Pressure level, or zero for 2D variable
+        :param encoding: Requested encoding
+        :param delivery: Requested delivery, see GetWrfGeoJson.DELIVERIES
+        :return: Layer data for the delivery (see _deliver_layer) and its encoding, or None if the object
+                 does not exist
+        """
+        location = _get_layer_location(job_id)
+        if location is None or not isinstance(valid_time, int) or isinstance(valid_time, bool):
+            return None, encoding
+        bucket, job_prefix = location
+
+        # vector layers are only available as JSON
+        plot_type = 'vector' if variable in WrfLayer.VECTOR_VARIABLES else 'contour'
+        if plot_type == 'vector':
+            encoding = WrfLayer.ENCODING_GEOJSON
+        key = WrfLayer.get_file_name(WrfLayer.get_layer_key(job_prefix, valid_time, variable, z_level, plot_type),
+                                     encoding)
+
+        # deleting a job deletes all of its layer files, so a deleted job's layers are not found here
+        try:
+            return self._deliver_layer(bucket, key, encoding, delivery, True), encoding
+        except ClientError as e:
+            if e.response['Error']['Code'] in ['404', 'NoSuchKey', 'NotFound']:
+                self.log.debug(f'Layer is not at s3://{bucket}/{key}, reading the job instead')
+            else:
+                self.log.warn(f'Failed to read layer at s3://{bucket}/{key}, reading the job instead', e)
+            return None, encoding
+
+    def _deliver_layer(self, bucket: str, key: str, encoding: str, delivery: str,
+                       check: bool = False) -> Union[bytes, str]:
+        """
+        Read a layer file from S3, or sign a URL to it, for the requested delivery
+        :param bucket: S3 bucket of the layer file
+        :param key: S3 key of the layer file
+        :param encoding: Encoding of the layer file
+        :param delivery: Requested delivery, see GetWrfGeoJson.DELIVERIES
+        :param check: Make sure the object exists before signing a URL to it
+        :return: Layer data unzipped (inline), layer data still gzipped (gzip), or a pre-signed URL (url)
+        """
+        if delivery == GetWrfGeoJson.DELIVERY_URL:
+            return self._s3_sign(bucket, key, encoding, check)
+
+        # the whole response gets compressed again later, so only unzip the data for inline delivery
+        data = self._s3_read(bucket, key)
+        if delivery == GetWrfGeoJson.DELIVERY_GZIP:
+            return data
+        return gzip.decompress(data)
+
+    def _s3_sign(self, bucket: str, key: str, encoding: str, check: bool = False) -> str:
+        """
+        Create a short-lived pre-signed URL to read a layer file.  The URL asks S3 to send the object with a
+        gzip content encoding, so the browser unzips the data on its own.
+        :param bucket: S3 bucket of the layer file
+        :param key: S3 key of the layer file
+        :param encoding: Encoding of the layer file
+        :param check: Make sure the object exists before signing a URL to it
+        :return: Pre-signed URL
+        """
+        # get an s3 client
+        self.s3 = get_aws_client('s3')
+
+        # a signed URL to a missing object only fails when the client reads it
+        key = key[1:] if key.startswith('/') else key
+        if check:
+            self.s3.head_object(Bucket=bucket, Key=key)
+
+        params = {
+            'Bucket': bucket,
+            'Key': key,
+            'ResponseContentType': 'application/json' if encoding == WrfLayer.ENCODING_GEOJSON else
+                                   'application/octet-stream',
+            'ResponseContentEncoding': 'gzip'
+        }
+        return self.s3.generate_presigned_url('get_object', Params=params, ExpiresIn=GetWrfGeoJson.URL_EXPIRATION)
+
+
+class GetWrfGeoJsonBatch(GetWrfGeoJson):
+    """
+    Get the layers of one variable and z level at many valid times, e.g. to play an animation, with one
+    request instead of one request for each frame
+    """
+
+    # Maximum number of valid times in a request
+    MAX_FRAMES: int = 240
+
+    # Maximum size of the frames in one response once lambda_handler has gzipped and base64-encoded them,
+    # which leaves room under the 6 MB Lambda limit for the rest of the response.  Frames that do not fit
+    # are listed in 'remaining_times' for the client to request next.
+    MAX_RESPONSE_BYTES: int = 5 * 1024 * 1024
+
+    # Number of layers to read from S3 at the same time
+    MAX_WORKERS: int = 16
+
+    def validate_request(self) -> bool:
+        """
+        Validate the request object
+        :return: True if the request is valid, otherwise False
+        """
+        required_fields = ['job_id', 'variable']
+        allowed_fields = ['valid_times', 'start_time', 'end_time', 'z_level', 'encoding', 'zoom', 'delivery']
+        if not self.check_request_fields(required_fields, allowed_fields) or not self._validate_layer_options():
+            return False
+
+        # make sure the request has either a list of valid times or a time range
+        if ('valid_times' in self.request) == ('start_time' in self.request or 'end_time' in self.request):
+            self.errors.append('Request either valid_times or start_time and end_time.')
+            return False
+
+        # make sure the valid times are a list of integers
+        times = self.request['valid_times'] if 'valid_times' in self.request else \
+            [self.request.get('start_time'), self.request.get('end_time')]
+        if not isinstance(times, list) or not all(isinstance(t, int) and not isinstance(t, bool) for t in times):
+            self.errors.append(f'Invalid valid times: {times}')
+            return False
+        if len(times) > GetWrfGeoJsonBatch.MAX_FRAMES:
+            self.errors.append(f'Request at most {GetWrfGeoJsonBatch.MAX_FRAMES} valid times.')
+            return False
+
+        return True
+
+    def perform_action(self) -> bool:
+        """
+        Abstract method that performs the action and sets the response field
+        :return: True if the action ran successfully
+        """
+        try:
+            job_id: str = self.request['job_id']
+            variable: str = self.request['variable']
+            z_level: int = self.request['z_level'] if 'z_level' in self.request else 0
+            encoding: str = self.request['encoding'] if 'encoding' in self.request else WrfLayer.ENCODING_GEOJSON
+            zoom: Union[float, None] = self.request['zoom'] if 'zoom' in self.request else None
+            delivery: str = self.request['delivery'] if 'delivery' in self.request else GetWrfGeoJson.DELIVERY_INLINE
+
+            # get the job configuration once for all the frames
+            job: WrfJob = get_job_from_system(job_id)
+            if job is None:
+                self.errors.append(f'Could not find job ID: {job_id}')
+                self.log.error(f'Could not find job ID: {job_id}')
+                return False
+
+            # find the layer of each valid time
+            layers, missing_times, remaining_times = self._find_layers(job, variable, z_level)
+            frames = []
+            for valid_time, layer in layers:
+                s3_url, layer_encoding, detail_level, density = _get_layer_url(job, layer, encoding, zoom)
+                if s3_url is None:
+                    missing_times.append(valid_time)
+                    continue
+                frames.append({'valid_time': valid_time, 's3_url': s3_url, 'encoding': layer_encoding,
+                               'detail_level': detail_level, 'density': density})
+
+            # read the layers at the same time, and stop at the first one that does not fit in the response
+            self.response['frames'], unread_times, unsent_times = self._deliver_frames(frames, delivery)
+            self.response['missing_times'] = sorted(missing_times + unread_times)
+            self.response['remaining_times'] = unsent_times + remaining_times
+            self.response['delivery'] = delivery
+            if delivery == GetWrfGeoJson.DELIVERY_URL:
+                self.response['expires_in'] = GetWrfGeoJson.URL_EXPIRATION
+
+            # put the request parameters back in the response
+            self.response['job_id'] = job_id
+            self.response['variable'] = variable
+            self.response['z_level'] = z_level
+        except Exception as e:
+            self.log.error('Failed to read layers.', e)
+            self.errors.append('Failed to read layers.')
+            return False
+
+        return True
+
+    def _find_layers(self, job: WrfJob, variable: str,
+                     z_level: int) -> (List[Tuple[int, WrfLayer]], List[int], List[int]):
+        """
+        Find the layers of the requested valid times, or of the requested time range
+        :param job: Job with layers
+        :param variable: The model variable requested
+        :param z_level: Pressure level, or zero for 2D variable
+        :return: Valid time and layer of each frame in time order, the valid times without a layer, and the
+                 valid times in the time range past the maximum number of frames
+        """
+        remaining_times: List[int] = []
+        if 'valid_times' in self.request:
+            valid_times: List[int] = self.request['valid_times']
+        else:
+            # every valid time of the variable in the time range
+            start_time: int = self.request['start_time']
+            end_time: int = self.request['end_time']
+            all_layers: List[WrfLayer] = job.layers if isinstance(job.layers, list) else []
+            valid_times = sorted({layer.dt for layer in all_layers
+                                  if layer.variable_name == variable and start_time <= layer.dt <= end_time})
+            remaining_times = valid_times[GetWrfGeoJsonBatch.MAX_FRAMES:]
+            valid_times = valid_times[:GetWrfGeoJsonBatch.MAX_FRAMES]
+
+        # a time range only has the valid times of the variable, but maybe not at the z level
+        layers = [(valid_time, _find_layer(job, valid_time, variable, z_level)) for valid_time in valid_times]
+        missing_times = [valid_time for valid_time, layer in layers if layer is None]
+        return [(valid_time, layer) for valid_time, layer in layers if layer is not None], missing_times, \
+            remaining_times
+
+    def _deliver_frames(self, frames: List[dict], delivery: str) -> (List[dict], List[int], List[int]):
+        """
+        Read the layer data of each frame from S3, or sign URLs to them, at the same time
+        :param frames: Valid time, S3 URL, encoding, detail level, and density of each frame
+        :param delivery: Requested delivery, see GetWrfGeoJson.DELIVERIES
+        :return: Frames for the response, valid times of the frames that could not be read, and valid times
+                 of the frames that did not fit in the response
+        """
+        def _deliver_frame(frame: dict) -> Union[bytes, str]:
+            bucket: str = frame['s3_url'].split('/')[2]
+            key: str = '/'.join(frame['s3_url'].split('/')[3:])
+            return self._deliver_layer(bucket, key, frame['encoding'], delivery)
+
+        delivered = []
+        unread_times = []
+        unsent_times = []
+
+        # compress the frames as they are added, the same way lambda_handler compresses the response body,
+        # starting with the size of the gzip trailer
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+        compressed_size = 8
+
+        with ThreadPoolExecutor(max_workers=GetWrfGeoJsonBatch.MAX_WORKERS) as executor:
+            futures = [executor.submit(_deliver_frame, frame) for frame in frames]
+            for i, (frame, future) in enumerate(zip(frames, futures)):
+                # a frame that cannot be read is missing, but does not fail the other frames
+                try:
+                    data = future.result()
+                except Exception as e:
+                    self.log.warn(f'Failed to read layer: {frame["s3_url"]}', e)
+                    unread_times.append(frame['valid_time'])
+                    continue
+                frame.pop('s3_url')
+                if delivery == GetWrfGeoJson.DELIVERY_URL:
+                    frame['url'] = data
+                else:
+                    frame['geojson'] = base64.b64encode(data).decode()
+
+                # stop at the first frame that makes the encoded response too large
+                encoded = json.dumps(frame).encode() + b', '
+                compressed_size += len(compressor.compress(encoded)) + len(compressor.flush(zlib.Z_SYNC_FLUSH))
+                if 4 * math.ceil(compressed_size / 3) > GetWrfGeoJsonBatch.MAX_RESPONSE_BYTES and delivered:
+                    for remaining_future in futures[i:]:
+                        remaining_future.cancel()
+                    unsent_times = [remaining['valid_time'] for remaining in frames[i:]]
+                    break
+                delivered.append(frame)
+
+        return delivered, unread_times, unsent_times
+
+
+class GetWrfTile(Action):
+    """
+    Get a z/x/y tile of a WRF layer
+    """
+    def validate_request(self) -> bool:
+        """
+        Validate the request object
+        :return: True if the request is valid, otherwise False
+        """
+        required_fields = ['job_id', 'valid_time', 'variable', 'zoom', 'x', 'y']
+        allowed_fields = ['z_level']
+        if not self.check_request_fields(required_fields, allowed_fields):
+            return False
+
+        # make sure the tile coordinates are non-negative integers
+        for field in ['zoom', 'x', 'y']:
+            value = self.request[field]
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                self.errors.append(f'Invalid {field}: {value}')
+                return False
+
+        return True
+
+    def perform_action(self) -> bool:
+        """
+        Abstract method that performs the action and sets the response field
+        :return: True if the action ran successfully
+        """
+        try:
+            # get the tile
+            job_id: str = self.request['job_id']
+            valid_time: int = self.request['valid_time']
+            variable: str = self.request['variable']
+            z_level: int = self.request['z_level'] if 'z_level' in self.request else 0
+            zoom: int = self.request['zoom']
+            x: int = self.request['x']
+            y: int = self.request['y']
+            data, tile = self._read_tile_data(job_id, valid_time, variable, z_level, zoom, x, y)
+            if data is None:
+                return False
+            self.response['geojson'] = base64.b64encode(data).decode()
+            self.response['tile'] = tile
+
+            # put the request parameters back in the response
+            self.response['job_id'] = job_id
+            self.response['valid_time'] = valid_time
+            self.response['variable'] = variable
+            self.response['z_level'] = z_level
+            self.response['zoom'] = zoom
+            self.response['x'] = x
+            self.response['y'] = y
+        except Exception as e:
+            self.log.error('Failed to read tile.', e)
+            self.errors.append('Failed to read tile.')
+            return False
+
+        return True
+
+    def _read_tile_data(self, job_id: str, valid_time: int, variable: str, z_level: int, zoom: int, x: int,
+                        y: int) -> (Union[bytes, None], Union[dict, None]):
+        """
+        Read a tile from S3.  Requests above the highest tiled zoom level get the tile from the highest
+        zoom level that contains the requested tile.
+        :param job_id: The model configuration name
+        :param valid_time: The data valid time requested
+        :param variable: The model variable requested
+        :param z_level: Pressure level, or zero for 2D variable
+        :param zoom: Tile zoom level
+        :param x: Tile X coordinate
+        :param y: Tile Y coordinate
+        :return: Tile data, unzipped, and the zoom, x, and y of the tile that was read
+        """
+        # get the job configuration
+        job: WrfJob = get_job_from_system(job_id)
+
+        # make sure we found the right job ID
+        if job is None:
+            self.errors.append(f'Could not find job ID: {job_id}')
+            self.log.error(f'Could not find job ID: {job_id}')
+            return None, None
+
+        # find the requested layer and make sure it was tiled
+        layer = _find_layer(job, valid_time, variable, z_level)
+        if layer is None:
+            self.errors.append('Could not find requested data layer.')
+            self.log.error(f'Could not find requested data layer: {job_id} {valid_time} {variable} {z_level}')
+            return None, None
+        if not layer.tile_zooms or zoom < min(layer.tile_zooms):
+            self.errors.append(f'Tiles are not available at zoom level {zoom}.')
+            return None, None
+
+        # use the tile from the highest zoom level that contains the requested tile
+        max_zoom = max(layer.tile_zooms)
+        if zoom > max_zoom:
+            x >>= zoom - max_zoom
+            y >>= zoom - max_zoom
+            zoom = max_zoom
+        tile = {'zoom': zoom, 'x': x, 'y': y}
+
+        # tiles outside the layer are empty
+        x_min, y_min, x_max, y_max = get_tile_range(layer.bounds, zoom)
+        if not x_min <= x <= x_max or not y_min <= y <= y_max:
+            empty = {'lon': [], 'lat': []} if layer.plot_type == 'vector' else {'type': 'FeatureCollection', 'features': []}
+            return json.dumps(empty).encode(), tile
 
         # read the object from S3
+        s3_url = layer.get_tile_data(zoom, x, y)
+        bucket: str = s3_url.split('/')[2]
+        key: str = '/'.join(s3_url.split('/')[3:])
         data = self._s3_read(bucket, key)
 
         # unzip the data -- the whole response gets compressed again later
-        return gzip.decompress(data)
+        return gzip.decompress(data), tile
 
 
 class RunWrf(Action):
@@ -257,3 +696,84 @@ class DeleteCluster(Action):
             return False
 
         return True
+
+
+def _find_layer(job: WrfJob, valid_time: int, variable: str, z_level: int) -> Union[WrfLayer, None]:
+    """
+    Find a layer in a job
+    :param job: Job with layers
+    :param valid_time: The data valid time
+    :param variable: The model variable
+    :param z_level: Pressure level, or zero for 2D variable
+    :return: The layer, or None if the job does not have it
+    """
+    return job.get_layer(valid_time, variable, z_level)
+
+
+def _get_layer_url(job: WrfJob, layer: WrfLayer, encoding: str,
+                   zoom: Union[float, None]) -> (Union[str, None], str, str, Union[str, None]):
+    """
+    Choose the layer data file for the client's encoding and zoom level
+    :param job: Job with the layer
+    :param layer: The layer
+    :param encoding: Requested encoding, falls back to GeoJSON if the layer is not available in it
+    :param zoom: Map zoom level of the client, or None for the full resolution
+    :return: S3 URL of the layer data, the encoding of the data, the level of detail of the data, and the
+             density of vector data, or None if the layer has only the default density
+    """
+    # use the requested encoding if the layer has it, otherwise GeoJSON
+    if encoding not in layer.encodings:
+        encoding = WrfLayer.ENCODING_GEOJSON
+
+    # use the coarsest level of detail that looks the same at the client's zoom level
+    detail_level: str = WrfLayer.DETAIL_FULL
+    if zoom is not None:
+        detail_level = layer.get_detail_level(get_meters_per_pixel(zoom, _get_latitude(job)))
+    s3_url = layer.get_layer_data(encoding, detail_level)
+
+    # use the densest vectors that stay apart at the client's zoom level
+    density: Union[str, None] = None
+    if layer.plot_type == 'vector' and zoom is not None and layer.densities:
+        density = layer.get_density(get_meters_per_pixel(zoom, _get_latitude(job)))
+        s3_url = layer.get_density_data(density)
+
+    return s3_url, encoding, detail_level, density
+
+
+def _get_layer_location(job_id: str) -> Union[Tuple[str, str], None]:
+    """
+    Get the S3 bucket and key prefix of the layer files of a job, either where a layer of the job was
+    found before, or where the post-processor writes them in this environment
+    :param job_id: The job ID
+    :return: Bucket and key prefix, or None if they are not known
+    """
+    if job_id in _LAYER_LOCATIONS:
+        _LAYER_LOCATIONS.move_to_end(job_id)
+        return _LAYER_LOCATIONS[job_id]
+    if 'WRFCLOUD_BUCKET' not in os.environ or 'WRF_OUTPUT_PREFIX' not in os.environ:
+        return None
+    return os.environ['WRFCLOUD_BUCKET'], f'{os.environ["WRF_OUTPUT_PREFIX"]}/{job_id}'
+
+
+def _set_layer_location(job_id: str, bucket: str, key: str) -> None:
+    """
+    Remember the S3 bucket and key prefix of the layer files of a job, and forget the least recently used
+    job if there are too many
+    :param job_id: The job ID
+    :param bucket: S3 bucket of a layer file of the job
+    :param key: S3 key of a layer file of the job
+    """
+    _LAYER_LOCATIONS[job_id] = (bucket, key.rsplit('/', 1)[0])
+    _LAYER_LOCATIONS.move_to_end(job_id)
+    while len(_LAYER_LOCATIONS) > _MAX_LAYER_LOCATIONS:
+        _LAYER_LOCATIONS.popitem(last=False)
+
+
+def _get_latitude(job: WrfJob) -> float:
+    """
+    Get the latitude at the center of a job's domain
+    :param job: Job details
+    :return: Latitude in degrees
+    """
+    center: Union[LatLonPoint, None] = job.domain_center
+    return float(center.latitude) if center is not None and center.latitude is not None else 0
@@ -3,7 +3,7 @@ This module holds functions for audit log operations
 """
 
 __all__ = ['AuditEntry', 'AuditDao', 'save_audit_log_entry', 'get_audit_log_entry',
-           'get_all_audit_logs']
+           'get_all_audit_logs', 'get_user_audit_logs']
 
 from typing import Union, List
 from wrfcloud.api.audit.entry import AuditEntry
@@ -46,3 +46,19 @@ def get_all_audit_logs() -> List[AuditEntry]:
 
     # get all the entries
     return dao.get_all_entries()
+
+
+def get_user_audit_logs(username: str, start_time: Union[float, None] = None,
+                        end_time: Union[float, None] = None) -> List[AuditEntry]:
+    """
+    Get the audit log entries for a user, optionally within a time range
+    :param username: Username (email address) of the user
+    :param start_time: Optional earliest start time to include, as a POSIX timestamp
+    :param end_time: Optional latest start time to include, as a POSIX timestamp
+    :return: The user's audit log entries, in order of start time
+    """
+    # get the data access object
+    dao = AuditDao()
+
+    # get the user's entries
+    return dao.get_entries_by_user(username, start_time, end_time)
@@ -5,7 +5,7 @@ The AuditDao class is a data access object that performs basic CRUD
 
 import os
 import pkgutil
-from typing import Union, List
+from typing import Union, List, Iterator
 import yaml
 from wrfcloud.dynamodb import DynamoDao
 from wrfcloud.api.audit.entry import AuditEntry
@@ -16,6 +16,11 @@ class AuditDao(DynamoDao):
     CRUD operations for audit log
     """
 
+    """
+    Number of segments to scan in parallel when reading the whole audit log
+    """
+    SCAN_SEGMENTS: int = 4
+
     def __init__(self, endpoint_url: str = None):
         """
         Create the Data Access Object (DAO)
@@ -27,15 +32,16 @@ class AuditDao(DynamoDao):
         # get the table name
         table_name = os.environ[self.table_definition['table_name_var']]
 
-        # get the key fields for the table
+        # get the key fields for the table and its indexes
         key_fields = self.table_definition['key_fields']
+        index_fields = self.table_definition['index_fields']
 
         # get the endpoint URL, but do not override the local argument
         if endpoint_url is None and 'ENDPOINT_URL' in os.environ:
             endpoint_url = os.environ['ENDPOINT_URL']
 
         # call the super constructor
-        super().__init__(table_name, key_fields, endpoint_url)
+        super().__init__(table_name, key_fields, endpoint_url, index_fields)
 
     def save_entry(self, entry: AuditEntry) -> bool:
         """
@@ -71,7 +77,47 @@ class AuditDao(DynamoDao):
         :return: A list of all audit log entries
         """
         # get all items and turn them into a list of AuditEntry objects
-        return [AuditEntry(item) for item in super().get_all_items()]
+        return list(self.iter_entries())
+
+    def iter_entries(self) -> Iterator[AuditEntry]:
+        """
+        Iterate over the entries in the table without holding them all in memory
+        :return: Generator of audit log entries, not in a particular order
+        """
+        for item in super().iter_items(segments=self.SCAN_SEGMENTS):
+            yield AuditEntry(item)
+
+    def get_entries_by_user(self, username: str, start_time: Union[float, None] = None,
+                            end_time: Union[float, None] = None) -> List[AuditEntry]:
+        """
+        Get the entries for a user, without reading the other entries
+        :param username: Username (email address) of the user
+        :param start_time: Optional earliest start time to include, as a POSIX timestamp
+        :param end_time: Optional latest start time to include, as a POSIX timestamp
+        :return: A list of the user's audit log entries, in order of start time
+        """
+        # build the key condition for the time range
+        key_condition = 'username = :username'
+        values = {':username': username}
+        if start_time is not None and end_time is not None:
+            key_condition += ' AND start_time BETWEEN :start_time AND :end_time'
+            values.update({':start_time': start_time, ':end_time': end_time})
+        elif start_time is not None:
+            key_condition += ' AND start_time >= :start_time'
+            values[':start_time'] = start_time
+        elif end_time is not None:
+            key_condition += ' AND start_time <= :end_time'
+            values[':end_time'] = end_time
+
+        # read every page of the query results
+        entries: List[AuditEntry] = []
+        last_key = None
+        while True:
+            items, last_key = super().query(key_condition, values, index_name='username-start_time-index',
+                                            start_key=last_key)
+            entries += [AuditEntry(item) for item in items]
+            if last_key is None:
+                return entries
 
     def create_audit_table(self) -> bool:
         """
@@ -80,5 +126,6 @@ class AuditDao(DynamoDao):
         """
         return super().create_table(
             self.table_definition['attribute_definitions'],
-            self.table_definition['key_schema']
+            self.table_definition['key_schema'],
+            self.table_definition['global_secondary_indexes']
         )
@@ -11,7 +11,7 @@ from concurrent.futures import Future, ThreadPoolExecutor
 import yaml
 from wrfcloud.dynamodb import DynamoDao
 from wrfcloud.config import WrfConfig
-from wrfcloud.system import get_aws_session
+from wrfcloud.system import get_aws_client
 
 
 class ConfigDao(DynamoDao):
@@ -162,7 +162,7 @@ class ConfigDao(DynamoDao):
         bucket = os.environ['WRFCLOUD_BUCKET']
 
         try:
-            s3 = get_aws_session().client('s3')
+            s3 = get_aws_client('s3')
             s3.upload_fileobj(data, bucket, namelist_key)
         except Exception as e:
             self.log.error('Failed to write namelist to S3.', e)
@@ -182,7 +182,7 @@ class ConfigDao(DynamoDao):
 
         # load the namelist into the config data
         try:
-            s3 = get_aws_session().client('s3')
+            s3 = get_aws_client('s3')
             data: str = s3.get_object(Bucket=bucket, Key=namelist_key)['Body'].read().decode()
             if namelist_key.endswith('namelist.input'):
                 config.wrf_namelist = data
@@ -201,7 +201,7 @@ class ConfigDao(DynamoDao):
         bucket = os.environ['WRFCLOUD_BUCKET']
 
         try:
-            s3 = get_aws_session().client('s3')
+            s3 = get_aws_client('s3')
             s3.delete_object(Bucket=bucket, Key=namelist_key)
         except Exception as e:
             self.log.error('Failed to delete namelist from S3.', e)
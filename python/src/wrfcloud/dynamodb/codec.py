@@ -0,0 +1,208 @@
+"""
+Convert between standard python values and dynamodb attribute values.  Strings and numbers, which
+make up most of the attributes in the tables, are checked first, and other values are converted by
+looking up their exact type (or attribute value type) in a table instead of testing each type in
+turn.  Values of other types, such as subclasses of the standard types, are converted the same way
+DynamoDao always has.
+"""
+
+from typing import Callable, Dict, Tuple
+
+
+def dict_to_dynamo(data: any, set_ok: bool = False, recursed: bool = False) -> dict:
+    """
+    Convert a standard python dictionary to a crazy dynamodb dictionary
+    :param data: Standard python dictionary to convert
+    :param set_ok: Prefer the SET types !!SET types do not preserve order, but save a bit of space over LIST!!
+    :param recursed: Gets rid of 'M' on root dictionary when False
+    :return: Crazy dynamodb dictionary
+    """
+    if not recursed and isinstance(data, dict):
+        return _encode_map(data, set_ok)
+    return _encode(data, set_ok)
+
+
+def dynamo_to_dict(dynamo: dict, recursed: bool = False) -> any:
+    """
+    Convert a crazy dynamodb dictionary to a standard python dictionary
+    :param dynamo: The crazy dynamodb dictionary to convert
+    :param recursed: Convert a single attribute value when True, otherwise a map of attribute values
+    :return: The standard python dictionary
+    """
+    if not recursed:
+        return _decode_map(dynamo)
+    return _decode(dynamo)
+
+
+def _encode(data: any, set_ok: bool) -> dict:
+    """
+    Convert a single value to an attribute value
+    :param data: Standard python value
+    :param set_ok: Prefer the SET types for lists
+    :return: Attribute value
+    """
+    data_type = type(data)
+    if data_type is str:
+        return {'S': data}
+    if data_type in _NUMBER_TYPES:
+        return {'N': str(data)}
+    if data_type is dict:
+        return {'M': _encode_map(data, set_ok)}
+    encoder = _ENCODERS.get(data_type)
+    if encoder is not None:
+        return encoder(data, set_ok)
+    return _encode_instance(data, set_ok)
+
+
+def _encode_map(data: dict, set_ok: bool) -> dict:
+    """
+    Convert a dictionary to a map of attribute values
+    :param data: Standard python dictionary
+    :param set_ok: Prefer the SET types for lists
+    :return: Map of attribute values, without the 'M'
+    """
+    return {key: {'S': value} if type(value) is str else
+            {'N': str(value)} if type(value) in _NUMBER_TYPES else _encode(value, set_ok)
+            for key, value in data.items()}
+
+
+def _encode_list(data: list, set_ok: bool) -> dict:
+    """
+    Convert a list to a LIST attribute value, or a SET attribute value if allowed
+    :param data: Standard python list
+    :param set_ok: Prefer the SET types
+    :return: Attribute value
+    """
+    if set_ok:
+        if all(isinstance(e, str) for e in data):
+            return {'SS': data}
+        if all(isinstance(e, (int, float)) for e in data):
+            return {'NS': [str(e) for e in data]}
+        if all(isinstance(e, (bytes, bytearray)) for e in data):
+            return {'BS': [e for e in data]}
+    return {'L': [_encode(value, set_ok) for value in data]}
+
+
+def _encode_instance(data: any, set_ok: bool) -> dict:
+    """
+    Convert a value that is not exactly one of the standard types, e.g. a subclass of one
+    :param data: Python value
+    :param set_ok: Prefer the SET types for lists
+    :return: Attribute value
+    """
+    if isinstance(data, dict):
+        return {'M': {key: _encode(value, set_ok) for key, value in data.items()}}
+    if isinstance(data, list):
+        return _encode_list(data, set_ok)
+    if isinstance(data, str):
+        return {'S': data}
+    if isinstance(data, bool):
+        return {'BOOL': data}
+    if isinstance(data, (int, float)):
+        return {'N': str(data)}
+    if isinstance(data, bytes):
+        return {'B': data}
+    assert False  # we missed a case
+
+
+def _decode(dynamo: dict) -> any:
+    """
+    Convert a single attribute value to a standard python value
+    :param dynamo: Attribute value
+    :return: Standard python value
+    """
+    if 'S' in dynamo:
+        return dynamo['S']
+    if 'N' in dynamo:
+        number = dynamo['N']
+        return float(number) if '.' in number else int(number)
+    if len(dynamo) == 1:
+        if 'M' in dynamo:
+            return _decode_map(dynamo['M'])
+        if 'L' in dynamo:
+            return [_decode(e) for e in dynamo['L']]
+        if 'BOOL' in dynamo:
+            return dynamo['BOOL']
+        if 'NULL' in dynamo:
+            return None
+    return _decode_tags(dynamo)
+
+
+def _decode_map(dynamo: dict) -> dict:
+    """
+    Convert a map of attribute values to a standard python dictionary
+    :param dynamo: Map of attribute values, without the 'M'
+    :return: Standard python dictionary
+    """
+    return {key: value['S'] if 'S' in value else _decode(value) for key, value in dynamo.items()}
+
+
+def _decode_number(number: str) -> any:
+    """
+    Convert an N attribute value
+    :param number: Number as a string
+    :return: Float if the number has a decimal point, otherwise int
+    """
+    return float(number) if '.' in number else int(number)
+
+
+def _decode_number_set(numbers: list) -> list:
+    """
+    Convert an NS attribute value
+    :param numbers: List of numbers as strings
+    :return: List of floats if the first number has a decimal point, otherwise list of ints
+    """
+    if '.' in numbers[0]:
+        return [float(e) for e in numbers]
+    return [int(e) for e in numbers]
+
+
+def _decode_tags(dynamo: dict) -> any:
+    """
+    Convert an attribute value that does not have exactly one known type, by checking the types in order
+    :param dynamo: Attribute value
+    :return: Standard python value
+    """
+    for tag in _DECODERS:
+        if tag in dynamo:
+            return _DECODERS[tag](dynamo[tag])
+
+    raise RuntimeError('Missed a case converting dynamo dict to normal dict')
+
+
+"""
+Exact python types stored as N attribute values
+"""
+_NUMBER_TYPES: Tuple[type, type] = (int, float)
+
+
+"""
+Converters for each exact python type
+"""
+_ENCODERS: Dict[type, Callable[[any, bool], dict]] = {
+    str: lambda data, set_ok: {'S': data},
+    bool: lambda data, set_ok: {'BOOL': data},
+    int: lambda data, set_ok: {'N': str(data)},
+    float: lambda data, set_ok: {'N': str(data)},
+    bytes: lambda data, set_ok: {'B': data},
+    type(None): lambda data, set_ok: {'NULL': True},
+    dict: lambda data, set_ok: {'M': _encode_map(data, set_ok)},
+    list: _encode_list,
+}
+
+
+"""
+Converters for each attribute value type, in the order they are checked
+"""
+_DECODERS: Dict[str, Callable[[any], any]] = {
+    'S': lambda value: value,
+    'N': _decode_number,
+    'B': lambda value: value,
+    'BOOL': lambda value: value,
+    'NULL': lambda value: None,
+    'SS': lambda value: value,
+    'NS': _decode_number_set,
+    'BS': lambda value: value,
+    'L': lambda value: [_decode(e) for e in value],
+    'M': _decode_map,
+}
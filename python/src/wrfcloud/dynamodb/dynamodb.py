@@ -2,24 +2,55 @@
 A base class for generic DynamoDB functions
 """
 
-from typing import Union, List, Dict
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Full
+from threading import Event
+from typing import Union, List, Dict, Tuple, Iterator
 import boto3
 from wrfcloud.log import Logger
-from wrfcloud.system import get_aws_session
+from wrfcloud.system import get_aws_client
+from wrfcloud.dynamodb.codec import dict_to_dynamo, dynamo_to_dict
 
 
 class DynamoDao:
     """
     Class to perform basic dynamodb operations
     """
-    def __init__(self, table: str, key_fields: List[str], endpoint_url: str=None):
+
+    """
+    Largest number of items in a single BatchWriteItem request
+    """
+    BATCH_WRITE_LIMIT: int = 25
+
+    """
+    Largest number of keys in a single BatchGetItem request
+    """
+    BATCH_GET_LIMIT: int = 100
+
+    """
+    Number of times to send unprocessed items or keys before giving up
+    """
+    BATCH_MAX_ATTEMPTS: int = 8
+
+    """
+    Seconds to wait before resending unprocessed items or keys, doubled for each retry after that
+    """
+    BATCH_BACKOFF: float = 0.05
+
+    def __init__(self, table: str, key_fields: List[str], endpoint_url: str=None,
+                 index_fields: Union[List[str], None] = None):
         """
         Create a new DynamoDao object
         :param table: dynamodb table name
         :param endpoint_url: (optional) dynamodb endpoint URL (useful for testing with local db)
+        :param index_fields: (optional) Key fields of the secondary indexes, which are left out of
+                             an item when they are None
         """
         self.table = table
         self.key_fields = key_fields
+        self.index_fields = index_fields or []
         self.endpoint_url = endpoint_url
         self.client = None
         self.log = Logger()
@@ -32,7 +63,7 @@ class DynamoDao:
                                     to preserve order of items in list (default: True)
         :return: True if successful, otherwise False
         """
-        dynamo_data = self._dict_to_dynamo(data, set_ok=(not preserve_list_order))
+        dynamo_data = self._dict_to_dynamo(self._drop_empty_index_fields(data), set_ok=(not preserve_list_order))
 
         client = self._get_client()
         res = client.put_item(
@@ -58,78 +89,152 @@ class DynamoDao:
         )
         return self._dynamo_to_dict(res['Item']) if 'Item' in res else None
 
-    def get_all_items(self) -> Union[List[Dict], None]:
+    def get_all_items(self, projection: Union[List[str], None] = None, filter_expression: Union[str, None] = None,
+                      expression_values: Union[dict, None] = None, expression_names: Union[dict, None] = None,
+                      segments: int = 1) -> Union[List[Dict], None]:
         """
         Get all items in the dynamodb table
+        :param projection: Optional list of attribute names to read, otherwise all attributes are read
+        :param filter_expression: Optional FilterExpression, e.g. 'job_status = :status'
+        :param expression_values: Standard python values for the filter expression, e.g. {':status': 'Done'}
+        :param expression_names: Attribute name placeholders for the filter expression, e.g. {'#t': 'time'}
+        :param segments: Number of segments to scan in parallel
         :return: List of zero or more dictionaries
         """
-        # get the client object
-        client = self._get_client()
-
-        # create a list to store the results
-        results = []
+        return list(self.iter_items(projection, filter_expression, expression_values, expression_names, segments))
+
+    def iter_items(self, projection: Union[List[str], None] = None, filter_expression: Union[str, None] = None,
+                   expression_values: Union[dict, None] = None, expression_names: Union[dict, None] = None,
+                   segments: int = 1) -> Iterator[Dict]:
+        """
+        Iterate over the items in the dynamodb table, reading one page at a time.  With more than one
+        segment, the segments are scanned in parallel and the items are not in a particular order.
+        :param projection: Optional list of attribute names to read, otherwise all attributes are read
+        :param filter_expression: Optional FilterExpression, e.g. 'job_status = :status'
+        :param expression_values: Standard python values for the filter expression, e.g. {':status': 'Done'}
+        :param expression_names: Attribute name placeholders for the filter expression, e.g. {'#t': 'time'}
+        :param segments: Number of segments to scan in parallel
+        :return: Generator of dictionaries
+        """
+        scan_args = self._make_scan_args(projection, filter_expression, expression_values, expression_names)
+
+        if segments <= 1:
+            for page in self._scan_pages(scan_args):
+                yield from page
+            return
+
+        # scan each segment in its own thread, and pass the pages back through a bounded queue
+        pages: Queue = Queue(maxsize=2 * segments)
+        stop = Event()
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            for segment in range(segments):
+                executor.submit(self._scan_segment, scan_args, segment, segments, pages, stop)
+            try:
+                remaining = segments
+                while remaining:
+                    page = pages.get()
+                    if page is None:
+                        remaining -= 1
+                    elif isinstance(page, Exception):
+                        raise page
+                    else:
+                        yield from page
+            finally:
+                # stop the other segments if the caller stops early or a segment fails
+                stop.set()
+
+    def query(self, key_condition: str, expression_values: dict, index_name: Union[str, None] = None,
+              filter_expression: Union[str, None] = None, expression_names: Union[dict, None] = None,
+              projection: Union[List[str], None] = None, scan_forward: bool = True,
+              limit: Union[int, None] = None,
+              start_key: Union[dict, None] = None) -> Tuple[List[Dict], Union[Dict, None]]:
+        """
+        Query the items in the table or in a secondary index by key, which reads only the matching
+        items instead of the whole table
+        :param key_condition: KeyConditionExpression, e.g. 'username = :user AND start_time >= :start'
+        :param expression_values: Standard python values for the key condition and filter expression
+        :param index_name: Optional name of a secondary index to query, otherwise the table is queried
+        :param filter_expression: Optional FilterExpression applied to the items that match the key condition
+        :param expression_names: Attribute name placeholders for the expressions, e.g. {'#t': 'time'}
+        :param projection: Optional list of attribute names to read, otherwise all attributes are read
+        :param scan_forward: Sort the items by the range key in ascending order, or descending if False
+        :param limit: Optional largest number of items to read, otherwise all matching items are read
+        :param start_key: Key returned by the previous call to read the next page of items
+        :return: Tuple with a list of zero or more dictionaries, and the key to pass as start_key to read
+                 the next page, or None if there are no more items
+        """
+        query_args = self._make_scan_args(projection, filter_expression, expression_values, expression_names)
+        query_args['KeyConditionExpression'] = key_condition
+        query_args['ScanIndexForward'] = scan_forward
+        if index_name is not None:
+            query_args['IndexName'] = index_name
 
-        # make sure we get into the while loop at least once
-        first = True
-        last_eval_key = None
-
-        # loop until the response does not have a LastEvaluatedKey attribute
-        while first or last_eval_key:
-            # query all the entries in the table
-            if first:
-                res = client.scan(TableName=self.table)
+        client = self._get_client()
+        items = []
+        last_eval_key = None if start_key is None else self._dict_to_dynamo(start_key)
+
+        # read pages until the limit is reached or there are no more matching items
+        while limit is None or len(items) < limit:
+            if limit is not None:
+                query_args['Limit'] = limit - len(items)
+            if last_eval_key is None:
+                res = client.query(**query_args)
             else:
-                res = client.scan(TableName=self.table, ExclusiveStartKey=last_eval_key)
-
-            # mark that we have been in the loop before
-            first = False
-
-            # check for a LastEvaluatedKey attribute, indicating there are more records to search
-            last_eval_key = res['LastEvaluatedKey'] if 'LastEvaluatedKey' in res else None
+                res = client.query(**query_args, ExclusiveStartKey=last_eval_key)
 
-            # found additional entries, add them to the results
             if self._response_ok(res) and 'Items' in res:
-                # create a list of AuditEntry objects
-                batch_results = [self._dynamo_to_dict(item) for item in res['Items']]
+                items += [self._dynamo_to_dict(item) for item in res['Items']]
 
-                # append this batch to the final results
-                results += batch_results
+            last_eval_key = res.get('LastEvaluatedKey')
+            if last_eval_key is None:
+                break
 
-        return results
+        return items, None if last_eval_key is None else self._dynamo_to_dict(last_eval_key)
 
-    def update_item(self, data) -> bool:
+    def update_item(self, data: dict, condition_expression: Union[str, None] = None,
+                    condition_values: Union[dict, None] = None) -> bool:
         """
-        Update an item in the dynamodb table
-        :param data: Item to update, must include unmodified key
+        Update an item in the dynamodb table with a single request
+        :param data: Item to update, must include unmodified key.  Attributes with a value of None are removed.
+        :param condition_expression: Optional ConditionExpression that must be true for the item to be
+                                     updated, e.g. 'attribute_exists(job_id)'
+        :param condition_values: Standard python values for the condition expression
         :return: True if successful, otherwise False
         """
-        update_expression = self._make_update_expression(data)
-        remove_expression = self._make_remove_expression(data)
-
-        if update_expression is None and remove_expression is None:
-            return False
+        return self._update_item(data, condition_expression, condition_values)[0]
 
-        client = self._get_client()
-        ok = True
+    def _update_item(self, data: dict, condition_expression: Union[str, None] = None,
+                     condition_values: Union[dict, None] = None) -> Tuple[bool, bool]:
+        """
+        Update an item in the dynamodb table with a single request, and tell if the condition was not met
+        :param data: Item to update, must include unmodified key.  Attributes with a value of None are removed.
+        :param condition_expression: Optional ConditionExpression that must be true for the item to be updated
+        :param condition_values: Standard python values for the condition expression
+        :return: True if successful, otherwise False, and False if the condition was not met, otherwise True
+        """
+        update_args = self._make_update_args(data)
+        if update_args is None:
+            return False, True
 
-        if update_expression is not None:
-            res = client.update_item(
-                TableName=self.table,
-                Key=self._make_dynamo_key(data),
-                UpdateExpression=update_expression,
-                ExpressionAttributeValues=self._make_expression_attribute_values(data)
-            )
-            ok = ok and self._response_ok(res)
+        if condition_expression is not None:
+            update_args['ConditionExpression'] = condition_expression
+        if condition_values:
+            update_args.setdefault('ExpressionAttributeValues', {}).update({
+                key: self._dict_to_dynamo(value, recursed=True) for key, value in condition_values.items()
+            })
 
-        if remove_expression is not None:
+        client = self._get_client()
+        try:
             res = client.update_item(
                 TableName=self.table,
                 Key=self._make_dynamo_key(data),
-                UpdateExpression=remove_expression
+                **update_args
             )
-            ok = ok and self._response_ok(res)
+        except client.exceptions.ConditionalCheckFailedException:
+            self.log.warn(f'Condition not met, item was not updated in {self.table}: {condition_expression}')
+            return False, False
 
-        return ok
+        return self._response_ok(res), True
 
     def delete_item(self, key: dict) -> bool:
         """
@@ -144,15 +249,81 @@ class DynamoDao:
 
         return self._response_ok(res)
 
-    def create_table(self, attribute_definitions: List[Dict], key_schema: List[Dict]) -> bool:
+    def batch_put_items(self, items: List[dict], preserve_list_order=True) -> bool:
+        """
+        Put many items into the dynamodb table with as few requests as possible.  If more than one item
+        has the same key, the last one is stored.
+        :param items: Data values to insert
+        :param preserve_list_order: Use the LIST data type instead of SET
+                                    to preserve order of items in list (default: True)
+        :return: True if all the items were stored, otherwise False
+        """
+        unique_items = {self._get_key_values(item): item for item in items}
+        requests = [{'PutRequest': {'Item': self._dict_to_dynamo(self._drop_empty_index_fields(item),
+                                                                  set_ok=(not preserve_list_order))}}
+                    for item in unique_items.values()]
+        return self._batch_write(requests)
+
+    def batch_get_items(self, keys: List[dict]) -> List[Dict]:
+        """
+        Get many items from the dynamodb table with as few requests as possible
+        :param keys: Normal dictionaries with key values (may include other values too)
+        :return: Normal data dictionaries of the items that were found, in the order of the keys
+        """
+        client = self._get_client()
+        unique_keys = {self._get_key_values(key): self._make_dynamo_key(key) for key in keys}
+        dynamo_keys = list(unique_keys.values())
+
+        # get each chunk of keys, resending the unprocessed keys
+        found = {}
+        for start in range(0, len(dynamo_keys), self.BATCH_GET_LIMIT):
+            request = {self.table: {'Keys': dynamo_keys[start:start + self.BATCH_GET_LIMIT]}}
+            for attempt in range(self.BATCH_MAX_ATTEMPTS):
+                res = client.batch_get_item(RequestItems=request)
+                for dynamo_item in res.get('Responses', {}).get(self.table, []):
+                    item = self._dynamo_to_dict(dynamo_item)
+                    found[self._get_key_values(item)] = item
+                request = res.get('UnprocessedKeys', {})
+                if not request:
+                    break
+                self._batch_backoff(attempt)
+            if request:
+                self.log.error(f'Failed to get {len(request[self.table]["Keys"])} items from {self.table}')
+
+        return [found[key] for key in unique_keys if key in found]
+
+    def batch_delete_items(self, keys: List[dict]) -> bool:
+        """
+        Delete many items from the dynamodb table with as few requests as possible
+        :param keys: Normal dictionaries with key values (may include other values too)
+        :return: True if all the items were deleted, otherwise False
+        """
+        unique_keys = {self._get_key_values(key): self._make_dynamo_key(key) for key in keys}
+        requests = [{'DeleteRequest': {'Key': dynamo_key}} for dynamo_key in unique_keys.values()]
+        return self._batch_write(requests)
+
+    def create_table(self, attribute_definitions: List[Dict], key_schema: List[Dict],
+                     global_secondary_indexes: Union[List[Dict], None] = None) -> bool:
         """
         Create a new and empty table resource
+        :param attribute_definitions: Types of the key attributes of the table and its indexes
+        :param key_schema: Key attributes of the table
+        :param global_secondary_indexes: Optional list of index definitions, each with IndexName,
+                                         KeySchema, and Projection
         :return: True if successful, otherwise False
         """
         try:
             # get a dynamodb client
             client = self._get_client()
 
+            # add the indexes, if any
+            table_args = {}
+            if global_secondary_indexes:
+                table_args['GlobalSecondaryIndexes'] = [
+                    {**index, 'ProvisionedThroughput': {'ReadCapacityUnits': 10, 'WriteCapacityUnits': 10}}
+                    for index in global_secondary_indexes
+                ]
+
             # create the table
             # TODO: We should not need to include ProvisionedThroughput here since we specify,
             #       BillingMode is PAY_PER_REQUEST, however, we get errors when not specified.
@@ -162,7 +333,8 @@ class DynamoDao:
                 ProvisionedThroughput={'ReadCapacityUnits': 10, 'WriteCapacityUnits': 10},
                 TableClass='STANDARD',
                 AttributeDefinitions=attribute_definitions,
-                KeySchema=key_schema
+                KeySchema=key_schema,
+                **table_args
             )
 
             # check the response status
@@ -197,6 +369,136 @@ class DynamoDao:
             print(e)
             return False
 
+    def _make_scan_args(self, projection: Union[List[str], None], filter_expression: Union[str, None],
+                        expression_values: Union[dict, None], expression_names: Union[dict, None]) -> dict:
+        """
+        Create the arguments of a scan or query request
+        :param projection: Optional list of attribute names to read
+        :param filter_expression: Optional FilterExpression
+        :param expression_values: Standard python values for the filter expression
+        :param expression_names: Attribute name placeholders for the filter expression
+        :return: Dictionary of scan arguments
+        """
+        scan_args = {'TableName': self.table}
+        names = dict(expression_names or {})
+
+        # use placeholders for the projected attributes, so reserved words are allowed
+        if projection:
+            placeholders = [f'#p{i}' for i in range(len(projection))]
+            names.update(zip(placeholders, projection))
+            scan_args['ProjectionExpression'] = ', '.join(placeholders)
+        if filter_expression:
+            scan_args['FilterExpression'] = filter_expression
+        if expression_values:
+            scan_args['ExpressionAttributeValues'] = {
+                key: self._dict_to_dynamo(value, recursed=True) for key, value in expression_values.items()
+            }
+        if names:
+            scan_args['ExpressionAttributeNames'] = names
+
+        return scan_args
+
+    def _scan_pages(self, scan_args: dict) -> Iterator[List[Dict]]:
+        """
+        Scan the table one page at a time
+        :param scan_args: Arguments of the scan request
+        :return: Generator of lists of dictionaries, one list for each page
+        """
+        client = self._get_client()
+        last_eval_key = None
+
+        # loop until the response does not have a LastEvaluatedKey attribute
+        while True:
+            if last_eval_key is None:
+                res = client.scan(**scan_args)
+            else:
+                res = client.scan(**scan_args, ExclusiveStartKey=last_eval_key)
+
+            # found additional entries, convert them to standard dictionaries
+            if self._response_ok(res) and 'Items' in res:
+                yield [self._dynamo_to_dict(item) for item in res['Items']]
+
+            # check for a LastEvaluatedKey attribute, indicating there are more records to search
+            last_eval_key = res.get('LastEvaluatedKey')
+            if last_eval_key is None:
+                return
+
+    def _scan_segment(self, scan_args: dict, segment: int, segments: int, pages: Queue, stop: Event) -> None:
+        """
+        Scan a segment of the table and put each page in a queue, followed by None when finished
+        :param scan_args: Arguments of the scan request
+        :param segment: Segment number to scan
+        :param segments: Total number of segments
+        :param pages: Queue for the pages, or the exception if the scan fails
+        :param stop: Event that is set when the reader no longer wants pages
+        """
+        def _put(value: any) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(value, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        try:
+            for page in self._scan_pages({**scan_args, 'Segment': segment, 'TotalSegments': segments}):
+                if not _put(page):
+                    return
+        except Exception as e:
+            _put(e)
+            return
+        _put(None)
+
+    def _batch_write(self, requests: List[dict]) -> bool:
+        """
+        Send put and delete requests in chunks, resending the unprocessed items
+        :param requests: List of PutRequest and DeleteRequest dictionaries for BatchWriteItem
+        :return: True if all the requests were processed, otherwise False
+        """
+        client = self._get_client()
+        ok = True
+
+        for start in range(0, len(requests), self.BATCH_WRITE_LIMIT):
+            request = {self.table: requests[start:start + self.BATCH_WRITE_LIMIT]}
+            for attempt in range(self.BATCH_MAX_ATTEMPTS):
+                res = client.batch_write_item(RequestItems=request)
+                request = res.get('UnprocessedItems', {})
+                if not request:
+                    break
+                self._batch_backoff(attempt)
+            if request:
+                self.log.error(f'Failed to write {len(request[self.table])} items to {self.table}')
+                ok = False
+
+        return ok
+
+    def _batch_backoff(self, attempt: int) -> None:
+        """
+        Wait before resending unprocessed items, with exponential backoff and jitter
+        :param attempt: Number of attempts so far, starting from zero
+        """
+        if attempt < self.BATCH_MAX_ATTEMPTS - 1:
+            time.sleep(self.BATCH_BACKOFF * 2 ** attempt * (0.5 + random.random()))
+
+    def _get_key_values(self, data: dict) -> Tuple:
+        """
+        Get the values of the key fields of an item
+        :param data: Standard python dictionary with the key fields
+        :return: Tuple of key values
+        """
+        return tuple(data[key] for key in self.key_fields)
+
+    def _drop_empty_index_fields(self, data: dict) -> dict:
+        """
+        Leave out index key fields without a value, since dynamodb does not allow NULL index keys
+        :param data: Standard python dictionary to store
+        :return: Dictionary without the empty index key fields
+        """
+        if not any(data.get(key, 0) is None for key in self.index_fields):
+            return data
+        return {key: value for key, value in data.items() if value is not None or key not in self.index_fields}
+
     def _make_dynamo_key(self, data: dict) -> dict:
         """
         Create a key dictionary for a dynamodb item
@@ -208,53 +510,39 @@ class DynamoDao:
             normal_key[key] = data[key]
         return self._dict_to_dynamo(normal_key)
 
-    def _make_update_expression(self, data: dict) -> Union[str, None]:
+    def _make_update_args(self, data: dict) -> Union[dict, None]:
         """
-        Create an update expression with the dictionary
+        Create an update expression that sets the attributes with values and removes the attributes
+        with a value of None, using placeholders for the names so reserved words are allowed
         :param data: Data dictionary to update
-        :return: dynamodb update expression
-        """
-        update_expression = 'SET '
-        for key in data:
-            if key not in self.key_fields:
-                if data[key] is not None:
-                    update_expression += key + ' = :' + key + ', '
-
-        if update_expression == 'SET ':
-            return None
-
-        return update_expression[:-2]
-
-    def _make_remove_expression(self, data: dict) -> Union[str, None]:
-        """
-        Create an expression to remove fields
-        :param data: Data dictionary look for attributes with value of None
-        :return: dynamodb remove expression
+        :return: UpdateExpression, ExpressionAttributeNames, and ExpressionAttributeValues arguments,
+                 or None if there is nothing to update
         """
+        set_fields = []
         remove_fields = []
-        for key in data:
+        names = {}
+        values = {}
+        for i, key in enumerate(key for key in data if key not in self.key_fields):
+            names[f'#f{i}'] = key
             if data[key] is None:
-                if key not in self.key_fields:
-                    remove_fields.append(key)
+                remove_fields.append(f'#f{i}')
+            else:
+                set_fields.append(f'#f{i} = :f{i}')
+                values[f':f{i}'] = self._dict_to_dynamo(data[key], recursed=True)
 
-        if not remove_fields:
+        if not set_fields and not remove_fields:
             return None
 
-        update_expression = 'REMOVE ' + ','.join(remove_fields)
-        return update_expression
+        clauses = []
+        if set_fields:
+            clauses.append('SET ' + ', '.join(set_fields))
+        if remove_fields:
+            clauses.append('REMOVE ' + ', '.join(remove_fields))
 
-    def _make_expression_attribute_values(self, data: dict) -> dict:
-        """
-        Make expression update data
-        :param data: Data to update
-        :return: Expression update values
-        """
-        expression_attrs = {}
-        for key in data:
-            if data[key] is not None:
-                if key not in self.key_fields:
-                    expression_attrs[':' + key] = self._dict_to_dynamo(data[key], recursed=True)
-        return expression_attrs
+        update_args = {'UpdateExpression': ' '.join(clauses), 'ExpressionAttributeNames': names}
+        if values:
+            update_args['ExpressionAttributeValues'] = values
+        return update_args
 
     def _get_client(self) -> any:
         """
@@ -264,11 +552,11 @@ class DynamoDao:
         if self.client is not None:
             return self.client
 
-        session = get_aws_session()
-        self.client = session.client('dynamodb', endpoint_url=self.endpoint_url)
+        self.client = get_aws_client('dynamodb', endpoint_url=self.endpoint_url)
         return self.client
 
-    def _dict_to_dynamo(self, data: dict, set_ok: bool = False, recursed: bool = False) -> dict:
+    @staticmethod
+    def _dict_to_dynamo(data: dict, set_ok: bool = False, recursed: bool = False) -> dict:
         """
         Convert a standard python dictionary to a crazy dynamodb dictionary
         :param data: Standard python dictionary to convert
@@ -276,76 +564,17 @@ class DynamoDao:
         :param recursed: Caller should not specify this value.  Gets rid of 'M' on root dictionary.
         :return: Crazy dynamodb dictionary
         """
-        if isinstance(data, dict):
-            dynamo = {
-                key: self._dict_to_dynamo(value, set_ok, True)
-                for key, value in data.items()
-            }
-            if recursed:
-                return {'M': dynamo}
-            return dynamo
-
-        if isinstance(data, list):
-            if set_ok:
-                if all(isinstance(e, str) for e in data):
-                    return {'SS': data}
-                if all(isinstance(e, (int, float)) for e in data):
-                    return {'NS': [str(e) for e in data]}
-                if all(isinstance(e, (bytes, bytearray)) for e in data):
-                    return {'BS': [e for e in data]}
-            return {'L': [self._dict_to_dynamo(value, set_ok, True) for value in data]}
-
-        if isinstance(data, str):
-            return {'S': data}
-        if isinstance(data, bool):
-            return {'BOOL': data}
-        if isinstance(data, (int, float)):
-            return {'N': str(data)}
-        if isinstance(data, bytes):
-            return {'B': data}
-        if data is None:
-            return {'NULL': True}
-        assert False  # we missed a case
-
-    def _dynamo_to_dict(self, dynamo: dict, recursed: bool=False) -> any:
+        return dict_to_dynamo(data, set_ok, recursed)
+
+    @staticmethod
+    def _dynamo_to_dict(dynamo: dict, recursed: bool=False) -> any:
         """
         Convert a crazy dynamodb dictionary to a standard python dictionary
         :param dynamo: The crazy dynamodb dictionary to convert
         :param recursed: Caller should not specify this value
         :return: The standard python dictionary
         """
-        if not recursed:
-            return {
-                key: self._dynamo_to_dict(value, True)
-                for key, value in dynamo.items()
-            }
-
-        if 'S' in dynamo:
-            return dynamo['S']
-        if 'N' in dynamo and '.' in dynamo['N']:
-            return float(dynamo['N'])
-        if 'N' in dynamo and '.' not in dynamo['N']:
-            return int(dynamo['N'])
-        if 'B' in dynamo:
-            return dynamo['B']
-        if 'BOOL' in dynamo:
-            return dynamo['BOOL']
-        if 'NULL' in dynamo:
-            return None
-        if 'SS' in dynamo:
-            return dynamo['SS']
-        if 'NS' in dynamo and '.' in dynamo['NS'][0]:
-            return [float(e) for e in dynamo['NS']]
-        if 'NS' in dynamo and '.' not in dynamo['NS'][0]:
-            return [int(e) for e in dynamo['NS']]
-        if 'BS' in dynamo:
-            return dynamo['BS']
-        if 'L' in dynamo:
-            return [self._dynamo_to_dict(e, True) for e in dynamo['L']]
-        if 'M' in dynamo:
-            return self._dynamo_to_dict(dynamo['M'], False)
-
-        raise RuntimeError('Missed a case converting dynamo dict to normal dict')
+        return dynamo_to_dict(dynamo, recursed)
 
     @staticmethod
     def _response_ok(res: dict) -> bool:
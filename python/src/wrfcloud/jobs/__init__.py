@@ -3,13 +3,16 @@ Other code calling the wrfcloud.jobs module should mainly use functions from
 this file.  Calling other functions and classes may have unexpected results.
 """
 __all__ = ['WrfJob', 'JobDao', 'add_job_to_system', 'get_job_from_system', 'get_all_jobs_in_system',
-           'update_job_in_system', 'delete_job_from_system', 'LatLonPoint', 'WrfLayer']
+           'get_user_jobs_in_system', 'get_jobs_in_system_by_status', 'update_job_in_system',
+           'delete_job_from_system', 'get_job_cache_stats', 'clear_job_cache', 'LatLonPoint', 'WrfLayer']
 
 import os
 from typing import Union, List
 from wrfcloud.log import Logger
 from wrfcloud.jobs.job import WrfJob
 from wrfcloud.jobs.job_dao import JobDao
+from wrfcloud.jobs.job_cache import get_cached_job, cache_job, invalidate_cached_job
+from wrfcloud.jobs.job_cache import get_job_cache_stats, clear_job_cache
 from wrfcloud.subscribers import message_all_subscribers
 from wrfcloud.jobs.job import LatLonPoint
 from wrfcloud.jobs.job import WrfLayer
@@ -33,7 +36,8 @@ def add_job_to_system(new_job: WrfJob) -> bool:
 
 def get_job_from_system(job_id: str) -> Union[WrfJob, None]:
     """
-    Get a job from the system
+    Get a job from the system.  Finished jobs may come from the job cache, and must not be modified
+    unless they are updated in the system afterwards.
     :param job_id: User job ID
     :return User with matching job ID, or None
     """
@@ -41,11 +45,19 @@ def get_job_from_system(job_id: str) -> Union[WrfJob, None]:
     if job_id is None:
         return None
 
+    # finished jobs do not change, so use the cached job if there is one
+    job = get_cached_job(job_id)
+    if job is not None:
+        return job
+
     # get the job DAO
     dao = JobDao()
 
     # get job by job ID
-    return dao.get_job_by_id(job_id)
+    job = dao.get_job_by_id(job_id)
+    if job is not None:
+        cache_job(job)
+    return job
 
 
 def get_all_jobs_in_system(full_load: bool = True) -> List[WrfJob]:
@@ -57,7 +69,44 @@ def get_all_jobs_in_system(full_load: bool = True) -> List[WrfJob]:
     # create the data access object
     dao = JobDao()
 
-    return dao.get_all_jobs(full_load)
+    if not full_load:
+        return dao.get_all_jobs(False)
+
+    # use the cached jobs that have the same status code, and only load the layers of the others
+    jobs = dao.get_all_jobs(False)
+    cached_jobs = [get_cached_job(job.job_id, job.status_code) for job in jobs]
+    dao.load_all_layers([job for job, cached_job in zip(jobs, cached_jobs) if cached_job is None])
+    for job, cached_job in zip(jobs, cached_jobs):
+        if cached_job is None:
+            cache_job(job)
+
+    return [job if cached_job is None else cached_job for job, cached_job in zip(jobs, cached_jobs)]
+
+
+def get_user_jobs_in_system(user_email: str, full_load: bool = True) -> List[WrfJob]:
+    """
+    Get a list of the jobs started by a user
+    :param user_email: Email address of the user
+    :param full_load: Fully load the job data, or just the metadata (i.e. not including the layer information)
+    :return: A list of the user's jobs
+    """
+    # create the data access object
+    dao = JobDao()
+
+    return dao.get_jobs_by_user(user_email, full_load)
+
+
+def get_jobs_in_system_by_status(status_code: int, full_load: bool = True) -> List[WrfJob]:
+    """
+    Get a list of the jobs with a status code
+    :param status_code: One of the WrfJob.STATUS_CODE_* values
+    :param full_load: Fully load the job data, or just the metadata (i.e. not including the layer information)
+    :return: A list of the jobs with the status code
+    """
+    # create the data access object
+    dao = JobDao()
+
+    return dao.get_jobs_by_status(status_code, full_load)
 
 
 def update_job_in_system(update_job: WrfJob, notify_web: Union[bool, None] = None) -> bool:
@@ -70,15 +119,15 @@ def update_job_in_system(update_job: WrfJob, notify_web: Union[bool, None] = Non
     # create objects
     dao = JobDao()
 
-    # get the existing job
-    existing_job = dao.get_job_by_id(update_job.job_id)
-    if existing_job is None:
-        log.error('The job does not exist and cannot be updated: ' + update_job.job_id)
-        return False
-
-    # update job table
-    update_job.job_id = existing_job.job_id  # job_id is immutable
+    # update job table, which fails if the job does not exist or its layers cannot be written, and then
+    # remove the job from the job cache, even if the update failed, so the next read gets the job from the
+    # database.  Other warm Lambda containers keep their cached copy of the job until it expires (see
+    # job_cache.JOB_CACHE_TTL).
     updated = dao.update_job(update_job)
+    invalidate_cached_job(update_job.job_id)
+    if not updated:
+        log.error('Failed to update job: ' + update_job.job_id)
+        return False
 
     # message any websocket clients
     notify_web = os.environ['NOTIFY_WEB_CLIENTS'] if notify_web is None else notify_web
@@ -98,9 +147,11 @@ def delete_job_from_system(del_job: WrfJob) -> bool:
     # get the job DAO
     dao = JobDao()
 
-    # delete job
+    # delete job, and then remove it from the job cache of this container
     if del_job is not None:
-        return dao.delete_job(del_job)
+        deleted = dao.delete_job(del_job)
+        invalidate_cached_job(del_job.job_id)
+        return deleted
 
     log.error('Value for job to remove was set as None', ValueError('del_job cannot be None'))
     return False
@@ -6,8 +6,8 @@ import os
 import copy
 import base64
 import pkgutil
-from typing import Union, List
-from datetime import datetime
+from typing import Union, List, Dict, Tuple
+from datetime import datetime, timedelta
 import pytz
 from wrfcloud.log import Logger
 import wrfcloud.system
@@ -61,6 +61,14 @@ class WrfJob:
         self.end_date: Union[str, None] = None
         self.cores: Union[int, None] = None
 
+        # index of layer positions by valid time, variable, and z level, and the layers list it was built for
+        self._layer_index: Dict[str, int] = {}
+        self._indexed_layers: Union[List[WrfLayer], None] = None
+        self._indexed_count: int = 0
+
+        # digest of the layers manifest last read or written for this job, see JobDao.get_layers_digest
+        self.layers_digest: Union[str, None] = None
+
         # initialize from data if provided
         if data is not None:
             self.data = data
@@ -379,6 +387,20 @@ class WrfJob:
         """
         return self.output_frequency
 
+    @property
+    def output_dts(self) -> List[datetime]:
+        """
+        Get the valid time of every model output from the start to the end date/time
+        :return: List of UTC-localized datetimes in forecast order
+        """
+        increment = timedelta(seconds=self.output_freq_sec)
+        output_dts = []
+        this_dt = self.start_dt
+        while this_dt <= self.end_dt:
+            output_dts.append(this_dt)
+            this_dt = this_dt + increment
+        return output_dts
+
     @property
     def input_freq_sec(self) -> float:
         """
@@ -459,6 +481,33 @@ class WrfJob:
         if 'cores' in data:
             self.cores = data['cores']
 
+    def get_layer(self, valid_time: int, variable: str, z_level: Union[int, None]) -> Union['WrfLayer', None]:
+        """
+        Find a layer by valid time, variable, and z level without searching the list of layers
+        :param valid_time: The data valid time
+        :param variable: The model variable
+        :param z_level: Pressure level, or zero or None for 2D variable
+        :return: The first layer that matches, or None if the job does not have it
+        """
+        if not isinstance(self.layers, list):
+            return None
+
+        # index the layers again if the list was replaced or changed size since it was indexed
+        if self._indexed_layers is not self.layers or self._indexed_count != len(self.layers):
+            self.set_layer_index(WrfLayer.get_layer_index(self.layers))
+
+        position = self._layer_index.get(WrfLayer.get_index_key(valid_time, variable, z_level))
+        return None if position is None else self.layers[position]
+
+    def set_layer_index(self, index: Dict[str, int]) -> None:
+        """
+        Set the index of the current list of layers, e.g. one that was read with the layers
+        :param index: Position of the first layer with each index key, see WrfLayer.get_index_key
+        """
+        self._layer_index = index
+        self._indexed_layers = self.layers
+        self._indexed_count = len(self.layers)
+
     def send_complete_notification(self):
         """
         Send a complete email notification
@@ -484,8 +533,7 @@ class WrfJob:
                 }
             }
 
-            session = wrfcloud.system.get_aws_session()
-            ses = session.client('ses')
+            ses = wrfcloud.system.get_aws_client('ses')
             ses.send_email(Source=source, Destination=dest, Message=message)
 
             return True
@@ -535,6 +583,33 @@ class WrfLayer:
     """
     View details of a WRF layer
     """
+
+    # Layer data encodings: gzipped GeoJSON, or the compact binary format from the layer_encoding module
+    ENCODING_GEOJSON: str = 'geojson'
+    ENCODING_BINARY: str = 'binary'
+    ENCODINGS: List[str] = [ENCODING_GEOJSON, ENCODING_BINARY]
+
+    # Levels of detail for contour layers, from the coarsest simplified polygons to the full resolution
+    DETAIL_COARSE: str = 'coarse'
+    DETAIL_MEDIUM: str = 'medium'
+    DETAIL_FULL: str = 'full'
+    DETAIL_LEVELS: List[str] = [DETAIL_COARSE, DETAIL_MEDIUM, DETAIL_FULL]
+
+    # Densities of wind vector layers, named by the distance between points, from the sparsest to the
+    # native grid.  The 20 km density is the default layer data file.
+    DENSITY_80KM: str = '80km'
+    DENSITY_40KM: str = '40km'
+    DENSITY_20KM: str = '20km'
+    DENSITY_NATIVE: str = 'native'
+    DENSITIES: List[str] = [DENSITY_80KM, DENSITY_40KM, DENSITY_20KM, DENSITY_NATIVE]
+    DENSITY_DEFAULT: str = DENSITY_20KM
+
+    # Smallest distance between wind vectors on the screen in pixels when choosing a density
+    MIN_VECTOR_PIXELS: int = 40
+
+    # Variable names of the wind vector layers, whose data are JSON instead of GeoJSON
+    VECTOR_VARIABLES: List[str] = ['wind', 'wind_3d']
+
     def __init__(self, data: dict = None):
         """
         Initialize the WRF layer object
@@ -551,6 +626,11 @@ class WrfLayer:
         self.time_step: float = 0
         self.dt: int = 0
         self.plot_type: str = 'contour'  # or "vector"
+        self.encodings: List[str] = [WrfLayer.ENCODING_GEOJSON]
+        self.detail_levels: Dict[str, float] = {WrfLayer.DETAIL_FULL: 0}  # simplification tolerance in meters
+        self.tile_zooms: List[int] = []  # zoom levels with z/x/y tiles, empty if the layer is not tiled
+        self.bounds: Union[List[float], None] = None  # west, south, east, north in degrees
+        self.densities: Dict[str, float] = {}  # meters between vectors of each density, empty if only the default
 
         # initialize from data if provided
         if data is not None:
@@ -562,7 +642,178 @@ class WrfLayer:
         Get the date/time formatted as yyyymmddHHMMSS
         :return: Date/time as string
         """
-        return pytz.utc.localize(datetime.utcfromtimestamp(self.dt)).strftime('%Y%m%d%H%M%S')
+        return WrfLayer.get_dt_str(self.dt)
+
+    @staticmethod
+    def get_dt_str(dt: int) -> str:
+        """
+        Format a date/time as yyyymmddHHMMSS
+        :param dt: Date/time as seconds since the epoch
+        :return: Date/time as string
+        """
+        return pytz.utc.localize(datetime.utcfromtimestamp(dt)).strftime('%Y%m%d%H%M%S')
+
+    @staticmethod
+    def get_layer_key(job_prefix: str, valid_time: int, variable: str, z_level: Union[int, None],
+                      plot_type: str) -> str:
+        """
+        Get the S3 key of a layer data file, which depends only on the job and the layer
+        :param job_prefix: Key prefix of the layer files of the job, e.g. output/W70BA135451
+        :param valid_time: The data valid time
+        :param variable: The model variable
+        :param z_level: Pressure level, or zero or None for 2D variable
+        :param plot_type: Plot type of the layer, contour or vector
+        :return: S3 key, e.g. output/W70BA135451/wrf_DXX_20221122000000_2t_0.geojson.gz
+        """
+        z_level = z_level if z_level is not None else 0
+        file_type = 'json' if plot_type == 'vector' else 'geojson'
+        return f'{job_prefix}/wrf_DXX_{WrfLayer.get_dt_str(valid_time)}_{variable}_{z_level}.{file_type}.gz'
+
+    def get_layer_data(self, encoding: str = ENCODING_GEOJSON, detail_level: str = DETAIL_FULL) -> Union[str, None]:
+        """
+        Get the location of the layer data, a local file or S3 URL, in an encoding and level of detail
+        :param encoding: Layer data encoding, see WrfLayer.ENCODINGS
+        :param detail_level: Level of detail, see WrfLayer.DETAIL_LEVELS
+        :return: Location of the layer data, or None if the layer is not available in the encoding or level
+        """
+        if encoding not in self.encodings or detail_level not in self.detail_levels:
+            return None
+        if not isinstance(self.layer_data, str):
+            return None
+        return WrfLayer.get_file_name(self.layer_data, encoding, detail_level)
+
+    @property
+    def layer_data_variants(self) -> List[Tuple[str, str]]:
+        """
+        Get every encoding and level of detail that the layer data are available in
+        :return: List of encoding and detail level pairs
+        """
+        return [(encoding, detail_level) for encoding in self.encodings for detail_level in self.detail_levels]
+
+    def get_detail_level(self, meters_per_pixel: float) -> str:
+        """
+        Get the coarsest level of detail that looks the same as the full resolution at a map scale
+        :param meters_per_pixel: Size of a screen pixel on the map
+        :return: Level of detail, see WrfLayer.DETAIL_LEVELS
+        """
+        for detail_level in WrfLayer.DETAIL_LEVELS:
+            if detail_level in self.detail_levels and self.detail_levels[detail_level] <= meters_per_pixel:
+                return detail_level
+        return WrfLayer.DETAIL_FULL
+
+    def get_density(self, meters_per_pixel: float) -> Union[str, None]:
+        """
+        Get the densest vector density that keeps the vectors apart at a map scale
+        :param meters_per_pixel: Size of a screen pixel on the map
+        :return: Vector density, see WrfLayer.DENSITIES, or None if the layer has only the default density
+        """
+        if not self.densities:
+            return None
+        densities = [density for density in WrfLayer.DENSITIES if density in self.densities]
+        fitting = [density for density in densities
+                   if self.densities[density] >= WrfLayer.MIN_VECTOR_PIXELS * meters_per_pixel]
+        return fitting[-1] if fitting else densities[0]
+
+    def get_density_data(self, density: str) -> Union[str, None]:
+        """
+        Get the location of the vector layer data, a local file or S3 URL, in a density
+        :param density: Vector density, see WrfLayer.DENSITIES
+        :return: Location of the layer data, or None if the layer is not available in the density
+        """
+        if not isinstance(self.layer_data, str):
+            return None
+        if density not in self.densities:
+            return self.layer_data if density == WrfLayer.DENSITY_DEFAULT else None
+        return WrfLayer.get_density_file_name(self.layer_data, density)
+
+    @property
+    def index_key(self) -> str:
+        """
+        Get the key that identifies this layer within a job
+        :return: Key made from the valid time, variable, and z level
+        """
+        return WrfLayer.get_index_key(self.dt, self.variable_name, self.z_level)
+
+    @staticmethod
+    def get_index_key(valid_time: Union[int, float], variable: str, z_level: Union[int, float, None]) -> str:
+        """
+        Get the key that identifies a layer within a job.  A z level of None is the same as zero.
+        :param valid_time: The data valid time
+        :param variable: The model variable
+        :param z_level: Pressure level, or zero or None for 2D variable
+        :return: Key, e.g. 1669075200/2t/0
+        """
+        numbers = [int(value) if isinstance(value, float) and value.is_integer() else value
+                   for value in (valid_time, z_level or 0)]
+        return f'{numbers[0]}/{variable}/{numbers[1]}'
+
+    @staticmethod
+    def get_layer_index(layers: List['WrfLayer']) -> Dict[str, int]:
+        """
+        Index a list of layers by valid time, variable, and z level
+        :param layers: List of layers
+        :return: Position of the first layer with each index key
+        """
+        index = {}
+        for position, layer in enumerate(layers):
+            index.setdefault(layer.index_key, position)
+        return index
+
+    @staticmethod
+    def get_density_file_name(vector_file: str, density: str) -> str:
+        """
+        Get the name of the vector layer file in a density that sits next to the default density file
+        :param vector_file: Default density vector JSON file name, local path or S3 URL
+        :param density: Vector density, see WrfLayer.DENSITIES
+        :return: Layer file name, e.g. wrf_DXX_20230102030000_wind_0.80km.json.gz
+        """
+        if density == WrfLayer.DENSITY_DEFAULT:
+            return vector_file
+        base = vector_file[:-len('.json.gz')] if vector_file.endswith('.json.gz') else vector_file
+        return f'{base}.{density}.json.gz'
+
+    @staticmethod
+    def get_file_name(geojson_file: str, encoding: str = ENCODING_GEOJSON, detail_level: str = DETAIL_FULL) -> str:
+        """
+        Get the name of the layer file in an encoding and level of detail that sits next to a GeoJSON file
+        :param geojson_file: Full resolution GeoJSON file name, local path or S3 URL
+        :param encoding: Layer data encoding, see WrfLayer.ENCODINGS
+        :param detail_level: Level of detail, see WrfLayer.DETAIL_LEVELS
+        :return: Layer file name, e.g. wrf_DXX_20230102030000_T2_0.coarse.wcl.gz
+        """
+        if encoding == WrfLayer.ENCODING_GEOJSON and detail_level == WrfLayer.DETAIL_FULL:
+            return geojson_file
+        base = geojson_file[:-len('.geojson.gz')] if geojson_file.endswith('.geojson.gz') else geojson_file
+        level = '' if detail_level == WrfLayer.DETAIL_FULL else f'.{detail_level}'
+        extension = '.wcl.gz' if encoding == WrfLayer.ENCODING_BINARY else '.geojson.gz'
+        return f'{base}{level}{extension}'
+
+    def get_tile_data(self, zoom: int, x: int, y: int) -> Union[str, None]:
+        """
+        Get the location of a z/x/y tile of the layer data, a local file or S3 URL
+        :param zoom: Tile zoom level
+        :param x: Tile X coordinate
+        :param y: Tile Y coordinate
+        :return: Location of the tile, or None if the layer is not tiled at the zoom level
+        """
+        if zoom not in self.tile_zooms or not isinstance(self.layer_data, str):
+            return None
+        return WrfLayer.get_tile_file_name(self.layer_data, zoom, x, y)
+
+    @staticmethod
+    def get_tile_file_name(layer_file: str, zoom: int, x: int, y: int) -> str:
+        """
+        Get the name of a tile file in the tile directory that sits next to a layer file
+        :param layer_file: Full resolution layer file name, local path or S3 URL
+        :param zoom: Tile zoom level
+        :param x: Tile X coordinate
+        :param y: Tile Y coordinate
+        :return: Tile file name, e.g. wrf_DXX_20230102030000_T2_0.tiles/6/15/24.geojson.gz
+        """
+        for extension in ['.geojson.gz', '.json.gz']:
+            if layer_file.endswith(extension):
+                return f'{layer_file[:-len(extension)]}.tiles/{zoom}/{x}/{y}{extension}'
+        return f'{layer_file}.tiles/{zoom}/{x}/{y}'
 
     @property
     def data(self) -> dict:
@@ -582,6 +833,11 @@ class WrfLayer:
             'time_step': self.time_step,
             'dt': self.dt,
             'plot_type': self.plot_type,
+            'encodings': self.encodings,
+            'detail_levels': self.detail_levels,
+            'tile_zooms': self.tile_zooms,
+            'bounds': self.bounds,
+            'densities': self.densities,
         }
 
     @data.setter
@@ -601,6 +857,11 @@ class WrfLayer:
         self.time_step = data['time_step'] if 'time_step' in data else 0
         self.dt = data['dt'] if 'dt' in data else 0
         self.plot_type = data['plot_type'] if 'plot_type' in data else 'contour'
+        self.encodings = data['encodings'] if 'encodings' in data else [WrfLayer.ENCODING_GEOJSON]
+        self.detail_levels = data['detail_levels'] if 'detail_levels' in data else {WrfLayer.DETAIL_FULL: 0}
+        self.tile_zooms = data['tile_zooms'] if 'tile_zooms' in data else []
+        self.bounds = data['bounds'] if 'bounds' in data else None
+        self.densities = data['densities'] if 'densities' in data else {}
 
 
 class Palette:
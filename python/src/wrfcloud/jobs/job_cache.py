@@ -0,0 +1,91 @@
+"""
+Cache of fully loaded jobs, so warm Lambda containers do not read the same job item and layers manifest
+for every request.  Only finished jobs are cached, because their layers do not change.  A cached job is
+used while its status code matches the one in the database, when the caller knows it, and is dropped
+after a time-to-live.  Updating or deleting a job only removes it from the cache of the process that did
+it, so other warm Lambda containers keep their copy of the job until it expires.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Dict, Tuple, Union
+from wrfcloud.jobs.job import WrfJob
+
+
+# Maximum number of cached jobs and the seconds each stays in the cache
+JOB_CACHE_SIZE: int = 256
+JOB_CACHE_TTL: float = 600
+
+# Cached jobs and the time each was added, from the least to the most recently used
+_JOB_CACHE_LOCK = Lock()
+_JOB_CACHE: OrderedDict[str, Tuple[float, WrfJob]] = OrderedDict()
+_JOB_CACHE_STATS: Dict[str, int] = {'hits': 0, 'misses': 0}
+
+
+def get_cached_job(job_id: str, status_code: Union[int, None] = None) -> Union[WrfJob, None]:
+    """
+    Get a job from the cache.  The job is shared with other callers and must not be modified.
+    :param job_id: Job ID
+    :param status_code: Current status code of the job, or None if it is not known
+    :return: The cached job, or None if it is not cached, expired, or has a different status code
+    """
+    with _JOB_CACHE_LOCK:
+        entry = _JOB_CACHE.get(job_id)
+        if entry is not None:
+            cached_time, job = entry
+            if monotonic() - cached_time < JOB_CACHE_TTL and status_code in [None, job.status_code]:
+                _JOB_CACHE.move_to_end(job_id)
+                _JOB_CACHE_STATS['hits'] += 1
+                return job
+            _JOB_CACHE.pop(job_id)
+
+        _JOB_CACHE_STATS['misses'] += 1
+        return None
+
+
+def cache_job(job: WrfJob) -> None:
+    """
+    Add a fully loaded job to the cache, if it is finished, and remove the least recently used job if
+    the cache is full
+    :param job: Job with its layers loaded
+    :return: None
+    """
+    if job.status_code != WrfJob.STATUS_CODE_FINISHED or not isinstance(job.layers, list):
+        return
+
+    with _JOB_CACHE_LOCK:
+        _JOB_CACHE[job.job_id] = (monotonic(), job)
+        _JOB_CACHE.move_to_end(job.job_id)
+        while len(_JOB_CACHE) > JOB_CACHE_SIZE:
+            _JOB_CACHE.popitem(last=False)
+
+
+def invalidate_cached_job(job_id: str) -> None:
+    """
+    Remove a job from the cache, e.g. after its status changes
+    :param job_id: Job ID
+    :return: None
+    """
+    with _JOB_CACHE_LOCK:
+        _JOB_CACHE.pop(job_id, None)
+
+
+def get_job_cache_stats() -> Dict[str, int]:
+    """
+    Get the number of times the cache had a job or not
+    :return: Dictionary with 'hits', 'misses', and 'jobs', the number of cached jobs
+    """
+    with _JOB_CACHE_LOCK:
+        return {**_JOB_CACHE_STATS, 'jobs': len(_JOB_CACHE)}
+
+
+def clear_job_cache() -> None:
+    """
+    Remove all the cached jobs, and reset the counters
+    :return: None
+    """
+    with _JOB_CACHE_LOCK:
+        _JOB_CACHE.clear()
+        _JOB_CACHE_STATS['hits'] = 0
+        _JOB_CACHE_STATS['misses'] = 0
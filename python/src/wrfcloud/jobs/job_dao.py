@@ -4,14 +4,18 @@ The JobDao class is a data access object that performs basic CRUD
 """
 
 import os
+import gzip
+import hashlib
+import json
 import pkgutil
-from typing import Union, List
+from typing import Union, List, Dict, Tuple
 from concurrent.futures import Future, ThreadPoolExecutor, wait
 import yaml
 from wrfcloud.dynamodb import DynamoDao
 from wrfcloud.jobs.job import WrfJob
 from wrfcloud.jobs.job import WrfLayer
-from wrfcloud.system import get_aws_session
+from wrfcloud.system import get_aws_client
+from wrfcloud.jobs.tiles import list_tiles
 
 
 class JobDao(DynamoDao):
@@ -19,6 +23,21 @@ class JobDao(DynamoDao):
     CRUD operations for jobs
     """
 
+    """
+    Name of the S3 object with the layers of a job, gzipped JSON with an index of the layers
+    """
+    LAYERS_MANIFEST: str = 'layers.json.gz'
+
+    """
+    Version of the layers manifest format
+    """
+    LAYERS_MANIFEST_VERSION: int = 1
+
+    """
+    Maximum number of S3 objects to delete in one request
+    """
+    MAX_DELETE_KEYS: int = 1000
+
     def __init__(self, endpoint_url: str = None):
         """
         Create the Data Access Object (DAO)
@@ -30,15 +49,16 @@ class JobDao(DynamoDao):
         # get the table name
         table_name = os.environ[self.table_definition['table_name_var']]
 
-        # get the key fields for the table
+        # get the key fields for the table and its indexes
         key_fields = self.table_definition['key_fields']
+        index_fields = self.table_definition['index_fields']
 
         # get the endpoint URL, but do not overwrite the local argument
         if endpoint_url is None and 'ENDPOINT_URL' in os.environ:
             endpoint_url = os.environ['ENDPOINT_URL']
 
         # call the super constructor
-        super().__init__(table_name, key_fields, endpoint_url)
+        super().__init__(table_name, key_fields, endpoint_url, index_fields)
 
     def add_job(self, job: WrfJob) -> bool:
         """
@@ -91,28 +111,90 @@ class JobDao(DynamoDao):
 
         # load the layers attribute from S3
         if full_load:
-            tpe = ThreadPoolExecutor(max_workers=16)
-            futures: List[Future] = [tpe.submit(self._load_layers, job) for job in jobs]
-            wait(futures)
+            self.load_all_layers(jobs)
+
+        return jobs
+
+    def get_jobs_by_user(self, user_email: str, full_load: bool = True) -> List[WrfJob]:
+        """
+        Get a list of the jobs started by a user, without reading the other jobs
+        :param user_email: Email address of the user
+        :param full_load: Fully load the job data, or just the metadata (i.e. not including the layer information)
+        :return: List of the user's jobs
+        """
+        # read every page of the query results
+        jobs: List[WrfJob] = []
+        last_key = None
+        while True:
+            items, last_key = super().query('user_email = :user_email', {':user_email': user_email},
+                                            index_name='user_email-index', start_key=last_key)
+            jobs += [WrfJob(item) for item in items]
+            if last_key is None:
+                break
+
+        # load the layers attribute from S3
+        if full_load:
+            self.load_all_layers(jobs)
+
+        return jobs
+
+    def get_jobs_by_status(self, status_code: int, full_load: bool = True) -> List[WrfJob]:
+        """
+        Get a list of the jobs with a status code.  There are only a few status codes, so an index on the
+        status code would put nearly every job in one partition, and the table is scanned with a filter instead.
+        :param status_code: One of the WrfJob.STATUS_CODE_* values
+        :param full_load: Fully load the job data, or just the metadata (i.e. not including the layer information)
+        :return: List of the jobs with the status code
+        """
+        items = super().get_all_items(filter_expression='status_code = :status_code',
+                                      expression_values={':status_code': status_code})
+        jobs: List[WrfJob] = [WrfJob(item) for item in items]
+
+        # load the layers attribute from S3
+        if full_load:
+            self.load_all_layers(jobs)
 
         return jobs
 
     def update_job(self, job: WrfJob) -> bool:
         """
-        Update the job data
+        Update the job data, if the job exists
         :param job: Job data values to update, which must include the key field (job_id)
         :return: True if successful, otherwise False
         """
         # clone the job because we will modify the data
         job_clone: WrfJob = WrfJob(job.data)
 
-        # save layers to S3
+        # only write the layers manifest if the layers changed since they were read or written
+        manifest_json: Union[bytes, None] = None
         if isinstance(job_clone.layers, list):
-            ok = self._save_layers(job_clone)
-            if not ok: return False
+            manifest_json = self._encode_layers_json(job_clone.layers)
+            if self.get_layers_digest(manifest_json) == job.layers_digest:
+                manifest_json = None
+            bucket_name, key = self._get_layers_location(job.job_id)
+            job_clone.layers = f's3://{bucket_name}/{key}'
+
+        # write the layers manifest before the item points to it, and leave the item as it is if the
+        # manifest cannot be written, so the item never points to a manifest that does not exist
+        if manifest_json is not None and not self._put_layers(job.job_id, gzip.compress(manifest_json)):
+            self.log.error(f'The job was not updated because its layers cannot be written: {job.job_id}')
+            return False
 
-        # update the item to the database
-        return super().update_item(job_clone.data)
+        # update the item to the database, in the same request that checks it exists
+        updated, condition_met = super()._update_item(job_clone.data,
+                                                      condition_expression='attribute_exists(job_id)')
+        if not condition_met:
+            self.log.error(f'The job does not exist: {job.job_id}')
+            if manifest_json is not None:
+                self._delete_layers_manifest(job.job_id)
+            return False
+        if not updated:
+            self.log.error(f'The job cannot be updated: {job.job_id}')
+            return False
+
+        if manifest_json is not None:
+            job.layers_digest = self.get_layers_digest(manifest_json)
+        return True
 
     def delete_job(self, job: WrfJob) -> bool:
         """
@@ -137,7 +219,8 @@ class JobDao(DynamoDao):
         """
         return super().create_table(
             self.table_definition['attribute_definitions'],
-            self.table_definition['key_schema']
+            self.table_definition['key_schema'],
+            self.table_definition['global_secondary_indexes']
         )
 
     def _save_layers(self, job: WrfJob) -> bool:
@@ -151,32 +234,47 @@ class JobDao(DynamoDao):
         if not isinstance(layers, list):
             return False
 
-        # create a yaml representation of the data
-        layers_yaml: bytes = yaml.safe_dump([layer.data for layer in layers],
-                                            indent=2).encode()
+        # create the layers manifest and upload it to S3
+        manifest_json: bytes = self._encode_layers_json(layers)
+        if not self._put_layers(job.job_id, gzip.compress(manifest_json)):
+            return False
 
-        # generate the S3 url
-        bucket_name: str = os.environ['WRFCLOUD_BUCKET']
-        key: str = 'layers.yaml'
-        prefix: str = f'jobs/{job.job_id}'
+        # set the S3 url in the job data
+        bucket_name, key = self._get_layers_location(job.job_id)
+        job.layers = f's3://{bucket_name}/{key}'
+        job.layers_digest = self.get_layers_digest(manifest_json)
 
-        # upload the data to S3
+        return True
+
+    def _put_layers(self, job_id: str, manifest: bytes) -> bool:
+        """
+        Upload a layers manifest to S3
+        :param job_id: Job ID
+        :param manifest: Gzipped layers manifest
+        :return: True if successful, otherwise False
+        """
+        bucket_name, key = self._get_layers_location(job_id)
         try:
-            s3 = get_aws_session().client('s3')
+            s3 = get_aws_client('s3')
             s3.put_object(
-                Body=layers_yaml,
+                Body=manifest,
                 Bucket=bucket_name,
-                Key=f'{prefix}/{key}'
+                Key=key
             )
         except Exception as e:
             self.log.error('Failed to write WrfJob.layer data to S3', e)
             return False
 
-        # set the S3 url in the job data
-        job.layers = f's3://{bucket_name}/{prefix}/{key}'
-
         return True
 
+    def _get_layers_location(self, job_id: str) -> Tuple[str, str]:
+        """
+        Get the S3 bucket and key of the layers manifest of a job
+        :param job_id: Job ID
+        :return: Bucket name and key
+        """
+        return os.environ['WRFCLOUD_BUCKET'], f'jobs/{job_id}/{self.LAYERS_MANIFEST}'
+
     def _load_layers(self, job: WrfJob) -> bool:
         """
         Load the layers attribute from S3
@@ -196,8 +294,8 @@ class JobDao(DynamoDao):
 
         # retrieve data from S3
         try:
-            s3 = get_aws_session().client('s3')
-            layers_yaml: bytes = s3.get_object(
+            s3 = get_aws_client('s3')
+            layers_data: bytes = s3.get_object(
                 Bucket=bucket_name,
                 Key=prefix_key,
             )['Body'].read()
@@ -205,11 +303,71 @@ class JobDao(DynamoDao):
             self.log.error('Failed to read WrfJob.layer data from S3', e)
             return False
 
-        # convert YAML to Python list of dictionaries, then convert
-        # dictionaries to WrfLayer and set job layers
-        job.layers = [WrfLayer(layer) for layer in yaml.safe_load(layers_yaml)]
+        # convert the manifest, or the YAML written before there were manifests, to WrfLayer objects
+        # and set job layers and their index
+        layers, index = self.decode_layers(layers_data, prefix_key)
+        job.layers = layers
+        job.set_layer_index(index)
+        if not prefix_key.endswith('.yaml'):
+            job.layers_digest = self.get_layers_digest(gzip.decompress(layers_data))
         return True
 
+    @staticmethod
+    def encode_layers(layers: List[WrfLayer]) -> bytes:
+        """
+        Create a layers manifest, with an index of the layer positions by valid time, variable, and z level
+        :param layers: List of layers
+        :return: Gzipped JSON manifest
+        """
+        return gzip.compress(JobDao._encode_layers_json(layers))
+
+    @staticmethod
+    def _encode_layers_json(layers: List[WrfLayer]) -> bytes:
+        """
+        Create a layers manifest before it is gzipped
+        :param layers: List of layers
+        :return: JSON manifest
+        """
+        manifest = {
+            'version': JobDao.LAYERS_MANIFEST_VERSION,
+            'index': WrfLayer.get_layer_index(layers),
+            'layers': [layer.data for layer in layers]
+        }
+        return json.dumps(manifest, separators=(',', ':')).encode()
+
+    @staticmethod
+    def get_layers_digest(manifest_json: bytes) -> str:
+        """
+        Get a digest of a layers manifest, to tell whether the layers changed since they were read or written
+        :param manifest_json: JSON manifest, before it is gzipped
+        :return: Hex digest
+        """
+        return hashlib.sha256(manifest_json).hexdigest()
+
+    @staticmethod
+    def decode_layers(layers_data: bytes, key: str) -> Tuple[List[WrfLayer], Dict[str, int]]:
+        """
+        Read a layers manifest, or a layers.yaml file
+        :param layers_data: Contents of the S3 object
+        :param key: S3 key of the object, which tells the format
+        :return: List of layers, and the index of the layer positions
+        """
+        if key.endswith('.yaml'):
+            layers = [WrfLayer(layer) for layer in yaml.safe_load(layers_data)]
+            return layers, WrfLayer.get_layer_index(layers)
+
+        manifest = json.loads(gzip.decompress(layers_data))
+        return [WrfLayer(layer) for layer in manifest['layers']], manifest['index']
+
+    def load_all_layers(self, jobs: List[WrfJob]) -> None:
+        """
+        Load the layers attribute of many jobs from S3 at the same time
+        :param jobs: Load layers into these objects
+        """
+        tpe = ThreadPoolExecutor(max_workers=16)
+        futures: List[Future] = [tpe.submit(self._load_layers, job) for job in jobs]
+        wait(futures)
+
     def _delete_layers(self, job: WrfJob) -> bool:
         """
         Delete the layers from the S3 bucket
@@ -222,16 +380,29 @@ class JobDao(DynamoDao):
         layers: List[WrfLayer] = job.layers
 
         # get an s3 client
-        s3 = get_aws_session().client('s3')
-
-        # if layers is dictionary, we can't delete S3, so return False
-        for layer in layers:
-            if isinstance(layer, WrfLayer) and layer.layer_data.startswith('s3://'):
+        s3 = get_aws_client('s3')
+
+        # collect every file of every layer that was uploaded to S3
+        keys: Dict[str, List[str]] = {}
+        for layer in layers if isinstance(layers, list) else []:
+            if isinstance(layer, WrfLayer) and isinstance(layer.layer_data, str) and \
+                    layer.layer_data.startswith('s3://'):
+                for s3_url in self.get_layer_files(layer):
+                    bucket_name, prefix_key = self._get_layers_s3bucket_and_key(s3_url)
+                    if bucket_name is not None:
+                        keys.setdefault(bucket_name, []).append(prefix_key)
+
+        # delete the files in as few requests as possible
+        for bucket_name, bucket_keys in keys.items():
+            for i in range(0, len(bucket_keys), self.MAX_DELETE_KEYS):
+                objects = [{'Key': key} for key in bucket_keys[i:i + self.MAX_DELETE_KEYS]]
                 try:
-                    bucket_name, prefix_key = self._get_layers_s3bucket_and_key(layer.layer_data)
-                    s3.delete_object(Bucket=bucket_name, Key=prefix_key)
+                    response = s3.delete_objects(Bucket=bucket_name, Delete={'Objects': objects, 'Quiet': True})
+                    for error in response.get('Errors', []):
+                        self.log.error(f'Failed to delete layer data: s3://{bucket_name}/{error["Key"]} '
+                                       f'{error.get("Message", "")}')
                 except Exception as e:
-                    self.log.error(f'Failed to delete layer data: {layer.layer_data}', e)
+                    self.log.error(f'Failed to delete layer data from s3://{bucket_name}', e)
 
         # extract bucket name and prefix/key from S3 URL
         bucket_name, prefix_key = self._get_layers_s3bucket_and_key(layers_url)
@@ -247,6 +418,36 @@ class JobDao(DynamoDao):
 
         return True
 
+    def _delete_layers_manifest(self, job_id: str) -> bool:
+        """
+        Delete the layers manifest of a job from S3, without the layer data it lists
+        :param job_id: Job ID
+        :return: True if successful, otherwise False
+        """
+        bucket_name, key = self._get_layers_location(job_id)
+        try:
+            s3 = get_aws_client('s3')
+            s3.delete_object(Bucket=bucket_name, Key=key)
+        except Exception as e:
+            self.log.error('Failed to delete WrfJob.layer data from S3', e)
+            return False
+
+        return True
+
+    @staticmethod
+    def get_layer_files(layer: WrfLayer) -> List[str]:
+        """
+        Get the location of every file of a layer: the layer data in each encoding and level of detail, the
+        vector layer data in each density, and the z/x/y tiles
+        :param layer: Layer with its layer data location
+        :return: List of local files or S3 URLs
+        """
+        files = [layer.layer_data]
+        files += [layer.get_layer_data(encoding, detail_level) for encoding, detail_level in layer.layer_data_variants]
+        files += [layer.get_density_data(density) for density in layer.densities]
+        files += [layer.get_tile_data(zoom, x, y) for zoom, x, y in list_tiles(layer.tile_zooms, layer.bounds)]
+        return list(dict.fromkeys(file for file in files if file is not None))
+
     def _get_layers_s3bucket_and_key(self, layers_url: str) -> tuple[str, str]:
         """
         Get the S3 bucket name and key with prefix for the layers S3 object
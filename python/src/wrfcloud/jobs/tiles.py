@@ -0,0 +1,93 @@
+"""
+Module with the Web Mercator z/x/y tile grid of the layer tiles.  It only uses the math module, so the
+API can find the tiles of a layer without the post-processing dependencies.
+"""
+import math
+from typing import List, Tuple
+
+
+"""
+Size of a pixel at the equator at zoom level zero on a Web Mercator map with 256 pixel tiles
+"""
+METERS_PER_PIXEL_AT_ZOOM_0 = 156543.03392
+
+"""
+Latitude limit of the Web Mercator projection
+"""
+MAX_LATITUDE = 85.0511287798
+
+
+def get_meters_per_pixel(zoom: float, latitude: float) -> float:
+    """
+    Get the size of a screen pixel on a Web Mercator map
+    :param zoom: Map zoom level
+    :param latitude: Latitude where the scale is calculated
+    :return: Size of a pixel in meters
+    """
+    return METERS_PER_PIXEL_AT_ZOOM_0 * math.cos(math.radians(latitude)) / 2 ** zoom
+
+
+def lon_to_tile_x(lon: float, zoom: int) -> float:
+    """
+    Convert longitude to a fractional tile X coordinate
+    :param lon: Longitude in degrees
+    :param zoom: Zoom level
+    :return: Tile X coordinate
+    """
+    return (lon + 180) / 360 * 2 ** zoom
+
+
+def lat_to_tile_y(lat: float, zoom: int) -> float:
+    """
+    Convert latitude to a fractional tile Y coordinate, which increases southward
+    :param lat: Latitude in degrees
+    :param zoom: Zoom level
+    :return: Tile Y coordinate
+    """
+    lat = math.radians(min(MAX_LATITUDE, max(-MAX_LATITUDE, lat)))
+    return (1 - math.asinh(math.tan(lat)) / math.pi) / 2 * 2 ** zoom
+
+
+def get_tile_range(bounds: List[float], zoom: int) -> Tuple[int, int, int, int]:
+    """
+    Get the range of tiles that cover a bounding box
+    :param bounds: West, south, east, and north bounds in degrees
+    :param zoom: Zoom level
+    :return: Minimum X, minimum Y, maximum X, and maximum Y tile coordinates
+    """
+    last = 2 ** zoom - 1
+    x_min = min(last, max(0, int(math.floor(lon_to_tile_x(bounds[0], zoom)))))
+    x_max = min(last, max(0, int(math.floor(lon_to_tile_x(bounds[2], zoom)))))
+    y_min = min(last, max(0, int(math.floor(lat_to_tile_y(bounds[3], zoom)))))
+    y_max = min(last, max(0, int(math.floor(lat_to_tile_y(bounds[1], zoom)))))
+    return x_min, y_min, x_max, y_max
+
+
+def get_tile_bounds(zoom: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """
+    Get the bounding box of a tile
+    :param zoom: Zoom level
+    :param x: Tile X coordinate
+    :param y: Tile Y coordinate
+    :return: West, south, east, and north bounds in degrees
+    """
+    n = 2 ** zoom
+    west = x / n * 360 - 180
+    east = (x + 1) / n * 360 - 180
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def list_tiles(tile_zooms: List[int], bounds: List[float]) -> List[Tuple[int, int, int]]:
+    """
+    List every tile of a layer
+    :param tile_zooms: Zoom levels with tiles
+    :param bounds: West, south, east, and north bounds of the layer in degrees
+    :return: List of zoom, X, and Y tile coordinates
+    """
+    tiles = []
+    for zoom in tile_zooms:
+        x_min, y_min, x_max, y_max = get_tile_range(bounds, zoom)
+        tiles += [(zoom, x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)]
+    return tiles
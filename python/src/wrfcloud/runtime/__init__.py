@@ -2,7 +2,7 @@
 Shared classes and functions for the WRF runtime
 """
 
-__all__ = ['run', 'tools', 'geogrid', 'ungrib', 'metgrid', 'real', 'wrf', 'postproc', 'Process']
+__all__ = ['run', 'tools', 'geogrid', 'ungrib', 'metgrid', 'real', 'wrf', 'postproc', 'pipeline', 'Process']
 
 import os
 from typing import Union, List
@@ -79,15 +79,18 @@ class Process:
         os.symlink(target, link)
         return True
 
-    def submit_job(self, exe_name: str, n_tasks: int, partition_name: str) -> bool:
+    def submit_job(self, exe_name: str, n_tasks: int, partition_name: str, work_dir: Union[str, None] = None) -> bool:
         """
         Create a job card file and submit it to the slurm scheduler
         :param exe_name: Name of executable
         :param n_tasks: Int number of MPI tasks
         :param partition_name: Partition name
+        :param work_dir: Directory to run the job in, defaults to the current working directory
         :return: True if successfully submitted to the batch queue
         """
         slurm_file = exe_name + ".sbatch"
+        if work_dir is not None:
+            slurm_file = os.path.join(work_dir, slurm_file)
         with open(slurm_file, "w") as file_handle:
             file_handle.write('#!/bin/bash\n')
             file_handle.write(f'#SBATCH --job-name={exe_name}\n')
@@ -104,7 +107,10 @@ class Process:
         # submit the job to the batch queue
         # TODO: get job ID by using subprocess -- os.system returns success status
         self.log.info(f'Submitted {exe_name} to {partition_name}.')
-        if os.system(f'/opt/slurm/bin/sbatch -p {partition_name} -W {slurm_file}'):
+        sbatch_cmd = f'/opt/slurm/bin/sbatch -p {partition_name} -W {slurm_file}'
+        if work_dir is not None:
+            sbatch_cmd = f'cd {work_dir} && {sbatch_cmd}'
+        if os.system(sbatch_cmd):
             self.log.error(f'sbatch returned non-zero')
             return False
 
@@ -7,6 +7,7 @@ import f90nml
 from wrfcloud.jobs import WrfJob
 from wrfcloud.system import get_aws_session
 from wrfcloud.runtime import Process
+from wrfcloud.runtime.tools.upload_pool import UploadPool
 
 
 class GeoGrid(Process):
@@ -243,20 +244,13 @@ class GeoGrid(Process):
         """
         prefix: str = f'configurations/{self.run_name}'
         self.log.debug(f'Uploading geo_em files to s3://{self.bucket_name}/{prefix}')
-        for filename in glob.glob(os.path.join(self.config_dir, f'geo_em.d*.nc')):
-            key: str = os.path.basename(filename)
-
-            # upload the data to S3
-            self.log.debug(f'Uploading {filename} to s3://{self.bucket_name}/{prefix}/{key}')
-            try:
-                s3 = get_aws_session().client('s3')
-                s3.upload_file(
-                    Filename=filename,
-                    Bucket=self.bucket_name,
-                    Key=f'{prefix}/{key}'
-                )
-            except Exception as e:
-                self.log.error(f'Failed to write {key} data to S3', e)
-                return False
+        files = [(filename, self.bucket_name, f'{prefix}/{os.path.basename(filename)}')
+                 for filename in glob.glob(os.path.join(self.config_dir, f'geo_em.d*.nc'))]
 
-        return True
+        # upload the data to S3
+        with UploadPool() as uploads:
+            failures = uploads.upload(files)
+        for filename, e in failures:
+            self.log.error(f'Failed to write {os.path.basename(filename)} data to S3', e)
+
+        return not failures
@@ -0,0 +1,167 @@
+"""
+Functions for running WRF and post-processing each output file as soon as WRF finishes writing it
+"""
+
+import os
+from datetime import datetime
+from threading import Thread
+from time import sleep
+from typing import Union, Callable
+from wrfcloud.jobs import WrfJob
+from wrfcloud.runtime import Process
+from wrfcloud.runtime.wrf import Wrf
+from wrfcloud.runtime.postproc import UPP, Derive, GeoJson
+from wrfcloud.runtime.tools.converter_pool import ConverterPool
+from wrfcloud.log import Logger
+
+
+class Pipeline(Process):
+    """
+    Class for running WRF and post-processing each output file while WRF is still running.  WRF writes
+    one output time per file, so a file is complete once WRF starts writing the next file or exits.
+    """
+
+    """
+    Number of seconds to wait between checks for new WRF output files
+    """
+    POLL_SECONDS = 10
+
+    def __init__(self, job: WrfJob, on_update: Union[Callable[[float], None], None] = None):
+        """
+        Initialize the Pipeline object
+        :param job: WRF job details
+        :param on_update: Optional function called with the fraction of output times done each time
+                          new layers are added to the job
+        """
+        super().__init__()
+        self.log = Logger(self.__class__.__name__)
+        self.job = job
+        self.on_update = on_update
+        self.wrf = Wrf(job)
+        self.upp = UPP(job)
+        self.derive = Derive(job)
+        self.geojson = GeoJson(job)
+        self.wrf_thread: Union[Thread, None] = None
+        self.run_upp: bool = True
+        self.run_derive: bool = True
+        self.expected_output = self.wrf.expected_output
+        self.log_file = self.wrf.log_file
+        self.log_success_string = self.wrf.log_success_string
+
+    def get_wrf_file(self, output_dt: datetime) -> str:
+        """
+        Get the WRF output file for a valid time
+        :param output_dt: Valid time
+        :return: Full path to the WRF output file
+        """
+        return f'{self.job.wrf_dir}/wrfout_d01_{output_dt.strftime("%Y-%m-%d_%H:%M:%S")}'
+
+    def run(self) -> bool:
+        """
+        Main routine that runs WRF in the background and post-processes each output file
+        """
+        self.log.info(f'Setting up WRF with pipelined post-processing for "{self.job.job_id}"')
+
+        # start WRF in a background thread, or use the existing output if the task is skipped
+        if self.wrf.setup():
+            self.wrf_thread = Thread(target=self._run_wrf)
+            self.wrf_thread.start()
+        else:
+            self.wrf.success = True
+
+        self.run_upp = self.upp.setup()
+        self.run_derive = self.derive.setup()
+
+        # post-process each output time in order as soon as the file is complete
+        ok = True
+        output_dts = self.job.output_dts
+        max_workers = ConverterPool.get_worker_count(self.job.cores)
+        with ConverterPool(max_workers) as pool:
+            for fhr, output_dt in enumerate(output_dts):
+                wrf_file = self.get_wrf_file(output_dt)
+                next_file = self.get_wrf_file(output_dts[fhr + 1]) if fhr + 1 < len(output_dts) else None
+                if not self._wait_for_file(wrf_file, next_file):
+                    self.log.error(f'WRF did not write the output file: {wrf_file}')
+                    ok = False
+                    break
+
+                if not self._post_process(fhr, output_dt, wrf_file, pool):
+                    ok = False
+                    break
+
+                if self.on_update:
+                    self.on_update((fhr + 1) / len(output_dts))
+
+        # always wait for WRF to finish, even if post-processing failed
+        if self.wrf_thread is not None:
+            self.wrf_thread.join()
+
+        if self.run_derive:
+            self.derive.log_timings()
+
+        return ok and self.wrf.success
+
+    def _run_wrf(self) -> None:
+        """
+        Run wrf.exe, which is called in the background thread
+        """
+        try:
+            self.wrf.success = self.wrf.run_wrf()
+        except Exception as e:
+            self.log.error('Failed to run WRF', e)
+            self.wrf.success = False
+
+    def _wait_for_file(self, wrf_file: str, next_file: Union[str, None]) -> bool:
+        """
+        Wait until WRF has finished writing an output file
+        :param wrf_file: Full path to the WRF output file
+        :param next_file: Full path to the next WRF output file, or None if this is the last one
+        :return: True if the file is complete, or False if WRF exited without writing it
+        """
+        while True:
+            # check if WRF is running before looking for files, so no file is missed when it exits
+            wrf_running = self.wrf_thread is not None and self.wrf_thread.is_alive()
+            if next_file is not None and os.path.exists(next_file):
+                return os.path.exists(wrf_file)
+            if not wrf_running:
+                return os.path.exists(wrf_file)
+            sleep(self.POLL_SECONDS)
+
+    def _post_process(self, fhr: int, output_dt: datetime, wrf_file: str, pool: ConverterPool) -> bool:
+        """
+        Derive, run UPP, convert, and upload the layers for a single WRF output file
+        :param fhr: Forecast hour index
+        :param output_dt: Valid time of the WRF output file
+        :param wrf_file: Full path to the WRF output file
+        :param pool: Converter pool to run the conversions
+        :return: True if successful, otherwise False
+        """
+        self.log.info(f'Post-processing {wrf_file}')
+
+        nc_files = []
+        if self.run_derive:
+            nc_file = self.derive.derive_file(wrf_file)
+            if nc_file is None:
+                return False
+            nc_files.append(nc_file)
+            self.derive.nc_files.append(nc_file)
+
+        # run UPP on this node, since WRF may be using the compute nodes
+        grib_files = []
+        if self.run_upp:
+            grib_file = self.upp.run_forecast_hour(fhr, output_dt, local=True)
+            if grib_file is None:
+                return False
+            grib_files.append(grib_file)
+            self.upp.grib_files.append(grib_file)
+
+        try:
+            layers = self.geojson.convert_and_upload(nc_files, grib_files, pool)
+        except Exception as e:
+            self.log.error(f'Failed to convert and/or upload JSON files for {wrf_file}', e)
+            return False
+
+        # publish the new layers with the job
+        self.log.info(f'Adding {len(layers)} layers for {output_dt.strftime("%Y-%m-%d_%H:%M:%S")}')
+        self.job.layers = list(self.geojson.wrf_layers)
+        return True
@@ -4,8 +4,9 @@ Functions for setting up, executing, and monitoring a run of WRF post-processing
 
 import os
 import pkgutil
-from typing import Union, List
-from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Union, List, Dict
+from datetime import datetime
 from f90nml import Namelist
 from glob import glob
 import yaml
@@ -14,10 +15,12 @@ from wrfcloud.jobs.job import WrfLayer
 from wrfcloud.runtime import Process
 from wrfcloud.log import Logger
 from wrfcloud.runtime.tools import check_wd_exist
-from wrfcloud.runtime.tools.geojson import automate_geojson_products
-from wrfcloud.runtime.tools.vector_json import automate_vector_products
-from wrfcloud.runtime.tools.derivations import derive_fields
-from wrfcloud.system import get_aws_session
+from wrfcloud.runtime.tools.converter_pool import ConverterPool, remove_missing_layers
+from wrfcloud.runtime.tools.geojson import submit_geojson_products
+from wrfcloud.jobs.tiles import list_tiles
+from wrfcloud.runtime.tools.upload_pool import UploadPool
+from wrfcloud.runtime.tools.vector_json import submit_vector_products
+from wrfcloud.runtime.tools.derivations import derive_fields, derive_fields_task
 
 
 class UPP(Process):
@@ -30,20 +33,29 @@ class UPP(Process):
     """
     EXE = 'unipost.exe'
 
-    def __init__(self, job: WrfJob):
+    """
+    Ways to run the forecast hours: one at a time, concurrently on this node, or as a Slurm job array
+    """
+    MODES = ['serial', 'local', 'array']
+
+    def __init__(self, job: WrfJob, mode: str = MODES[0]):
         """
         Initialize the ProcProc object
+        :param job: WRF job details
+        :param mode: How to run the forecast hours, one of UPP.MODES
         """
         super().__init__()
         self.log = Logger(self.__class__.__name__)
         self.job = job
+        self.mode = mode
         self.namelist: Union[None, Namelist] = None
         self.grib_files: List[str] = []
         self.expected_output = [os.path.join(self.job.upp_dir, 'fhr_*', 'WRFPRS.GrbF*')]
 
-    def _get_files(self) -> None:
+    def _get_files(self, fhr_dir: str) -> None:
         """
         Gets all input files necessary for running unipost.exe
+        :param fhr_dir: Forecast hour working directory
         """
         # get list of files from a configuration file
         upp_files = yaml.safe_load(pkgutil.get_data('wrfcloud', 'runtime/resources/upp_files.yaml'))
@@ -52,99 +64,191 @@ class UPP(Process):
         self.log.debug('Linking static files for upp')
         for static_file in upp_files['static_files']:
             target = f'{self.job.upp_code_dir}/{static_file}'
-            link = os.path.basename(static_file)
+            link = os.path.join(fhr_dir, os.path.basename(static_file))
             self.symlink(target, link)
 
         # link control file
         self.log.debug('Linking control file for upp')
         control_file = upp_files['control_files'][0]
         target = f'{self.job.upp_code_dir}/{control_file}'
-        link = 'postxconfig-NT.txt'
+        link = os.path.join(fhr_dir, 'postxconfig-NT.txt')
         self.symlink(target, link)
 
         # link satellite fix files
         self.log.debug('Linking satellite fix files for upp')
         for sat_fix_file in upp_files['sat_fix_files']:
             target = f'{self.job.upp_code_dir}/src/lib/crtm2/src/fix/{sat_fix_file}'
-            link = os.path.basename(sat_fix_file)
+            link = os.path.join(fhr_dir, os.path.basename(sat_fix_file))
             self.symlink(target, link)
 
-    def _run_upp(self) -> None:
+    def _run_upp(self, fhr_dir: str, local: bool = False) -> bool:
         """
         Executes the unipost.exe program
+        :param fhr_dir: Forecast hour working directory
+        :param local: Run on this node instead of submitting to the batch queue
+        :return: True if successful, otherwise False
         """
-        self.log.debug(f'Linking {self.EXE} to upp working directory')
-        self.symlink(f'{self.job.upp_code_dir}/bin/{self.EXE}', self.EXE)
-
-        self.log.debug(f'Executing {self.EXE}')
-        if self.job.cores == 1:
-            upp_cmd = f'./{self.EXE} >& {os.path.splitext(self.EXE)[0]}.log'
+        self.log.debug(f'Executing {self.EXE} in {fhr_dir}')
+        if local or self.job.cores == 1:
+            upp_cmd = f'cd {fhr_dir} && ./{self.EXE} > {os.path.splitext(self.EXE)[0]}.log 2>&1'
             if os.system(upp_cmd):
                 self.log.error(f'{self.EXE} returned non-zero')
                 return False
             return True
 
-        return self.submit_job(self.EXE, self.job.cores, 'wrf')
+        return self.submit_job(self.EXE, self.job.cores, 'wrf', fhr_dir)
 
-    def run(self) -> bool:
+    def _run_local_pool(self, fhr_dirs: List[str]) -> bool:
         """
-        Main routine that sets up, runs, and monitors post-processing end-to-end
+        Run unipost.exe for all forecast hours concurrently on this node
+        :param fhr_dirs: Forecast hour working directories
+        :return: True if all forecast hours were successful, otherwise False
         """
-        self.log.info(f'Setting up post-processing for "{self.job.job_id}"')
+        max_workers = ConverterPool.get_worker_count(self.job.cores)
+        self.log.info(f'Running {len(fhr_dirs)} forecast hours with {max_workers} workers')
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda fhr_dir: self._run_upp(fhr_dir, True), fhr_dirs))
+
+        return all(results)
+
+    def _run_job_array(self, fhr_dirs: List[str]) -> bool:
+        """
+        Run unipost.exe for all forecast hours in a single Slurm job array, with one task per hour
+        :param fhr_dirs: Forecast hour working directories
+        :return: True if the job array was successful, otherwise False
+        """
+        exe_name = os.path.splitext(self.EXE)[0]
+        slurm_file = os.path.join(self.job.upp_dir, f'{exe_name}_array.sbatch')
+        with open(slurm_file, 'w') as file_handle:
+            file_handle.write('#!/bin/bash\n')
+            file_handle.write(f'#SBATCH --job-name={self.EXE}\n')
+            file_handle.write(f'#SBATCH --array=0-{len(fhr_dirs) - 1}\n')
+            file_handle.write('#SBATCH --ntasks=1\n')
+            file_handle.write('#SBATCH --cpus-per-task=1\n')
+            file_handle.write(f'#SBATCH --output={exe_name}_%A_%a.log\n')
+            file_handle.write('#SBATCH --time=12:00:00\n')
+            file_handle.write(f'\nFHR_DIRS=({" ".join(fhr_dirs)})\n')
+            file_handle.write('cd ${FHR_DIRS[$SLURM_ARRAY_TASK_ID]}\n')
+            file_handle.write('\ndate +%s > START\n')
+            file_handle.write(f'\n/opt/slurm/bin/srun --mpi=pmi2 ./{self.EXE}\n')
+            file_handle.write('\ndate +%s > STOP\n')
+
+        # submit the job array and wait for all tasks to finish
+        self.log.info(f'Submitted {self.EXE} job array with {len(fhr_dirs)} tasks to wrf.')
+        if os.system(f'cd {self.job.upp_dir} && /opt/slurm/bin/sbatch -p wrf -W {slurm_file}'):
+            self.log.error('sbatch returned non-zero')
+            return False
+
+        return True
+
+    def _setup_forecast_hour(self, fhr: int, this_date: datetime) -> str:
+        """
+        Create the working directory for a single forecast hour, link the UPP files, and write the itag
+        :param fhr: Forecast hour index
+        :param this_date: Valid time of the WRF output file
+        :return: Forecast hour working directory
+        """
+        # Create subdirs by forecast hour
+        fhr_str = ('%03d' % fhr)
+        fhr_dir = f'{self.job.upp_dir}/fhr_{fhr_str}'
+        os.makedirs(fhr_dir, exist_ok=True)
+
+        # link UPP files
+        self.log.debug('Calling get_files')
+        self._get_files(fhr_dir)
+
+        # Create the itag namelist file for this fhr
+        self.log.debug('Creating itag file')
+        wrf_date = this_date.strftime("%Y-%m-%d_%H:%M:%S")
+        with open(os.path.join(fhr_dir, 'itag'), "w") as file_handle:
+            file_handle.write(f'{self.job.wrf_dir}/wrfout_d01_{wrf_date}\n')
+            file_handle.write("netcdf\n")
+            file_handle.write("grib2\n")
+            file_handle.write(this_date.strftime("%Y-%m-%d_%H:%M:%S"))
+            file_handle.write("\nNCAR\n")
+
+        self.log.debug(f'Linking {self.EXE} to upp working directory')
+        self.symlink(f'{self.job.upp_code_dir}/bin/{self.EXE}', os.path.join(fhr_dir, self.EXE))
+
+        return fhr_dir
+
+    def _find_grib_file(self, fhr_dir: str) -> Union[str, None]:
+        """
+        Find the GRIB2 file written by UPP
+        :param fhr_dir: Forecast hour working directory
+        :return: Full path to the GRIB2 file, or None if not found
+        """
+        try:
+            files = glob(f'{fhr_dir}/WRFPRS.GrbF*')
+            files.sort()
+            return files[0]
+        except Exception as e:
+            self.log.error(f'Failed to find grib file in directory: {fhr_dir}', e)
+            return None
 
+    def setup(self) -> bool:
+        """
+        Create the UPP working directory
+        :return: True if UPP should run, or False if the task is skipped
+        """
         # Check if experiment working directory already exists,
         # take action based on value of runinfo.exists
         action = check_wd_exist(self.job.exists, self.job.upp_dir)
         if action == "skip":
-            return True
+            return False
 
         os.makedirs(self.job.upp_dir, exist_ok=True)
-        os.chdir(self.job.upp_dir)
-
-        start_date = self.job.start_dt
-        end_date = self.job.end_dt
-        increment = timedelta(seconds=self.job.output_freq_sec)
-        this_date = start_date
-        fhr = 0
-        while this_date <= end_date:
-            # Create subdirs by forecast hour
-            fhr_str = ('%03d' % fhr)
-            fhr_dir = f'{self.job.upp_dir}/fhr_{fhr_str}'
-            os.makedirs(fhr_dir, exist_ok=True)
-            os.chdir(fhr_dir)
-
-            # link UPP files
-            self.log.debug('Calling get_files')
-            self._get_files()
-
-            # Create the itag namelist file for this fhr
-            self.log.debug('Creating itag file')
-            wrf_date = this_date.strftime("%Y-%m-%d_%H:%M:%S")
-            with open('itag', "w") as file_handle:
-                file_handle.write(f'{self.job.wrf_dir}/wrfout_d01_{wrf_date}\n')
-                file_handle.write("netcdf\n")
-                file_handle.write("grib2\n")
-                file_handle.write(this_date.strftime("%Y-%m-%d_%H:%M:%S"))
-                file_handle.write("\nNCAR\n")
-
-            # run UPP
-            self.log.debug('Calling run_upp')
-            if not self._run_upp():
-                return False
+        return True
 
-            # collect list of grib files
-            try:
-                files = glob(f'{fhr_dir}/WRFPRS.GrbF*')
-                files.sort()
-                grib_file = files[0]
-                self.grib_files.append(grib_file)
-            except Exception as e:
-                self.log.error(f'Failed to find grib file in directory: {fhr_dir}', e)
-                return False
+    def run_forecast_hour(self, fhr: int, this_date: datetime, local: bool = False) -> Union[str, None]:
+        """
+        Set up and run UPP for a single forecast hour
+        :param fhr: Forecast hour index
+        :param this_date: Valid time of the WRF output file
+        :param local: Run on this node instead of submitting to the batch queue
+        :return: Full path to the GRIB2 file, or None if UPP failed
+        """
+        fhr_dir = self._setup_forecast_hour(fhr, this_date)
+
+        # run UPP
+        self.log.debug('Calling run_upp')
+        if not self._run_upp(fhr_dir, local):
+            return None
+
+        return self._find_grib_file(fhr_dir)
 
-            # increment the date and forecast hour
-            this_date = this_date + increment
-            fhr = fhr + 1
+    def run(self) -> bool:
+        """
+        Main routine that sets up, runs, and monitors post-processing end-to-end
+        """
+        self.log.info(f'Setting up post-processing for "{self.job.job_id}"')
+
+        if self.mode not in self.MODES:
+            self.log.error(f'Invalid UPP mode: {self.mode}.  Valid modes are {self.MODES}.')
+            return False
+
+        if not self.setup():
+            return True
+
+        # set up every forecast hour before running any of them
+        fhr_dirs = [self._setup_forecast_hour(fhr, this_date) for fhr, this_date in enumerate(self.job.output_dts)]
+
+        # run UPP
+        if self.mode == 'local':
+            ok = self._run_local_pool(fhr_dirs)
+        elif self.mode == 'array':
+            ok = self._run_job_array(fhr_dirs)
+        else:
+            ok = all(self._run_upp(fhr_dir) for fhr_dir in fhr_dirs)
+        if not ok:
+            return False
+
+        # collect list of grib files in forecast hour order
+        for fhr_dir in fhr_dirs:
+            grib_file = self._find_grib_file(fhr_dir)
+            if grib_file is None:
+                return False
+            self.grib_files.append(grib_file)
 
         return True
 
@@ -161,38 +265,81 @@ class Derive(Process):
         self.log = Logger(self.__class__.__name__)
         self.job = job
         self.nc_files = []
+        self.timings: Dict[str, float] = {}
         self.expected_output = [
             os.path.join(self.job.derive_dir, 'wrfderive_d0*.nc'),
         ]
 
-    def run(self) -> bool:
+    def setup(self) -> bool:
         """
-        Main routine that sets up and runs field derivations and conversions
+        Create the derive working directory
+        :return: True if the derivations should run, or False if the task is skipped
         """
         # Check if experiment working directory already exists,
         # take action based on value of runinfo.exists
         action = check_wd_exist(self.job.exists, self.job.derive_dir)
         if action == "skip":
-            return True
+            return False
 
         # create derive directory
         os.makedirs(self.job.derive_dir, exist_ok=True)
+        return True
+
+    def derive_file(self, wrf_file: str) -> Union[str, None]:
+        """
+        Derive fields from a single WRF output file
+        :param wrf_file: Full path to the WRF output file
+        :return: Full path to the derived NetCDF file, or None if the derivations failed
+        """
+        self.log.info(f'Deriving fields from {wrf_file}')
+        timings = {}
+        out = derive_fields(in_file=wrf_file, out_dir=self.job.derive_dir, timings=timings)
+        if out is None:
+            self.log.error(f'Could not derive fields from {wrf_file}')
+            return None
+
+        self.log.info(f'Wrote derived file {out}')
+        for field_name, seconds in timings.items():
+            self.timings[field_name] = self.timings.get(field_name, 0) + seconds
+        return out
+
+    def run(self) -> bool:
+        """
+        Main routine that sets up and runs field derivations and conversions
+        """
+        if not self.setup():
+            return True
 
         # get wrf files
-        wrf_files = glob(os.path.join(self.job.wrf_dir, 'wrfout*'))
+        wrf_files = sorted(glob(os.path.join(self.job.wrf_dir, 'wrfout*')))
+
+        # derive fields from each file in a separate worker process
+        max_workers = ConverterPool.get_worker_count(self.job.cores)
+        self.log.info(f'Deriving fields from {len(wrf_files)} files with {max_workers} workers')
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(derive_fields_task, wrf_files, [self.job.derive_dir] * len(wrf_files)))
 
-        # derive fields
-        for wrf_file in wrf_files:
-            self.log.info(f'Deriving fields from {wrf_file}')
-            out = derive_fields(in_file=wrf_file, out_dir=self.job.derive_dir)
+        ok = True
+        for wrf_file, (out, timings) in zip(wrf_files, results):
             if out is None:
                 self.log.error(f'Could not derive fields from {wrf_file}')
-                return False
+                ok = False
+                continue
 
             self.log.info(f'Wrote derived file {out}')
             self.nc_files.append(out)
+            for field_name, seconds in timings.items():
+                self.timings[field_name] = self.timings.get(field_name, 0) + seconds
 
-        return True
+        self.log_timings()
+        return ok
+
+    def log_timings(self) -> None:
+        """
+        Log the total time spent deriving each field across all files, slowest first
+        """
+        for field_name, seconds in sorted(self.timings.items(), key=lambda item: item[1], reverse=True):
+            self.log.info(f'Derived {field_name} in {seconds:.3f} seconds total')
 
 
 class GeoJson(Process):
@@ -209,6 +356,12 @@ class GeoJson(Process):
         self.namelist: Union[None, Namelist] = None
         self.grib_files: List[str] = []
         self.nc_files: List[str] = []
+        self.encodings: List[str] = [WrfLayer.ENCODING_GEOJSON]
+        self.detail_levels: List[str] = [WrfLayer.DETAIL_FULL]
+        self.tiles: bool = False
+        self.legacy_vectors: bool = False
+        self.vector_densities: List[str] = [WrfLayer.DENSITY_DEFAULT]
+        self.upload_threads: int = UploadPool.DEFAULT_MAX_WORKERS
         self.wrf_layers: List[WrfLayer] = []
         self.expected_output = [
             os.path.join(self.job.derive_dir, 'wrfderive_d0*json.gz'),
@@ -229,6 +382,48 @@ class GeoJson(Process):
         """
         self.nc_files = nc_files
 
+    def set_encodings(self, encodings: List[str]) -> None:
+        """
+        Set the encodings of the contour layer files
+        :param encodings: List of encodings, see WrfLayer.ENCODINGS
+        """
+        self.encodings = encodings
+
+    def set_detail_levels(self, detail_levels: List[str]) -> None:
+        """
+        Set the levels of detail of the contour layer files
+        :param detail_levels: List of levels of detail, see WrfLayer.DETAIL_LEVELS
+        """
+        self.detail_levels = detail_levels
+
+    def set_tiles(self, tiles: bool) -> None:
+        """
+        Set whether to slice the layers into z/x/y tiles
+        :param tiles: True to write and upload tiles
+        """
+        self.tiles = tiles
+
+    def set_legacy_vectors(self, legacy_vectors: bool) -> None:
+        """
+        Set whether to write vector layers in the legacy list of points format
+        :param legacy_vectors: True to write the legacy format instead of columns
+        """
+        self.legacy_vectors = legacy_vectors
+
+    def set_vector_densities(self, vector_densities: List[str]) -> None:
+        """
+        Set the densities of the vector layer files
+        :param vector_densities: List of vector densities, see WrfLayer.DENSITIES
+        """
+        self.vector_densities = vector_densities
+
+    def set_upload_threads(self, upload_threads: int) -> None:
+        """
+        Set the number of layer files uploaded to S3 at the same time
+        :param upload_threads: Number of upload threads
+        """
+        self.upload_threads = upload_threads
+
     def run(self) -> bool:
         """
         Main routine that sets up, runs, and monitors post-processing end-to-end
@@ -249,57 +444,119 @@ class GeoJson(Process):
             self.log.error('Failed to convert and/or upload JSON files.', e)
             return False
 
+    def convert_and_upload(self, nc_files: List[str], grib_files: List[str], pool: ConverterPool) -> List[WrfLayer]:
+        """
+        Convert and upload some of the files, e.g. a single forecast hour while WRF is still running
+        :param nc_files: List of NetCDF files (full path)
+        :param grib_files: List of GRIB2 files (full path)
+        :param pool: Converter pool to run the conversions
+        :return: List of WRF layers that were uploaded
+        """
+        wrf_layers = self._submit_files(nc_files, grib_files, pool, self.encodings, self.detail_levels, self.tiles,
+                                        self.legacy_vectors, self.vector_densities)
+        pool.wait()
+        wrf_layers = remove_missing_layers(wrf_layers)
+        self._upload_layers(wrf_layers)
+
+        uploaded_layers = [layer for layer in wrf_layers if layer.layer_data.startswith('s3://')]
+        self.wrf_layers += uploaded_layers
+        return uploaded_layers
+
     def _convert_to_layer(self) -> None:
         """
         Convert the GRIB2/NetCDF files into GeoJSON files
         :return: List of WRF layer details
         """
-        self.wrf_layers = []
-        for nc_file in self.nc_files:
+        # use one process pool for every file, product, and z-level in the run
+        max_workers = ConverterPool.get_worker_count(self.job.cores)
+        self.log.debug(f'Converting layers with {max_workers} workers')
+
+        with ConverterPool(max_workers) as pool:
+            wrf_layers = self._submit_files(self.nc_files, self.grib_files, pool, self.encodings,
+                                            self.detail_levels, self.tiles, self.legacy_vectors,
+                                            self.vector_densities)
+
+        self.wrf_layers = remove_missing_layers(wrf_layers)
+
+    @staticmethod
+    def _submit_files(nc_files: List[str], grib_files: List[str], pool: ConverterPool,
+                      encodings: List[str], detail_levels: List[str], tiles: bool,
+                      legacy_vectors: bool, vector_densities: List[str]) -> List[WrfLayer]:
+        """
+        Submit the conversion tasks for GRIB2/NetCDF files to the pool
+        :param nc_files: List of NetCDF files (full path)
+        :param grib_files: List of GRIB2 files (full path)
+        :param pool: Converter pool to run the conversions
+        :param encodings: Encodings of the contour layer files
+        :param detail_levels: Levels of detail of the contour layer files
+        :param tiles: Also slice the layers into z/x/y tiles
+        :param legacy_vectors: Write vector layers in the legacy list of points format
+        :param vector_densities: Densities of the vector layer files
+        :return: List of WRF layers, which are only complete once the pool tasks are finished
+        """
+        wrf_layers = []
+        for nc_file in nc_files:
             # create layers for contour GeoJSON products
-            for wrf_layer in automate_geojson_products(nc_file, 'netcdf'):
-                self.wrf_layers.append(wrf_layer)
+            wrf_layers += submit_geojson_products(nc_file, 'netcdf', pool, encodings=encodings,
+                                                  detail_levels=detail_levels, tiles=tiles)
             # create layers for vector products
-            for wrf_layer in automate_vector_products(nc_file):
-                self.wrf_layers.append(wrf_layer)
-        for grib_file in self.grib_files:
-            for wrf_layer in automate_geojson_products(grib_file, 'grib2'):
-                self.wrf_layers.append(wrf_layer)
+            wrf_layers += submit_vector_products(nc_file, pool, tiles, legacy_vectors, vector_densities)
+        for grib_file in grib_files:
+            wrf_layers += submit_geojson_products(grib_file, 'grib2', pool, encodings=encodings,
+                                                  detail_levels=detail_levels, tiles=tiles)
+
+        return wrf_layers
 
     def _upload_layer_data_files(self) -> bool:
         """
         Upload all geojson files to S3
         :return: True if successful, otherwise False
         """
+        return self._upload_layers(self.wrf_layers) > 0
+
+    def _upload_layers(self, wrf_layers: List[WrfLayer]) -> int:
+        """
+        Upload the layer data files to S3 and set the layer data to the S3 URL
+        :param wrf_layers: Layers with a local file in layer_data
+        :return: Number of files uploaded
+        """
         # find S3 parameters
         bucket: str = os.environ['WRFCLOUD_BUCKET']
         prefix: str = os.environ['WRF_OUTPUT_PREFIX']
 
-        # get an S3 client
-        session = get_aws_session()
-        s3 = session.client('s3')
-
-        # upload each file
+        # queue every file of every layer
         upload_count = 0
-        for layer in self.wrf_layers:
-            # construct the S3 key
-            job_id = self.job.job_id
-            domain = 'DXX'
-            var_name = layer.variable_name
-            z_level = layer.z_level if layer.z_level is not None else 0
-            file_type = 'json' if layer.plot_type == 'vector' else 'geojson'
-            key = f'{prefix}/{job_id}/wrf_{domain}_{layer.dt_str}_{var_name}_{z_level}.{file_type}.gz'
-            self.log.debug(f'Uploading s3://{bucket}/{key}')
-            # upload the file to an S3 object
-            try:
-                s3.upload_file(Filename=layer.layer_data, Bucket=bucket, Key=key)
-                upload_count += 1
-                layer.layer_data = f's3://{bucket}/{key}'
-            except Exception as e:
-                self.log.warn(f'Failed to upload JSON file: {layer.layer_data}', e)
+        with UploadPool(self.upload_threads) as uploads:
+            layer_uploads = []
+            for layer in wrf_layers:
+                # construct the S3 key
+                key = WrfLayer.get_layer_key(f'{prefix}/{self.job.job_id}', layer.dt, layer.variable_name,
+                                             layer.z_level, layer.plot_type)
+
+                # upload the file in each encoding, level of detail, and density, and the z/x/y tiles into a
+                # directory next to the layer file
+                files = [(layer.get_layer_data(encoding, detail_level),
+                          WrfLayer.get_file_name(key, encoding, detail_level))
+                         for encoding, detail_level in layer.layer_data_variants]
+                files += [(layer.get_density_data(density), WrfLayer.get_density_file_name(key, density))
+                          for density in layer.densities]
+                files += [(layer.get_tile_data(zoom, x, y), WrfLayer.get_tile_file_name(key, zoom, x, y))
+                          for zoom, x, y in list_tiles(layer.tile_zooms, layer.bounds)]
+                futures = [uploads.submit(filename, bucket, file_key) for filename, file_key in files]
+                layer_uploads.append((layer, key, futures))
+
+            # a layer is uploaded once all of its files are uploaded
+            for layer, key, futures in layer_uploads:
+                try:
+                    for future in futures:
+                        future.result()
+                    upload_count += 1
+                    layer.layer_data = f's3://{bucket}/{key}'
+                except Exception as e:
+                    self.log.warn(f'Failed to upload JSON file: {layer.layer_data}', e)
 
         # log a message if some files failed to upload
-        if upload_count != len(self.wrf_layers):
-            self.log.warn(f'Failed to upload all JSON files: {upload_count} of {len(self.wrf_layers)}')
+        if upload_count != len(wrf_layers):
+            self.log.warn(f'Failed to upload all JSON files: {upload_count} of {len(wrf_layers)}')
 
-        return upload_count > 0
+        return upload_count
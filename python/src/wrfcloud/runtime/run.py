@@ -10,7 +10,6 @@ import argparse
 import os
 import glob
 import json
-import boto3
 from typing import Union, List
 from zipfile import ZipFile
 from wrfcloud.runtime.geogrid import GeoGrid
@@ -19,8 +18,10 @@ from wrfcloud.runtime.metgrid import MetGrid
 from wrfcloud.runtime.real import Real
 from wrfcloud.runtime.wrf import Wrf
 from wrfcloud.runtime.postproc import UPP, GeoJson, Derive
+from wrfcloud.runtime.pipeline import Pipeline
+from wrfcloud.runtime.tools.upload_pool import UploadPool
 from wrfcloud.config import WrfConfig, get_config_from_system
-from wrfcloud.jobs import WrfJob, get_job_from_system, update_job_in_system
+from wrfcloud.jobs import WrfJob, WrfLayer, get_job_from_system, update_job_in_system
 from wrfcloud.system import init_environment, get_aws_session
 from wrfcloud.log import Logger, ModelProcessError
 
@@ -37,6 +38,22 @@ def main() -> None:
         parser = argparse.ArgumentParser()
         parser.add_argument('--job-id', type=str, help='Job ID with run details.', required=True)
         parser.add_argument('--keep-cluster', action=argparse.BooleanOptionalAction, help='Keep cluster when finished.')
+        parser.add_argument('--pipeline', action=argparse.BooleanOptionalAction,
+                            help='Post-process each WRF output file while WRF is still running.')
+        parser.add_argument('--upp-mode', type=str, choices=UPP.MODES, default=UPP.MODES[0],
+                            help='Run the UPP forecast hours one at a time, concurrently on this node, or as a job array.')
+        parser.add_argument('--binary-layers', action=argparse.BooleanOptionalAction,
+                            help='Also write contour layers in the compact binary encoding.')
+        parser.add_argument('--detail-levels', action=argparse.BooleanOptionalAction,
+                            help='Also write simplified contour layers for zoomed out map views.')
+        parser.add_argument('--tiles', action=argparse.BooleanOptionalAction,
+                            help='Also slice the layers into z/x/y tiles.')
+        parser.add_argument('--legacy-vectors', action=argparse.BooleanOptionalAction,
+                            help='Write vector layers as a list of points for older web clients.')
+        parser.add_argument('--vector-densities', action=argparse.BooleanOptionalAction,
+                            help='Also write sparser and denser vector layers for other map zoom levels.')
+        parser.add_argument('--upload-threads', type=int, default=UploadPool.DEFAULT_MAX_WORKERS,
+                            help='Number of layer files to upload to S3 at the same time.')
         args = parser.parse_args()
         job_id = args.job_id
 
@@ -84,31 +101,18 @@ def main() -> None:
         real.start()
         log.debug(real.get_run_summary())
 
-        log.debug('Starting wrf task')
-        _update_job_status(job, WrfJob.STATUS_CODE_RUNNING, 'Running WRF', 0.3)
-        wrf = Wrf(job)
-        wrf.start()
-        log.debug(wrf.get_run_summary())
-
-        log.debug('Starting UPP task')
-        _update_job_status(job, WrfJob.STATUS_CODE_RUNNING, 'Running UPP', 0.6)
-        upp = UPP(job)
-        upp.start()
-        log.debug(upp.get_run_summary())
-
-        log.debug('Starting Derive task')
-        _update_job_status(job, WrfJob.STATUS_CODE_RUNNING, 'Running Derive', 0.7)
-        derive = Derive(job)
-        derive.start()
-        log.debug(derive.get_run_summary())
-
-        log.debug('Starting GeoJSON task')
-        _update_job_status(job, WrfJob.STATUS_CODE_RUNNING, 'Running GeoJSON converter', 0.8)
-        geojson = GeoJson(job)
-        geojson.set_nc_files(derive.nc_files)
-        geojson.set_grib_files(upp.grib_files)
-        geojson.start()
-        log.debug(geojson.get_run_summary())
+        encodings = [WrfLayer.ENCODING_GEOJSON]
+        if args.binary_layers:
+            encodings.append(WrfLayer.ENCODING_BINARY)
+        detail_levels = WrfLayer.DETAIL_LEVELS if args.detail_levels else [WrfLayer.DETAIL_FULL]
+        vector_densities = WrfLayer.DENSITIES if args.vector_densities else [WrfLayer.DENSITY_DEFAULT]
+
+        if args.pipeline:
+            _run_wrf_with_pipeline(job, encodings, detail_levels, bool(args.tiles), bool(args.legacy_vectors),
+                                   vector_densities, args.upload_threads)
+        else:
+            _run_wrf_and_postproc(job, args.upp_mode, encodings, detail_levels, bool(args.tiles),
+                                  bool(args.legacy_vectors), vector_densities, args.upload_threads)
 
         # send a notification if requested
         if job.notify:
@@ -152,6 +156,88 @@ def _update_job_status(job: Union[None, WrfJob], status_code: int, status_messag
     update_job_in_system(job, True)
 
 
+def _run_wrf_and_postproc(job: WrfJob, upp_mode: str, encodings: List[str], detail_levels: List[str],
+                          tiles: bool, legacy_vectors: bool, vector_densities: List[str],
+                          upload_threads: int = UploadPool.DEFAULT_MAX_WORKERS) -> None:
+    """
+    Run WRF to completion, then run each post-processing task in sequence
+    :param job: WRF job details
+    :param upp_mode: How to run the UPP forecast hours, one of UPP.MODES
+    :param encodings: Encodings of the contour layer files, see WrfLayer.ENCODINGS
+    :param detail_levels: Levels of detail of the contour layer files, see WrfLayer.DETAIL_LEVELS
+    :param tiles: Also slice the layers into z/x/y tiles
+    :param legacy_vectors: Write vector layers in the legacy list of points format
+    :param vector_densities: Densities of the vector layer files, see WrfLayer.DENSITIES
+    :param upload_threads: Number of layer files to upload to S3 at the same time
+    """
+    log = Logger()
+
+    log.debug('Starting wrf task')
+    _update_job_status(job, WrfJob.STATUS_CODE_RUNNING, 'Running WRF', 0.3)
+    wrf = Wrf(job)
+    wrf.start()
+    log.debug(wrf.get_run_summary())
+
+    log.debug('Starting UPP task')
+    _update_job_status(job, WrfJob.STATUS_CODE_RUNNING, 'Running UPP', 0.6)
+    upp = UPP(job, upp_mode)
+    upp.start()
+    log.debug(upp.get_run_summary())
+
+    log.debug('Starting Derive task')
+    _update_job_status(job, WrfJob.STATUS_CODE_RUNNING, 'Running Derive', 0.7)
+    derive = Derive(job)
+    derive.start()
+    log.debug(derive.get_run_summary())
+
+    log.debug('Starting GeoJSON task')
+    _update_job_status(job, WrfJob.STATUS_CODE_RUNNING, 'Running GeoJSON converter', 0.8)
+    geojson = GeoJson(job)
+    geojson.set_nc_files(derive.nc_files)
+    geojson.set_grib_files(upp.grib_files)
+    geojson.set_encodings(encodings)
+    geojson.set_detail_levels(detail_levels)
+    geojson.set_tiles(tiles)
+    geojson.set_legacy_vectors(legacy_vectors)
+    geojson.set_vector_densities(vector_densities)
+    geojson.set_upload_threads(upload_threads)
+    geojson.start()
+    log.debug(geojson.get_run_summary())
+
+
+def _run_wrf_with_pipeline(job: WrfJob, encodings: List[str], detail_levels: List[str], tiles: bool,
+                           legacy_vectors: bool, vector_densities: List[str],
+                           upload_threads: int = UploadPool.DEFAULT_MAX_WORKERS) -> None:
+    """
+    Run WRF and post-process each output file as soon as it is complete, so layers are added to the
+    job while WRF is still running
+    :param job: WRF job details
+    :param encodings: Encodings of the contour layer files, see WrfLayer.ENCODINGS
+    :param detail_levels: Levels of detail of the contour layer files, see WrfLayer.DETAIL_LEVELS
+    :param tiles: Also slice the layers into z/x/y tiles
+    :param legacy_vectors: Write vector layers in the legacy list of points format
+    :param vector_densities: Densities of the vector layer files, see WrfLayer.DENSITIES
+    :param upload_threads: Number of layer files to upload to S3 at the same time
+    """
+    log = Logger()
+
+    def _on_update(fraction_done: float) -> None:
+        progress = 0.3 + 0.7 * fraction_done
+        _update_job_status(job, WrfJob.STATUS_CODE_RUNNING, 'Running WRF and post-processing', progress)
+
+    log.debug('Starting wrf task with pipelined post-processing')
+    _update_job_status(job, WrfJob.STATUS_CODE_RUNNING, 'Running WRF and post-processing', 0.3)
+    pipeline = Pipeline(job, _on_update)
+    pipeline.geojson.set_encodings(encodings)
+    pipeline.geojson.set_detail_levels(detail_levels)
+    pipeline.geojson.set_tiles(tiles)
+    pipeline.geojson.set_legacy_vectors(legacy_vectors)
+    pipeline.geojson.set_vector_densities(vector_densities)
+    pipeline.geojson.set_upload_threads(upload_threads)
+    pipeline.start()
+    log.debug(pipeline.get_run_summary())
+
+
 def _load_model_configuration(job: WrfJob) -> WrfConfig:
     """
     Pull the namelists and geo_em file from S3 for the given config
@@ -207,8 +293,10 @@ def _save_log_files(job: WrfJob) -> None:
 
     # save the zip file to S3
     bucket = os.environ['WRFCLOUD_BUCKET']
-    s3 = boto3.client('s3')
-    s3.upload_file(zip_path, bucket, f'jobs/{job.job_id}/{zip_file}')
+    with UploadPool() as uploads:
+        failures = uploads.upload([(zip_path, bucket, f'jobs/{job.job_id}/{zip_file}')])
+    if failures:
+        raise failures[0][1]
 
 
 def _delete_cluster() -> None:
@@ -0,0 +1,118 @@
+"""
+Module with a process pool shared by all the post-processing converters in a run
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from threading import Lock
+from typing import Union, List, Set, Callable
+
+from wrfcloud.jobs.job import WrfLayer
+from wrfcloud.log import Logger
+
+
+class ConverterPool:
+    """
+    A single process pool for every (file, product, z-level) conversion task of a post-processing
+    run.  Tasks from all files go into one queue so the workers stay busy across file boundaries,
+    while the number of queued tasks is bounded so that only a few files are held in memory.
+    """
+    def __init__(self, max_workers: Union[int, None] = None, max_queued: Union[int, None] = None):
+        """
+        Create the process pool
+        :param max_workers: Number of worker processes, defaults to the number of CPUs on the node
+        :param max_queued: Maximum number of queued and running tasks, defaults to 4 per worker
+        """
+        self.log = Logger(self.__class__.__name__)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queued = max_queued or 4 * self.max_workers
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self.futures: Set[Future] = set()
+        self.lock = Lock()
+
+    def __enter__(self) -> 'ConverterPool':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.shutdown()
+
+    @staticmethod
+    def get_worker_count(cores: Union[int, None] = None) -> int:
+        """
+        Get the number of workers for the pool on this node
+        :param cores: Optional number of cores allotted to the job
+        :return: Number of CPUs on the node, limited to the number of cores if provided
+        """
+        cpu_count = os.cpu_count() or 1
+        return min(cpu_count, cores) if cores else cpu_count
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """
+        Submit a task to the pool, blocking while the queue is full
+        :param fn: Function to run in a worker process
+        :param args: Arguments to the function
+        :return: Future for the task
+        """
+        while len(self.futures) >= self.max_queued:
+            done, _ = wait(self.futures, return_when=FIRST_COMPLETED)
+            self.futures -= done
+
+        future = self.executor.submit(fn, *args)
+        self.futures.add(future)
+        return future
+
+    def when_done(self, futures: List[Future], callback: Callable[[], None]) -> None:
+        """
+        Call a function once all the given tasks are finished, e.g. to release a file's shared memory
+        :param futures: Tasks to wait for
+        :param callback: Function to call with no arguments
+        """
+        remaining = [len(futures)]
+
+        def _on_done(_: Future) -> None:
+            with self.lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                callback()
+
+        if not futures:
+            callback()
+        for future in futures:
+            future.add_done_callback(_on_done)
+
+    def wait(self) -> None:
+        """
+        Wait for all submitted tasks to finish
+        """
+        wait(self.futures)
+        self.futures = set()
+
+    def shutdown(self) -> None:
+        """
+        Wait for all submitted tasks and stop the worker processes
+        """
+        self.wait()
+        self.executor.shutdown()
+
+
+def remove_missing_layers(layers: List[WrfLayer]) -> List[WrfLayer]:
+    """
+    Remove any layers if a layer data file does not exist in any of the layer's encodings, levels of detail,
+    or vector densities
+    :param layers: Layers with a local file in layer_data
+    :return: Layers with local files that exist
+    """
+    log = Logger()
+
+    existing_layers = []
+    for layer in layers:
+        missing = [layer.get_layer_data(encoding, detail_level) for encoding, detail_level in layer.layer_data_variants
+                   if not os.path.exists(layer.get_layer_data(encoding, detail_level))]
+        missing += [layer.get_density_data(density) for density in layer.densities
+                    if not os.path.exists(layer.get_density_data(density))]
+        if not missing:
+            existing_layers.append(layer)
+        else:
+            log.error(f'Layer does not exist: {missing[0]}')
+
+    return existing_layers
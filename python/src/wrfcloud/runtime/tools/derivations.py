@@ -1,9 +1,12 @@
 import os
 import pkgutil
+from functools import lru_cache
+from time import perf_counter
+from typing import Union, Dict, Tuple
 
 import numpy as np
 # pylint: disable=E0401
-from wrf import getvar, vinterp
+from wrf import getvar, vinterp, extract_vars
 # pylint: disable=E0401,E0611
 from netCDF4 import Dataset
 import yaml
@@ -11,21 +14,77 @@ import yaml
 from wrfcloud.log import Logger
 
 
-def derive_fields(in_file: str, out_dir: str):
+"""
+Raw WRF variables that are read once per file and shared by every field derivation, e.g. the pressure
+and height inputs to vinterp and the temperature and moisture inputs to rh and td2
+"""
+CACHE_VARIABLES = ['P', 'PB', 'PH', 'PHB', 'T', 'QVAPOR', 'PSFC', 'HGT', 'T2', 'Q2', 'U', 'V', 'W',
+                   'U10', 'V10', 'SINALPHA', 'COSALPHA', 'QRAIN', 'QSNOW', 'QGRAUP', 'RAINC', 'RAINNC']
+
+"""
+Fields that wrf-python takes from a diagnostic it computes as a whole, e.g. wspd10 and wdir10 are both
+taken from wspd_wdir10, mapped to the diagnostic, the index of the field in it, and the field description
+"""
+SHARED_DIAGNOSTICS = {
+    'wspd': ('wspd_wdir', 0, 'wspd in projection space'),
+    'wdir': ('wspd_wdir', 1, 'wdir in projection space'),
+    'wspd10': ('wspd_wdir10', 0, '10m wspd in projection space'),
+    'wdir10': ('wspd_wdir10', 1, '10m wdir in projection space'),
+    'low_cloudfrac': ('cloudfrac', 0, 'low clouds'),
+    'mid_cloudfrac': ('cloudfrac', 1, 'mid clouds'),
+    'high_cloudfrac': ('cloudfrac', 2, 'high clouds')
+}
+
+
+@lru_cache(maxsize=None)
+def _get_derive_yaml() -> dict:
+    """
+    Get the derivation info from the YAML file, which is read once per process
+    :return: Derivation info
+    """
+    derivation_data = pkgutil.get_data('wrfcloud', 'runtime/resources/derive_products.yaml')
+    return yaml.safe_load(derivation_data)
+
+
+def _get_shared_diagnostic(in_data: Dataset, field_name: str, field_args: dict, cache: dict,
+                           diagnostics: dict) -> any:
+    """
+    Get a field from a diagnostic in SHARED_DIAGNOSTICS, and only compute the diagnostic for the first
+    of its fields
+    :param in_data: WRF NetCDF file
+    :param field_name: Name of the field
+    :param field_args: Optional arguments to the wrf-python getvar function
+    :param cache: Raw WRF variables read from the file
+    :param diagnostics: Diagnostics already computed from the file, by name and arguments
+    :return: Field with the same values and attributes that getvar returns for it
+    """
+    diagnostic_name, index, description = SHARED_DIAGNOSTICS[field_name]
+    key = (diagnostic_name, tuple(sorted(field_args.items())))
+    if key not in diagnostics:
+        diagnostics[key] = getvar(in_data, diagnostic_name, cache=cache, **field_args)
+
+    # copy the field so the shared diagnostic is not modified later
+    var = diagnostics[key][index, :].copy()
+    var.attrs['description'] = description
+    return var
+
+
+def derive_fields(in_file: str, out_dir: str, timings: Union[Dict[str, float], None] = None):
     """
     Convert units (K to C, gpm to dam, etc.) and derive WRF fields (wind speed
     and direction).
     :param in_file: WRF NetCDF file to process
     :param out_dir: Directory to write derived output file
+    :param timings: Optional dictionary to fill with the seconds spent deriving each field
     """
     log = Logger()
     os.makedirs(out_dir, exist_ok=True)
     out_file = f"{os.path.basename(in_file).replace('wrfout', 'wrfderive')}.nc"
     out_file = os.path.join(out_dir, out_file)
+    timings = {} if timings is None else timings
 
     # read derivation info from YAML file
-    derivation_data = pkgutil.get_data('wrfcloud', 'runtime/resources/derive_products.yaml')
-    derive_yaml = yaml.safe_load(derivation_data)
+    derive_yaml = _get_derive_yaml()
     fields = derive_yaml['fields']
     interp_levels = derive_yaml['interp_levels']
     field_attrs_to_copy = derive_yaml['field_attrs_to_copy']
@@ -55,7 +114,15 @@ def derive_fields(in_file: str, out_dir: str):
                 out_data[name][:] = in_data[name][:]
                 out_data[name].setncatts(in_data[name].__dict__)
 
+            # read the shared inputs once for all of the fields
+            start = perf_counter()
+            cache_variables = [name for name in CACHE_VARIABLES if name in in_data.variables]
+            cache = extract_vars(in_data, 0, cache_variables)
+            timings['shared inputs'] = perf_counter() - start
+            diagnostics = {}
+
             for field in fields:
+                start = perf_counter()
                 field_name = field['name']
                 # use name as output name if out_name is not set
                 out_name = field_name if 'out_name' not in field else field['out_name']
@@ -64,16 +131,21 @@ def derive_fields(in_file: str, out_dir: str):
 
                 # compute total accum precip by adding rain c and rain nc
                 if field_name.lower() == 'total_precip':
-                    var1 = getvar(in_data, 'RAINNC')
-                    var2 = getvar(in_data, 'RAINC')
+                    var1 = getvar(in_data, 'RAINNC', cache=cache)
+                    var2 = getvar(in_data, 'RAINC', cache=cache)
                     var = var1 + var2
+                elif field_name in SHARED_DIAGNOSTICS:
+                    var = _get_shared_diagnostic(in_data, field_name, field_args, cache, diagnostics)
                 else:
-                    var = getvar(in_data, field_name, **field_args)
+                    var = getvar(in_data, field_name, cache=cache, **field_args)
+                    # copy raw variables so the shared inputs are not modified below
+                    if field_name in cache:
+                        var = var.copy()
 
                 # interpolate fields to pressure levels if requested
                 if 'levels' in field and field['levels'] is True:
                     var = vinterp(in_data, field=var, vert_coord='pressure',
-                                  interp_levels=interp_levels, extrapolate=True)
+                                  interp_levels=interp_levels, extrapolate=True, cache=cache)
 
                 # convert 2m temp to C because units is not an option for T2
                 if field_name == 'T2':
@@ -90,8 +162,23 @@ def derive_fields(in_file: str, out_dir: str):
                 for attr in field_attrs_to_copy:
                     if attr in var.attrs:
                         out_data[out_name].setncattr(attr, var.attrs[attr])
+
+                timings[out_name] = perf_counter() - start
+                log.debug(f'Derived {out_name} in {timings[out_name]:.3f} seconds')
     except Exception as e:
         log.error('Could not derive fields: ', e)
         return None
 
     return out_file
+
+
+def derive_fields_task(in_file: str, out_dir: str) -> Tuple[Union[str, None], Dict[str, float]]:
+    """
+    Derive fields from a file in a worker process
+    :param in_file: WRF NetCDF file to process
+    :param out_dir: Directory to write derived output file
+    :return: Derived output file or None if it failed, and the seconds spent deriving each field
+    """
+    timings = {}
+    out_file = derive_fields(in_file, out_dir, timings)
+    return out_file, timings
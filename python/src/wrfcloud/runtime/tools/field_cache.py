@@ -0,0 +1,255 @@
+"""
+Module to read all the fields needed from a WRF/UPP output file in a single pass and share them
+read-only with the post-processing worker processes
+"""
+import sys
+from datetime import datetime
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock
+from typing import Union, List, Dict, Tuple
+# pylint: disable=E0401,E0611
+from netCDF4 import Dataset
+import numpy
+from numpy.ma.core import MaskedArray
+# pylint: disable=E0401
+import pygrib
+
+from wrfcloud.log import Logger
+
+
+# Serializes attaching to shared memory without the resource tracker before Python 3.13
+_ATTACH_LOCK = Lock()
+
+
+class SharedArray:
+    """
+    Picklable reference to a numpy array in shared memory
+    """
+    def __init__(self, name: str, shape: Tuple[int, ...], dtype: str):
+        """
+        Create a reference to an array in shared memory
+        :param name: Name of the shared memory block
+        :param shape: Shape of the array
+        :param dtype: Data type of the array
+        """
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    @staticmethod
+    def create(array: numpy.ndarray) -> (SharedMemory, 'SharedArray'):
+        """
+        Copy an array into a new shared memory block
+        :param array: Array to copy
+        :return: The shared memory block, which the caller must close and unlink, and a reference to it
+        """
+        shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = numpy.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        shared[:] = array
+        return shm, SharedArray(shm.name, array.shape, array.dtype.str)
+
+    def attach(self) -> (SharedMemory, numpy.ndarray):
+        """
+        Attach to the shared memory block without registering it with the resource tracker, since only the
+        process that created the block unlinks it.  A worker with its own resource tracker would otherwise
+        unlink the block and warn about a leak when it exits.
+        :return: The shared memory block, which the caller must close when finished, and a read-only array
+        """
+        if sys.version_info >= (3, 13):
+            shm = SharedMemory(name=self.name, track=False)  # pylint: disable=E1123
+        else:
+            # unregistering the block after attaching would also drop the registration of the creator, or of
+            # another worker, from a resource tracker shared with them, so skip the registration instead
+            with _ATTACH_LOCK:
+                register = resource_tracker.register
+                resource_tracker.register = lambda name, rtype: None
+                try:
+                    shm = SharedMemory(name=self.name)
+                finally:
+                    resource_tracker.register = register
+        array = numpy.ndarray(self.shape, dtype=numpy.dtype(self.dtype), buffer=shm.buf)
+        array.flags.writeable = False
+        return shm, array
+
+
+class FieldCache:
+    """
+    Read the latitude and longitude grids, valid times, grid spacing, and data grids from a WRF/UPP
+    output file
+    """
+    def __init__(self, wrf_file: str, file_type: str):
+        """
+        Construct a field cache for a single file
+        :param wrf_file: Full path to the WRF output file
+        :param file_type: File type can be either 'grib2' or 'netcdf'
+        """
+        self.log = Logger(self.__class__.__name__)
+        self.wrf_file = wrf_file
+        self.file_type = file_type
+        self.grid_lat: Union[MaskedArray, None] = None
+        self.grid_lon: Union[MaskedArray, None] = None
+        self.grids: Dict[Tuple[str, Union[int, None]], MaskedArray] = {}
+        self.valid_times: Dict[str, float] = {}
+        self.dx: Union[int, None] = None
+        self.dy: Union[int, None] = None
+        self.shared_memory: List[SharedMemory] = []
+
+    def load(self, fields: List[Tuple[str, Union[int, None]]]) -> bool:
+        """
+        Open the file once and read the lat/lon grids, the valid time of every variable in the file,
+        and every requested field
+        :param fields: List of (variable, z_level) pairs, where z_level is None for 2D fields
+        :return: True if the file was read, otherwise False
+        """
+        try:
+            if self.file_type == 'grib2':
+                self._load_from_grib(fields)
+            elif self.file_type == 'netcdf':
+                self._load_from_netcdf(fields)
+            else:
+                self.log.error(f'Invalid file type: {self.file_type}.'
+                               f'Valid types are "netcdf" and "grib2".')
+                return False
+        except Exception as e:
+            self.log.error(f'Exception occurred trying to read {self.wrf_file}', e)
+            return False
+
+        return True
+
+    def get_grid(self, variable: str, z_level: Union[int, None] = None) -> Union[MaskedArray, None]:
+        """
+        Get a data grid that was loaded
+        :param variable: Name of the variable
+        :param z_level: Vertical level, or None for a 2D field
+        :return: Data grid, or None if it was not loaded
+        """
+        return self.grids.get((variable, z_level))
+
+    def get_valid_time(self, variable: str) -> Union[float, None]:
+        """
+        Get the valid time of a variable
+        :param variable: Name of the variable
+        :return: Valid time as a timestamp, or None if not found
+        """
+        return self.valid_times.get(variable)
+
+    def share(self) -> Dict[str, any]:
+        """
+        Copy the lat/lon grids and data grids into shared memory.  Masked values are set to NaN, so grids
+        that are not float grids are shared as float grids.
+        :return: Dictionary with 'grid_lat' and 'grid_lon' SharedArray references, and 'grids', a
+                 dictionary of SharedArray references keyed by (variable, z_level)
+        """
+        shared = {
+            'grid_lat': self._share_array(self.grid_lat),
+            'grid_lon': self._share_array(self.grid_lon),
+            'grids': {}
+        }
+        for key, grid in self.grids.items():
+            shared['grids'][key] = self._share_array(grid)
+
+        return shared
+
+    def close(self) -> None:
+        """
+        Release any shared memory blocks created by this cache
+        """
+        for shm in self.shared_memory:
+            shm.close()
+            shm.unlink()
+        self.shared_memory = []
+
+    def _share_array(self, array: MaskedArray) -> SharedArray:
+        """
+        Copy a single array into shared memory
+        :param array: Array to copy
+        :return: Reference to the shared array
+        """
+        # keep the data type of float grids, other grids need a float type to set masked values to NaN
+        array = numpy.ma.asarray(array)
+        data = numpy.ma.filled(array.astype(numpy.result_type(array.dtype, numpy.float32), copy=False), numpy.nan)
+        shm, shared = SharedArray.create(data)
+        self.shared_memory.append(shm)
+        return shared
+
+    def _load_from_netcdf(self, fields: List[Tuple[str, Union[int, None]]]) -> None:
+        """
+        Read the fields from a NetCDF file
+        :param fields: List of (variable, z_level) pairs
+        """
+        # pylint thinks that the Dataset class does not exist in netCDF4 pylint: disable=E1101
+        with Dataset(self.wrf_file) as wrf:
+            # get the latitude and longitude grids
+            self.grid_lat = wrf['XLAT'][0]
+            self.grid_lon = wrf['XLONG'][0]
+
+            # all variables in a WRF NetCDF file share the same valid time
+            file_time = wrf['Times'][:].tobytes().decode()
+            valid_time = datetime.strptime(file_time, '%Y-%m-%d_%H:%M:%S').timestamp()
+            self.valid_times = {variable: valid_time for variable in wrf.variables}
+
+            # get dx/dy from global attributes
+            if 'DX' in wrf.ncattrs() and 'DY' in wrf.ncattrs():
+                self.dx = int(wrf.getncattr('DX'))
+                self.dy = int(wrf.getncattr('DY'))
+
+            for variable, z_level in fields:
+                if variable not in wrf.variables:
+                    self.log.error(f'Could not find variable: {variable}')
+                    continue
+
+                # get the requested horizontal slice
+                data = wrf[variable]
+                grid = data[:] if data.dimensions[0] != 'Time' else data[0]
+                if z_level:
+                    z_index = None
+                    for idx, z_val in enumerate(wrf[data.dimensions[0]]):
+                        if int(z_val) == z_level:
+                            z_index = idx
+                    if z_index is None:
+                        self.log.error(f'Could not find z level: {z_level}')
+                        continue
+                    grid = grid[z_index]
+
+                self.grids[(variable, z_level)] = grid
+
+    def _load_from_grib(self, fields: List[Tuple[str, Union[int, None]]]) -> None:
+        """
+        Read the fields from a GRIB2 file in a single pass over the messages.  The first message that
+        matches each field is used, which is the same message pygrib's select would return first.
+        :param fields: List of (variable, z_level) pairs
+        """
+        variables = {variable for variable, _ in fields} | {'nlat', 'elon'}
+        wanted = set(fields) | {('nlat', None), ('elon', None)}
+        messages = {}
+
+        # read grib2 file with pygrib & eccodes
+        with pygrib.open(self.wrf_file) as wrf:  # pylint: disable=E1101
+            for message in wrf:
+                short_name = message.shortName
+                if short_name not in self.valid_times:
+                    self.valid_times[short_name] = message.validDate.timestamp()
+
+                if short_name not in variables:
+                    continue
+
+                # 2D fields use the first message with the short name
+                if (short_name, None) in wanted and (short_name, None) not in messages:
+                    messages[(short_name, None)] = message
+
+                # 3D fields use the first message on the requested isobaric level
+                if message.typeOfLevel == 'isobaricInhPa':
+                    key = (short_name, int(message.level))
+                    if key in wanted and key not in messages:
+                        messages[key] = message
+
+            # get the latitude and longitude grids
+            self.grid_lat = MaskedArray(messages.pop(('nlat', None)).values)
+            self.grid_lon = MaskedArray(messages.pop(('elon', None)).values) - 360
+
+            for key in fields:
+                if key not in messages:
+                    self.log.error(f'Could not find {key[0]}' + ('' if key[1] is None else f' at level {key[1]}'))
+                    continue
+                self.grids[key] = MaskedArray(messages[key].values)
@@ -3,25 +3,30 @@ Module to convert WRF output to GeoJSON
 """
 import os
 import pkgutil
-from concurrent.futures import ProcessPoolExecutor, wait
-from typing import Union, List
+from typing import Union, List, Dict
 from gzip import compress
 import json
 from argparse import ArgumentParser
-from datetime import datetime
 import yaml
 # pylint: disable=E0401,E0611
 from netCDF4 import Dataset
+import contourpy
+import matplotlib
 from matplotlib import colors
-from matplotlib import contour
-from matplotlib import pyplot
+from matplotlib.path import Path
 import numpy
 from numpy.ma.core import MaskedArray
 # pylint: disable=E0401
 import pygrib
 
 from wrfcloud.jobs.job import WrfLayer, Palette
+from wrfcloud.jobs.tiles import get_meters_per_pixel
 from wrfcloud.log import Logger
+from wrfcloud.runtime.tools.converter_pool import ConverterPool, remove_missing_layers
+from wrfcloud.runtime.tools.field_cache import FieldCache, SharedArray
+from wrfcloud.runtime.tools.layer_encoding import encode_features
+from wrfcloud.runtime.tools.simplify import simplify_polygons
+from wrfcloud.runtime.tools.tiler import get_grid_spacing, get_tile_layout, tile_features, write_tiles
 from wrfcloud.system import init_environment
 
 
@@ -29,8 +34,21 @@ class GeoJson:
     """
     Class to convert WRF output to GeoJSON MultiPolygon format
     """
+
+    """
+    Available filled contour engines, the first is the default
+    """
+    CONTOUR_ENGINES = ['contourpy', 'pyplot']
+
+    """
+    Polygon simplification tolerance in grid cells for each level of detail, see WrfLayer.DETAIL_LEVELS
+    """
+    DETAIL_TOLERANCES = {WrfLayer.DETAIL_COARSE: 4.0, WrfLayer.DETAIL_MEDIUM: 1.0, WrfLayer.DETAIL_FULL: 0.0}
+
     def __init__(self, wrf_file: str, file_type: str, variable: str, value_range: List[float],
-                 contour_interval: float, palette: str, z_level: Union[int, None] = None):
+                 contour_interval: float, palette: str, z_level: Union[int, None] = None,
+                 contour_engine: str = CONTOUR_ENGINES[0], encodings: Union[List[str], None] = None,
+                 detail_levels: Union[List[str], None] = None, tiles: bool = False):
         """
         Construct a WRF to GeoJSON converter
         :param wrf_file: Full path to the WRF output file
@@ -40,6 +58,11 @@ class GeoJson:
         :param contour_interval: Value difference between contour levels
         :param palette: Name of the color palette
         :param z_level: Height level in the to convert
+        :param contour_engine: Filled contour engine, see GeoJson.CONTOUR_ENGINES
+        :param encodings: Encodings of the output files, see WrfLayer.ENCODINGS, defaults to GeoJSON only
+        :param detail_levels: Levels of detail of the output files, see WrfLayer.DETAIL_LEVELS, defaults to
+                              the full resolution only
+        :param tiles: Also slice the layer into z/x/y tiles
         """
         self.log = Logger(self.__class__.__name__)
         self.wrf_file = wrf_file
@@ -53,6 +76,10 @@ class GeoJson:
         self.max = value_range[1]
         self.contour_interval = contour_interval
         self.palette = palette
+        self.contour_engine = contour_engine
+        self.encodings = encodings or [WrfLayer.ENCODING_GEOJSON]
+        self.detail_levels = detail_levels or [WrfLayer.DETAIL_FULL]
+        self.tiles = tiles
         self.time_step = 0
 
     def convert(self, out_file: Union[str, None]) -> Union[None, dict]:
@@ -65,8 +92,10 @@ class GeoJson:
         self.log.info(f'Converting {self.variable} to {out_file}')
 
         try:
-            # get the data, lat, and lon grids
-            if self.file_type == 'grib2':
+            # get the data, lat, and lon grids, unless they were already provided
+            if self.grid is not None and self.grid_lat is not None and self.grid_lon is not None:
+                grid = numpy.ma.masked_invalid(self.grid, copy=False)
+            elif self.file_type == 'grib2':
                 grid, self.grid_lat, self.grid_lon = self._read_from_grib()
             elif self.file_type == 'netcdf':
                 grid, self.grid_lat, self.grid_lon = self._read_from_netcdf()
@@ -75,29 +104,71 @@ class GeoJson:
                                f'Valid types are "netcdf" and "grib2".')
                 return None
 
-            # create a set of features for the GeoJSON file
-            features = self._create_features(grid)
+            # contour the grid once, then create a set of features for each level of detail
+            bands = self._get_contour_bands(grid)
 
-            # create the GeoJSON document
-            doc = {
-                "type": "FeatureCollection",
-                "features": features
-            }
-
-            # return the document if no output file was provided
+            # return the full resolution document if no output file was provided
             if out_file is None:
-                return doc
+                return {
+                    "type": "FeatureCollection",
+                    "features": self._bands_to_features(bands)
+                }
 
-            # write the data to a file or return as a string if no data were
-            with open(out_file, 'wb') as file:
-                file.write(compress(json.dumps(doc).encode()))
-                file.flush()
-                file.close()
+            features_by_level = {}
+            for detail_level in self.detail_levels:
+                features = self._bands_to_features(bands, self.DETAIL_TOLERANCES[detail_level])
+                self._write_layer_files(out_file, features, detail_level)
+                if self.tiles:
+                    features_by_level[detail_level] = features
+
+            # slice the layer into z/x/y tiles
+            if self.tiles:
+                self._write_tiles(out_file, features_by_level)
         except Exception as e:
             self.log.error(f'Exception occurred trying to create {out_file}: {e}')
 
         return None
 
+    def _write_layer_files(self, out_file: str, features: list, detail_level: str) -> None:
+        """
+        Write the features for a level of detail to a file in each encoding
+        :param out_file: Full path to the full resolution GeoJSON output file
+        :param features: GeoJSON features
+        :param detail_level: Level of detail of the features, see WrfLayer.DETAIL_LEVELS
+        """
+        # write the GeoJSON document
+        if WrfLayer.ENCODING_GEOJSON in self.encodings:
+            doc = {
+                "type": "FeatureCollection",
+                "features": features
+            }
+            with open(WrfLayer.get_file_name(out_file, WrfLayer.ENCODING_GEOJSON, detail_level), 'wb') as file:
+                file.write(compress(json.dumps(doc).encode()))
+
+        # write the same features in the compact binary encoding
+        if WrfLayer.ENCODING_BINARY in self.encodings:
+            with open(WrfLayer.get_file_name(out_file, WrfLayer.ENCODING_BINARY, detail_level), 'wb') as file:
+                file.write(compress(encode_features(features)))
+
+    def _write_tiles(self, out_file: str, features_by_level: Dict[str, list]) -> None:
+        """
+        Write the z/x/y tiles for the layer, using the coarsest level of detail that looks the same as
+        the full resolution at each zoom level
+        :param out_file: Full path to the full resolution GeoJSON output file
+        :param features_by_level: GeoJSON features for each level of detail
+        """
+        tile_zooms, bounds = get_tile_layout(self.grid_lat, self.grid_lon)
+        grid_spacing = get_grid_spacing(self.grid_lat, self.grid_lon)
+        latitude = 0.5 * (bounds[1] + bounds[3])
+
+        for zoom in tile_zooms:
+            meters_per_pixel = get_meters_per_pixel(zoom, latitude)
+            levels = [level for level in WrfLayer.DETAIL_LEVELS if level in features_by_level]
+            fitting_levels = [level for level in levels
+                              if self.DETAIL_TOLERANCES[level] * grid_spacing <= meters_per_pixel]
+            detail_level = fitting_levels[0] if fitting_levels else levels[-1]
+            write_tiles(out_file, zoom, tile_features(features_by_level[detail_level], zoom, bounds))
+
     def _read_from_netcdf(self) -> (MaskedArray, MaskedArray, MaskedArray):
         """
         Read the variable data, latitude, and longitude grids from a NetCDF file
@@ -191,8 +262,8 @@ class GeoJson:
         # get the integer grid indices
         x1 = int(x)
         y1 = int(y)
-        x2 = int(x) + 1 if x1 != round(x, 5) else x1
-        y2 = int(y) + 1 if y1 != round(y, 5) else y1
+        x2 = int(x) + 1 if x1 != numpy.round(x, 5) else x1
+        y2 = int(y) + 1 if y1 != numpy.round(y, 5) else y1
 
         # get bounding lat/lon values for a linear interpolation
         lat1 = self.grid_lat[y1][x1]
@@ -208,18 +279,52 @@ class GeoJson:
         lat = lat1 + ((lat2 - lat1) * y_frac)
         lon = lon1 + ((lon2 - lon1) * x_frac)
 
-        return round(lon, 5), round(lat, 5)
+        return numpy.round(lon, 5), numpy.round(lat, 5)
+
+    def _grid_to_lonlat_array(self, x: numpy.ndarray, y: numpy.ndarray) -> (numpy.ndarray, numpy.ndarray):
+        """
+        Convert arrays of grid XY coordinates to longitude and latitude in a single pass.  This
+        is the vectorized equivalent of _grid_to_lonlat and produces identical values, since both
+        round with numpy.round, which rounds some half-way values differently than Python's round.
+        :param x: Array of X positions on the grid
+        :param y: Array of Y positions on the grid
+        :return: Array of longitudes and array of latitudes
+        """
+        # get the integer grid indices
+        x1 = x.astype(int)
+        y1 = y.astype(int)
+        x2 = numpy.where(x1 != numpy.round(x, 5), x1 + 1, x1)
+        y2 = numpy.where(y1 != numpy.round(y, 5), y1 + 1, y1)
+
+        # get bounding lat/lon values for a linear interpolation
+        grid_lat = numpy.ma.getdata(self.grid_lat)
+        grid_lon = numpy.ma.getdata(self.grid_lon)
+        lat1 = grid_lat[y1, x1]
+        lon1 = grid_lon[y1, x1]
+        lat2 = grid_lat[y2, x2]
+        lon2 = grid_lon[y2, x2]
+
+        # get the x and y grid value fractions for a linear interpolation
+        x_frac = x - x1
+        y_frac = y - y1
+
+        # compute lat/lon values with a linear interpolation
+        lat = lat1 + ((lat2 - lat1) * y_frac)
+        lon = lon1 + ((lon2 - lon1) * x_frac)
+
+        return numpy.round(lon, 5), numpy.round(lat, 5)
 
     def _polygon_to_coord_array(self, polygon: numpy.ndarray) -> list[(float, float)]:
         """
         Convert a polygon contour path to a coordinate array
         """
-        points = []
-        for point in polygon:
-            lonlat_point = self._grid_to_lonlat(point[0], point[1])
-            points.append(lonlat_point)
+        # project all the vertices at once
+        polygon = numpy.asarray(polygon, dtype=float)
+        if len(polygon) == 0:
+            return []
+        lon, lat = self._grid_to_lonlat_array(polygon[:, 0], polygon[:, 1])
 
-        return points
+        return list(zip(lon.tolist(), lat.tolist()))
 
     @staticmethod
     def _polygon_and_holes_to_multi_polygon(polygon: list[list[float]], holes: list[list[list[float]]]) -> str:
@@ -234,23 +339,102 @@ class GeoJson:
             mp_str += ',' + str([[point[0], point[1]] for point in hole])
         return '[' + mp_str + ']'
 
-    def _create_features(self, grid: MaskedArray):
-        features = []
-
-        # create a set of contours from the data grid
+    def _get_contour_levels(self) -> List[float]:
+        """
+        Get the contour levels from the value range and contour interval
+        :return: List of contour levels
+        """
         range_min = int(self.min * 10)
         range_max = int(self.max * 10)
         contour_interval = int(self.contour_interval*10)
-        levels = [i/10 for i in range(range_min, range_max, contour_interval)]
-        contours: contour.QuadContourSet = pyplot.contourf(grid, levels=levels, cmap=self.palette, extend='both')
+        return [i/10 for i in range(range_min, range_max, contour_interval)]
 
-        # loop over each contour level
-        for i, contour_line in enumerate(contours.collections):
-            # get the hex color for this level
-            level_color = colors.rgb2hex(contours.tcolors[i][0])
+    def _contour_with_pyplot(self, grid: MaskedArray, levels: List[float]) -> List[tuple[str, List[Path]]]:
+        """
+        Create filled contours with pyplot.contourf, which requires a figure
+        :param grid: Data grid to contour
+        :param levels: Contour levels
+        :return: List of hex color and paths for each contour band
+        """
+        # pylint: disable=C0415
+        from matplotlib import pyplot
+
+        contours = pyplot.contourf(grid, levels=levels, cmap=self.palette, extend='both')
+        bands = [(colors.rgb2hex(contours.tcolors[i][0]), contour_line.get_paths())
+                 for i, contour_line in enumerate(contours.collections)]
+
+        # do not leave the figure open in long-lived worker processes
+        pyplot.close(contours.axes.figure)
+
+        return bands
+
+    def _contour_with_contourpy(self, grid: MaskedArray, levels: List[float]) -> List[tuple[str, List[Path]]]:
+        """
+        Create filled contours directly with contourpy, the same algorithm used by pyplot.contourf,
+        but without a figure.  The bands and colors match pyplot.contourf(..., extend='both').
+        :param grid: Data grid to contour
+        :param levels: Contour levels
+        :return: List of hex color and paths for each contour band
+        """
+        z = numpy.ma.masked_invalid(numpy.ma.asarray(grid, dtype=numpy.float64), copy=False)
+        generator = contourpy.contour_generator(z=z, name='mpl2014', corner_mask=True,
+                                                fill_type=contourpy.FillType.OuterCode)
+
+        # extend the bands below the first and above the last level, like extend='both'
+        bounds = numpy.array([-1e250] + list(levels) + [1e250])
+
+        # color each band by its mid-point value, out of range bands get the end colors
+        cmap = matplotlib.colormaps[self.palette]
+        norm = colors.Normalize(vmin=levels[0], vmax=levels[-1])
+        band_colors = cmap(norm(0.5 * (bounds[:-1] + bounds[1:])))
+
+        bands = []
+        for i, band_color in enumerate(band_colors):
+            points, codes = generator.filled(bounds[i], bounds[i+1])
+            paths = [Path(vertices, codes=path_codes) for vertices, path_codes in zip(points, codes)]
+            bands.append((colors.rgb2hex(band_color), paths))
+
+        return bands
+
+    def _create_features(self, grid: MaskedArray, tolerance: float = 0) -> list:
+        """
+        Create GeoJSON features for the filled contours of a data grid
+        :param grid: Data grid to contour
+        :param tolerance: Polygon simplification tolerance in grid cells, or zero for full resolution
+        :return: List of GeoJSON features
+        """
+        return self._bands_to_features(self._get_contour_bands(grid), tolerance)
+
+    def _get_contour_bands(self, grid: MaskedArray) -> List[tuple[str, List[Path]]]:
+        """
+        Create filled contours with the selected contour engine
+        :param grid: Data grid to contour
+        :return: List of hex color and paths for each contour band
+        """
+        levels = self._get_contour_levels()
+        if self.contour_engine == 'pyplot':
+            bands = self._contour_with_pyplot(grid, levels)
+        elif self.contour_engine == 'contourpy':
+            bands = self._contour_with_contourpy(grid, levels)
+        else:
+            raise ValueError(f'Invalid contour engine: {self.contour_engine}. '
+                             f'Valid engines are {self.CONTOUR_ENGINES}.')
+
+        return bands
 
+    def _bands_to_features(self, bands: List[tuple[str, List[Path]]], tolerance: float = 0) -> list:
+        """
+        Convert filled contour bands to GeoJSON features
+        :param bands: List of hex color and paths for each contour band
+        :param tolerance: Polygon simplification tolerance in grid cells, or zero for full resolution
+        :return: List of GeoJSON features
+        """
+        band_polygons = []
+
+        # loop over each contour level
+        for level_color, paths in bands:
             # loop over each outer polygon and set of interior holes
-            for path in contour_line.get_paths():
+            for path in paths:
 
                 # get the list of polygons for this set
                 path_polygons = path.to_polygons()
@@ -260,31 +444,42 @@ class GeoJson:
                     self.log.warn('No polygons found')
                     continue
 
-                # the first polygon in the list is the outer polygon
-                outer_polygon = self._polygon_to_coord_array(path_polygons[0])
-
-                # the remaining polygons are holes in the outer polygon
-                holes = [self._polygon_to_coord_array(hole) for hole in path_polygons[1:]]
-
-                # get the string of the MultiPolygon coordinates for outer polygon and holes
-                polygon_string = self._polygon_and_holes_to_multi_polygon(outer_polygon, holes)
-
-                # create a GeoJSON feature as a dictionary
-                feature = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "MultiPolygon",
-                        "coordinates": [json.loads(polygon_string)]
-                    },
-                    "properties": {
-                        # "stroke-width": 0,  no effect in OpenLayers--only makes data set larger
-                        "fill": level_color
-                        # "fill-opacity": 1   no effect in OpenLayers--only makes data set larger
-                    }
+                band_polygons.append((level_color, path_polygons))
+
+        # simplify the polygons of all levels together in grid space, so neighbouring levels still share
+        # their boundaries, dropping any that collapse within the tolerance
+        if tolerance > 0:
+            simplified = simplify_polygons([path_polygons for _, path_polygons in band_polygons], tolerance)
+            band_polygons = [(level_color, path_polygons) for (level_color, _), path_polygons
+                             in zip(band_polygons, simplified) if path_polygons is not None]
+
+        features = []
+        for level_color, path_polygons in band_polygons:
+            # the first polygon in the list is the outer polygon
+            outer_polygon = self._polygon_to_coord_array(path_polygons[0])
+
+            # the remaining polygons are holes in the outer polygon
+            holes = [self._polygon_to_coord_array(hole) for hole in path_polygons[1:]]
+
+            # get the string of the MultiPolygon coordinates for outer polygon and holes
+            polygon_string = self._polygon_and_holes_to_multi_polygon(outer_polygon, holes)
+
+            # create a GeoJSON feature as a dictionary
+            feature = {
+                "type": "Feature",
+                "geometry": {
+                    "type": "MultiPolygon",
+                    "coordinates": [json.loads(polygon_string)]
+                },
+                "properties": {
+                    # "stroke-width": 0,  no effect in OpenLayers--only makes data set larger
+                    "fill": level_color
+                    # "fill-opacity": 1   no effect in OpenLayers--only makes data set larger
                 }
+            }
 
-                # add this MultiPolygon feature to the set of features
-                features.append(feature)
+            # add this MultiPolygon feature to the set of features
+            features.append(feature)
 
         return features
 
@@ -307,6 +502,14 @@ def main():
     parser.add_argument('--palette', type=str, help='Color palette name https://matplotlib.org/stable/gallery/color/colormap_reference.html', required=False)
     parser.add_argument('--contour-interval', type=float, help='Value difference between contour levels, required if auto not set', required=False)
     parser.add_argument('--z-level', type=int, help='Z-level if a 3D field', required=False)
+    parser.add_argument('--contour-engine', type=str, help='Filled contour engine', required=False,
+                        choices=GeoJson.CONTOUR_ENGINES, default=GeoJson.CONTOUR_ENGINES[0])
+    parser.add_argument('--encodings', type=str, nargs='+', help='Output file encodings', required=False,
+                        choices=WrfLayer.ENCODINGS, default=[WrfLayer.ENCODING_GEOJSON])
+    parser.add_argument('--detail-levels', type=str, nargs='+', help='Output file levels of detail', required=False,
+                        choices=WrfLayer.DETAIL_LEVELS, default=[WrfLayer.DETAIL_FULL])
+    parser.add_argument('--tiles', help='Also slice the output into z/x/y tiles', required=False,
+                        action='store_true')
     parser.add_argument('--auto', help='Automatically creates full output set', required=False, action='store_true')
     args = parser.parse_args()
 
@@ -319,17 +522,25 @@ def main():
     value_range = [args.min, args.max]
     contour_interval = args.contour_interval
     palette = args.palette
+    contour_engine = args.contour_engine
+    encodings = args.encodings
+    detail_levels = args.detail_levels
+    tiles = args.tiles
     auto = args.auto
 
     # select mode and convert the WRF data to GeoJSON
     if not auto:
-        _manual_product(wrf_file, file_type, out_file, variable, value_range, contour_interval, palette, z_level)
+        _manual_product(wrf_file, file_type, out_file, variable, value_range, contour_interval, palette, z_level,
+                        contour_engine, encodings, detail_levels, tiles)
     else:
-        automate_geojson_products(wrf_file, file_type)
+        automate_geojson_products(wrf_file, file_type, contour_engine, encodings, detail_levels, tiles)
 
 
 def _manual_product(wrf_file: str, file_type: str, out_file: Union[str, None], variable: str, value_range: List[float],
-                    contour_interval: float, palette: str, z_level: Union[int, None]) -> None:
+                    contour_interval: float, palette: str, z_level: Union[int, None],
+                    contour_engine: str = GeoJson.CONTOUR_ENGINES[0],
+                    encodings: Union[List[str], None] = None,
+                    detail_levels: Union[List[str], None] = None, tiles: bool = False) -> None:
     """
     Generate a single product defined by manual CLI inputs
     :param wrf_file: Input file name
@@ -337,9 +548,14 @@ def _manual_product(wrf_file: str, file_type: str, out_file: Union[str, None], v
     :param out_file: Output file name or None if stdout is desired
     :param variable: Variable name in the file
     :param z_level: Vertical level to export, or None if a 2D variable
+    :param contour_engine: Filled contour engine, see GeoJson.CONTOUR_ENGINES
+    :param encodings: Encodings of the output file, see WrfLayer.ENCODINGS
+    :param detail_levels: Levels of detail of the output file, see WrfLayer.DETAIL_LEVELS
+    :param tiles: Also slice the output into z/x/y tiles
     """
     # convert the WRF data to GeoJSON
-    converter = GeoJson(wrf_file, file_type, variable, value_range, contour_interval, palette, z_level)
+    converter = GeoJson(wrf_file, file_type, variable, value_range, contour_interval, palette, z_level,
+                        contour_engine, encodings, detail_levels, tiles)
     output = converter.convert(out_file)
 
     # print the output to stdout if we do not have an output file
@@ -347,81 +563,158 @@ def _manual_product(wrf_file: str, file_type: str, out_file: Union[str, None], v
         print(json.dumps(output, indent=2))
 
 
-def automate_geojson_products(wrf_file: str, file_type: str) -> List[WrfLayer]:
+def _convert_shared_field(converter: GeoJson, grid: SharedArray, grid_lat: SharedArray, grid_lon: SharedArray,
+                          out_file: str) -> None:
+    """
+    Convert a field that was read by the parent process and placed in shared memory
+    :param converter: GeoJSON converter for the product
+    :param grid: Shared data grid
+    :param grid_lat: Shared latitude grid
+    :param grid_lon: Shared longitude grid
+    :param out_file: Full path to the output file
+    """
+    grid_shm, converter.grid = grid.attach()
+    lat_shm, converter.grid_lat = grid_lat.attach()
+    lon_shm, converter.grid_lon = grid_lon.attach()
+    try:
+        converter.convert(out_file)
+    finally:
+        # release the views before detaching from the shared memory
+        converter.grid = converter.grid_lat = converter.grid_lon = None
+        for shm in (grid_shm, lat_shm, lon_shm):
+            shm.close()
+
+
+def _out_files_exist(out_file: str, encodings: List[str], detail_levels: List[str], tiles: bool = False) -> bool:
+    """
+    Check if the output files already exist in every encoding and level of detail
+    :param out_file: Full path to the full resolution GeoJSON output file
+    :param encodings: Encodings of the output files
+    :param detail_levels: Levels of detail of the output files
+    :param tiles: True if the output is also sliced into tiles
+    :return: True if all the files exist, otherwise False
+    """
+    if tiles and not os.path.isdir(os.path.dirname(WrfLayer.get_tile_file_name(out_file, 0, 0, 0))):
+        return False
+    return all(os.path.exists(WrfLayer.get_file_name(out_file, encoding, detail_level))
+               for encoding in encodings for detail_level in detail_levels)
+
+
+def automate_geojson_products(wrf_file: str, file_type: str, contour_engine: str = GeoJson.CONTOUR_ENGINES[0],
+                              encodings: Union[List[str], None] = None,
+                              detail_levels: Union[List[str], None] = None,
+                              tiles: bool = False) -> List[WrfLayer]:
     """
     Generate all the products defined in the geojson_products.yaml file
     :param wrf_file: Input file name
     :param file_type: Type of input file, currently support either 'grib2' or 'netcdf'
+    :param contour_engine: Filled contour engine, see GeoJson.CONTOUR_ENGINES
+    :param encodings: Encodings of the output files, see WrfLayer.ENCODINGS, defaults to GeoJSON only
+    :param detail_levels: Levels of detail of the output files, see WrfLayer.DETAIL_LEVELS, defaults to
+                          the full resolution only
+    :param tiles: Also slice the output into z/x/y tiles
     :return: List of GeoJSON output files
     """
-    log = Logger()
+    with ConverterPool() as pool:
+        out_layers = submit_geojson_products(wrf_file, file_type, pool, contour_engine, encodings, detail_levels,
+                                             tiles)
+
+    return remove_missing_layers(out_layers)
+
+
+def submit_geojson_products(wrf_file: str, file_type: str, pool: ConverterPool,
+                            contour_engine: str = GeoJson.CONTOUR_ENGINES[0],
+                            encodings: Union[List[str], None] = None,
+                            detail_levels: Union[List[str], None] = None,
+                            tiles: bool = False) -> List[WrfLayer]:
+    """
+    Submit all the products defined in the geojson_products.yaml file to a shared converter pool.
+    The caller must wait for the pool to finish before using the layer data files.
+    :param wrf_file: Input file name
+    :param file_type: Type of input file, currently support either 'grib2' or 'netcdf'
+    :param pool: Converter pool to run the conversions
+    :param contour_engine: Filled contour engine, see GeoJson.CONTOUR_ENGINES
+    :param encodings: Encodings of the output files, see WrfLayer.ENCODINGS, defaults to GeoJSON only
+    :param detail_levels: Levels of detail of the output files, see WrfLayer.DETAIL_LEVELS, defaults to
+                          the full resolution only
+    :param tiles: Also slice the output into z/x/y tiles
+    :return: List of GeoJSON output layers, some of which may fail to be created
+    """
+    encodings = encodings or [WrfLayer.ENCODING_GEOJSON]
+    detail_levels = detail_levels or [WrfLayer.DETAIL_FULL]
+
     # load the product list from the yaml file
     products_data = pkgutil.get_data('wrfcloud', 'runtime/resources/geojson_products.yaml')
     products = yaml.safe_load(products_data)['products']
 
-    # create a process pool for concurrent execution
-    ppe = ProcessPoolExecutor(max_workers=8)
-    futures = []
-
-    # create each product
-    out_layers: List[WrfLayer] = []
+    # find each product and z-level that matches the file type
+    product_levels = []
     for product in products:
         # only process products that match the file type
         if file_type not in product:
             continue
-        variable = product[file_type]['variable']
-        value_range = [product['range']['min'], product['range']['max']]
-        contour_interval = product['contour_interval']
-        palette_name = product['palette']
         z_levels = product['z_levels'] if 'z_levels' in product else [None]
         for z_level in z_levels:
-            # create the output file name
+            variable = product[file_type]['variable']
             out_file = (f'{wrf_file}_{variable}' if z_level is None else f'{wrf_file}_{variable}_{z_level}')
             out_file += '.geojson.gz'
+            product_levels.append((product, z_level, out_file))
+
+    # open the file once and read every field that still needs to be converted
+    cache = FieldCache(wrf_file, file_type)
+    if not cache.load([(product[file_type]['variable'], z_level)
+                       for product, z_level, out_file in product_levels
+                       if not _out_files_exist(out_file, encodings, detail_levels, tiles)]):
+        return []
+    shared = cache.share()
+
+    # convert the simplification tolerances from grid cells to meters for the API
+    grid_spacing = get_grid_spacing(cache.grid_lat, cache.grid_lon) if cache.grid_lat is not None else 0
+    tolerances = {level: GeoJson.DETAIL_TOLERANCES[level] * grid_spacing for level in detail_levels}
+    tile_zooms, bounds = get_tile_layout(cache.grid_lat, cache.grid_lon) if tiles else ([], None)
+    futures = []
 
-            # create the WRF Layer details for this output product
-            wrf_layer = WrfLayer()
-            wrf_layer.plot_type = 'contour'
-            wrf_layer.variable_name = variable
-            wrf_layer.display_name = product['display_name']
-            wrf_layer.palette = Palette({
-                'palette_name': palette_name,
-                'min_value': value_range[0],
-                'max_value': value_range[1]
-            })
-            wrf_layer.units = product['units']
-            wrf_layer.layer_data = out_file
-            wrf_layer.z_level = z_level
-
-            if file_type == 'grib2':
-                # pylint: disable=E1101
-                with pygrib.open(wrf_file) as grib:
-                    wrf_layer.dt = grib.select(shortName=variable)[0].validDate.timestamp()
-            else:
-                with Dataset(wrf_file) as wrf_nc:
-                    file_time = wrf_nc['Times'][:].tobytes().decode()
-                    dt = datetime.strptime(file_time, '%Y-%m-%d_%H:%M:%S')
-                    wrf_layer.dt = dt.timestamp()
-
-            out_layers.append(wrf_layer)
-
-            # convert the file if it does not already exist
-            if not os.path.exists(out_file):
-                converter = GeoJson(wrf_file, file_type, variable, value_range, contour_interval, palette_name, z_level)
-                future = ppe.submit(converter.convert, out_file)
-                futures.append(future)
-
-    wait(futures)
-
-    # remove any layers if the file does not exist
-    existing_layers = []
-    for layer in out_layers:
-        if os.path.exists(layer.layer_data):
-            existing_layers.append(layer)
-        else:
-            log.error(f'Layer does not exist: {layer.layer_data}')
+    # create each product
+    out_layers: List[WrfLayer] = []
+    for product, z_level, out_file in product_levels:
+        variable = product[file_type]['variable']
+        value_range = [product['range']['min'], product['range']['max']]
+        contour_interval = product['contour_interval']
+        palette_name = product['palette']
 
-    return existing_layers
+        # create the WRF Layer details for this output product
+        wrf_layer = WrfLayer()
+        wrf_layer.plot_type = 'contour'
+        wrf_layer.variable_name = variable
+        wrf_layer.display_name = product['display_name']
+        wrf_layer.palette = Palette({
+            'palette_name': palette_name,
+            'min_value': value_range[0],
+            'max_value': value_range[1]
+        })
+        wrf_layer.units = product['units']
+        wrf_layer.layer_data = out_file
+        wrf_layer.z_level = z_level
+        wrf_layer.dt = cache.get_valid_time(variable) or 0
+        wrf_layer.encodings = encodings
+        wrf_layer.detail_levels = tolerances
+        wrf_layer.tile_zooms = tile_zooms
+        wrf_layer.bounds = bounds
+
+        out_layers.append(wrf_layer)
+
+        # convert the file if it does not already exist
+        if not _out_files_exist(out_file, encodings, detail_levels, tiles) and (variable, z_level) in shared['grids']:
+            converter = GeoJson(wrf_file, file_type, variable, value_range, contour_interval, palette_name, z_level,
+                                contour_engine, encodings, detail_levels, tiles)
+            future = pool.submit(_convert_shared_field, converter, shared['grids'][(variable, z_level)],
+                                 shared['grid_lat'], shared['grid_lon'], out_file)
+            futures.append(future)
+
+    # release the shared memory once all the products from this file are done
+    pool.when_done(futures, cache.close)
+
+    return out_layers
 
 
 if __name__ == '__main__':
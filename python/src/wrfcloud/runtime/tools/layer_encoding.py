@@ -0,0 +1,168 @@
+"""
+Module to encode contour layers in a compact binary format, as an alternative to GeoJSON
+
+All numbers are little-endian.  The layout is:
+
+  magic           4 bytes  b'WCL1'
+  header_length   uint32   length of the JSON header in bytes, a multiple of 4
+  header          JSON     {"scale": 100000, "colors": ["#rrggbb", ...], "features": F, "polygons": P,
+                            "rings": R, "vertices": V}, padded with spaces
+  feature_colors  uint32[F]   index into the colour table for each feature
+  polygon_counts  uint32[F]   number of polygons in each MultiPolygon feature
+  ring_counts     uint32[P]   number of rings in each polygon, the first ring is the outer ring
+  vertex_counts   uint32[R]   number of vertices in each ring
+  coordinates     int32[2V]   lon/lat pairs multiplied by the scale, where the first vertex of each ring
+                              is absolute and the rest are deltas from the previous vertex
+
+Every array starts on a 4-byte boundary, so a browser can read them as typed arrays without copying.
+The GeoJSON converter rounds coordinates to 5 decimal places, so the encoding is lossless.
+"""
+import json
+import struct
+from typing import List, Dict
+import numpy
+
+
+"""
+Magic bytes at the start of every binary layer
+"""
+MAGIC = b'WCL1'
+
+"""
+Coordinates are stored as integers in units of 1/SCALE degrees
+"""
+SCALE = 100000
+
+
+def encode_features(features: List[dict]) -> bytes:
+    """
+    Encode a list of GeoJSON MultiPolygon features with a fill colour property
+    :param features: GeoJSON features from the GeoJSON converter
+    :return: Encoded binary layer
+    """
+    colors: Dict[str, int] = {}
+    feature_colors = []
+    polygon_counts = []
+    ring_counts = []
+    vertex_counts = []
+    rings = []
+
+    # flatten the features into counts and a list of rings
+    for feature in features:
+        fill = feature['properties']['fill']
+        feature_colors.append(colors.setdefault(fill, len(colors)))
+        polygons = feature['geometry']['coordinates']
+        polygon_counts.append(len(polygons))
+        for polygon in polygons:
+            ring_counts.append(len(polygon))
+            for ring in polygon:
+                vertex_counts.append(len(ring))
+                rings.append(ring)
+
+    # quantize the coordinates and replace each vertex after the first in a ring with a delta
+    vertex_counts = numpy.array(vertex_counts, dtype=numpy.uint32)
+    coords = numpy.empty((0, 2), dtype=numpy.int64)
+    if rings:
+        coords = numpy.rint(numpy.concatenate([numpy.asarray(ring, dtype=numpy.float64).reshape(-1, 2)
+                                               for ring in rings]) * SCALE).astype(numpy.int64)
+    deltas = coords.copy()
+    deltas[1:] -= coords[:-1]
+    ring_starts = _get_ring_starts(vertex_counts)[vertex_counts > 0]
+    deltas[ring_starts] = coords[ring_starts]
+
+    header = json.dumps({
+        'scale': SCALE,
+        'colors': list(colors.keys()),
+        'features': len(feature_colors),
+        'polygons': len(ring_counts),
+        'rings': len(vertex_counts),
+        'vertices': len(coords)
+    }).encode()
+    header += b' ' * (-len(header) % 4)
+
+    return b''.join([
+        MAGIC,
+        struct.pack('<I', len(header)),
+        header,
+        numpy.array(feature_colors, dtype='<u4').tobytes(),
+        numpy.array(polygon_counts, dtype='<u4').tobytes(),
+        numpy.array(ring_counts, dtype='<u4').tobytes(),
+        vertex_counts.astype('<u4').tobytes(),
+        deltas.astype('<i4').tobytes()
+    ])
+
+
+def decode_layer(data: bytes) -> dict:
+    """
+    Decode a binary layer back into a GeoJSON feature collection
+    :param data: Encoded binary layer
+    :return: GeoJSON feature collection
+    """
+    if data[:4] != MAGIC:
+        raise ValueError('Data is not a binary layer')
+
+    # read the header
+    header_length = struct.unpack('<I', data[4:8])[0]
+    header = json.loads(data[8:8 + header_length])
+    offset = 8 + header_length
+
+    # read the arrays
+    arrays = []
+    for dtype, count in [('<u4', header['features']), ('<u4', header['features']), ('<u4', header['polygons']),
+                         ('<u4', header['rings']), ('<i4', 2 * header['vertices'])]:
+        arrays.append(numpy.frombuffer(data, dtype=dtype, count=count, offset=offset))
+        offset += 4 * count
+    feature_colors, polygon_counts, ring_counts, vertex_counts, deltas = arrays
+
+    # undo the delta encoding by restarting the running sum at each ring
+    deltas = deltas.reshape(-1, 2).astype(numpy.int64)
+    totals = numpy.cumsum(deltas, axis=0)
+    ring_starts = _get_ring_starts(vertex_counts)
+    ring_offsets = numpy.zeros((len(ring_starts), 2), dtype=numpy.int64)
+    if len(totals) > 0:
+        after_first = ring_starts > 0
+        ring_offsets[after_first] = totals[ring_starts[after_first] - 1]
+    coords = (totals - numpy.repeat(ring_offsets, vertex_counts, axis=0)) / header['scale']
+
+    # rebuild the features
+    features = []
+    coords = coords.tolist()
+    polygon_index = 0
+    ring_index = 0
+    vertex_index = 0
+    for color_index, polygon_count in zip(feature_colors.tolist(), polygon_counts.tolist()):
+        polygons = []
+        for ring_count in ring_counts[polygon_index:polygon_index + polygon_count].tolist():
+            polygon = []
+            for vertex_count in vertex_counts[ring_index:ring_index + ring_count].tolist():
+                polygon.append(coords[vertex_index:vertex_index + vertex_count])
+                vertex_index += vertex_count
+            polygons.append(polygon)
+            ring_index += ring_count
+        polygon_index += polygon_count
+
+        features.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'MultiPolygon',
+                'coordinates': polygons
+            },
+            'properties': {
+                'fill': header['colors'][color_index]
+            }
+        })
+
+    return {
+        'type': 'FeatureCollection',
+        'features': features
+    }
+
+
+def _get_ring_starts(vertex_counts: numpy.ndarray) -> numpy.ndarray:
+    """
+    Get the index of the first vertex of each ring
+    :param vertex_counts: Number of vertices in each ring
+    :return: Vertex indices
+    """
+    vertex_counts = numpy.asarray(vertex_counts, dtype=numpy.int64)
+    return numpy.concatenate([[0], numpy.cumsum(vertex_counts)[:-1]]).astype(numpy.int64)[:len(vertex_counts)]
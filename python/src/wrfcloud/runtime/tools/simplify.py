@@ -0,0 +1,406 @@
+"""
+Module to simplify contour polygons with the Douglas-Peucker algorithm
+
+Polygons are simplified in grid index space before they are projected to longitude and latitude, so
+the tolerance is a number of grid cells and scales with the model's grid spacing.  The polygons of
+neighbouring contour bands are simplified together, so each contour line they share is simplified once
+and the bands still fit together without gaps or overlaps.
+"""
+from typing import Union, List, Dict, Set, Tuple
+import numpy
+
+
+# Resolution in grid cells that ring points are snapped to, because contour engines interpolate the
+# points of a contour line shared by two bands with a round-off difference for each band
+_SNAP_RESOLUTION = 1e-9
+
+
+def simplify_line(points: numpy.ndarray, tolerance: float) -> numpy.ndarray:
+    """
+    Simplify an open line with the Douglas-Peucker algorithm, always keeping the end points
+    :param points: Array of XY points with shape (N, 2)
+    :param tolerance: Largest allowed distance between the simplified and original lines
+    :return: Array of the points that were kept, in their original order
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return points
+
+    return points[_get_line_mask(points, tolerance)]
+
+
+def _get_line_mask(points: numpy.ndarray, tolerance: float) -> numpy.ndarray:
+    """
+    Find the points of an open line that the Douglas-Peucker algorithm keeps
+    :param points: Array of XY points with shape (N, 2)
+    :param tolerance: Largest allowed distance between the simplified and original lines
+    :return: Boolean array that is True for each point that is kept
+    """
+    keep = numpy.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    # split each segment at its farthest point until every point is within the tolerance
+    segments = [(0, len(points) - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+        split, distance = _get_farthest_point(points, start, end)
+        if distance > tolerance:
+            keep[split] = True
+            segments.append((start, split))
+            segments.append((split, end))
+
+    return keep
+
+
+def _get_farthest_point(points: numpy.ndarray, start: int, end: int) -> Tuple[int, float]:
+    """
+    Find the point of a line between two of its points that is farthest from the segment joining them
+    :param points: Array of XY points with shape (N, 2)
+    :param start: Index of the first point of the segment
+    :param end: Index of the last point of the segment, at least two more than the first
+    :return: Index of the farthest point and its distance from the segment
+    """
+    inner = points[start + 1:end]
+    direction = points[end] - points[start]
+    length = numpy.hypot(direction[0], direction[1])
+    offsets = inner - points[start]
+    if length == 0:
+        distances = numpy.hypot(offsets[:, 0], offsets[:, 1])
+    else:
+        distances = numpy.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / length
+    farthest = int(numpy.argmax(distances))
+    return start + 1 + farthest, float(distances[farthest])
+
+
+def simplify_ring(ring: numpy.ndarray, tolerance: float) -> Union[numpy.ndarray, None]:
+    """
+    Simplify a closed polygon ring with the Douglas-Peucker algorithm
+    :param ring: Array of XY points with shape (N, 2), where the last point repeats the first
+    :param tolerance: Largest allowed distance between the simplified and original rings
+    :return: Simplified closed ring, or None if the ring collapses within the tolerance
+    """
+    if tolerance <= 0 or len(ring) <= 4:
+        return ring
+
+    keep = _get_ring_mask(ring, tolerance)
+    if keep is None:
+        return None
+    simplified = ring[keep]
+
+    # a closed ring needs at least three distinct points
+    if len(simplified) < 4:
+        return None
+
+    return simplified
+
+
+def _get_ring_mask(ring: numpy.ndarray, tolerance: float) -> Union[numpy.ndarray, None]:
+    """
+    Find the points of a closed ring that the Douglas-Peucker algorithm keeps
+    :param ring: Array of XY points with shape (N, 2), where the last point repeats the first
+    :param tolerance: Largest allowed distance between the simplified and original rings
+    :return: Boolean array that is True for each point that is kept, or None if every point is the first
+    """
+    # split the ring at the point farthest from the first point, so both halves are open lines
+    offsets = ring - ring[0]
+    farthest = int(numpy.argmax(numpy.hypot(offsets[:, 0], offsets[:, 1])))
+    if farthest == 0:
+        return None
+    keep = numpy.zeros(len(ring), dtype=bool)
+    keep[:farthest + 1] = _get_line_mask(ring[:farthest + 1], tolerance)
+    keep[farthest:] |= _get_line_mask(ring[farthest:], tolerance)
+    return keep
+
+
+def simplify_polygons(polygons: List[List[numpy.ndarray]],
+                      tolerance: float) -> List[Union[List[numpy.ndarray], None]]:
+    """
+    Simplify polygons that share boundaries, such as the filled contour bands of a field, without
+    changing how they fit together.  The rings are split into arcs where three or more boundaries meet,
+    and each arc is simplified once for every ring that uses it.  Arcs keep more of their points where
+    they would cross another line or move past a hole.
+    :param polygons: List of polygons, each a list of closed rings with shape (N, 2), outer ring first
+    :param tolerance: Largest allowed distance between the simplified and original rings
+    :return: Simplified polygons in the same order, without the holes that collapse within the
+             tolerance, or None for a polygon whose outer ring collapses
+    """
+    rings = [ring[:-1] for polygon in polygons for ring in polygon]
+    if tolerance <= 0 or not rings:
+        return polygons
+
+    # number the distinct points, so the rings on both sides of a boundary use the same point numbers
+    points = numpy.concatenate(rings)
+    _, first_points, point_ids = numpy.unique(numpy.round(points / _SNAP_RESOLUTION), axis=0, return_index=True,
+                                              return_inverse=True)
+    vertices = points[first_points]
+    point_ids = point_ids.reshape(-1)
+
+    # drop the points that repeat the point before them in the same ring
+    lengths = numpy.array([len(ring) for ring in rings])
+    ring_starts = numpy.cumsum(lengths) - lengths
+    previous = numpy.roll(point_ids, 1)
+    previous[ring_starts[lengths > 0]] = point_ids[(ring_starts + lengths - 1)[lengths > 0]]
+    kept = point_ids != previous
+    lengths = numpy.bincount(numpy.repeat(numpy.arange(len(rings)), lengths)[kept], minlength=len(rings))
+    point_ids = point_ids[kept]
+    ring_starts = numpy.cumsum(lengths) - lengths
+    ring_ids = numpy.split(point_ids, ring_starts[1:])
+
+    # a point is a junction unless it has exactly two neighbours, which every ring through it shares
+    following = numpy.roll(point_ids, -1)
+    following[(ring_starts + lengths - 1)[lengths > 0]] = point_ids[ring_starts[lengths > 0]]
+    edges = numpy.column_stack([point_ids, following])[numpy.repeat(lengths >= 3, lengths)]
+    edges = numpy.unique(numpy.sort(edges, axis=1), axis=0)
+    junctions = numpy.bincount(edges.ravel(), minlength=len(vertices)) != 2
+
+    # split the rings into arcs, and simplify each arc once
+    arcs: List[numpy.ndarray] = []
+    arc_index: Dict[Tuple[int, int], int] = {}
+    ring_arcs = [_split_ring(ids, junctions, arcs, arc_index) if len(ids) >= 3 else None for ids in ring_ids]
+    masks = [_get_arc_mask(vertices, arc, tolerance) for arc in arcs]
+
+    # put back points of the segments that cross another line or move past a hole, until none do,
+    # checking only the rings and arcs that changed since the last pass
+    arc_rings: List[List[int]] = [[] for _ in arcs]
+    for ring, parts in enumerate(ring_arcs):
+        for index, _ in parts or []:
+            arc_rings[index].append(ring)
+    joined: List[Union[numpy.ndarray, None]] = [None] * len(ring_arcs)
+    drawn = numpy.zeros(len(arcs), dtype=int)
+    changed = numpy.ones(len(arcs), dtype=bool)
+    while changed.any():
+        # join the changed rings, and count the rings that did not collapse using each arc
+        changed_rings = {ring for index in numpy.flatnonzero(changed) for ring in arc_rings[index]}
+        for ring in changed_rings:
+            was_drawn = joined[ring] is not None
+            joined[ring] = _join_arcs(ring_arcs[ring], arcs, masks)
+            if was_drawn != (joined[ring] is not None):
+                arc_indexes = [index for index, _ in ring_arcs[ring]]
+                drawn[arc_indexes] += 1 if joined[ring] is not None else -1
+                changed[arc_indexes] = True
+
+        segments = list(zip(*_find_crossing_segments(vertices, arcs, masks, drawn > 0, changed)))
+        segments += _find_misplaced_segments(vertices, polygons, joined, ring_arcs, arcs, masks, changed_rings)
+        changed[:] = False
+        for index, first, last in segments:
+            masks[index][_get_farthest_point(vertices[arcs[index]], first, last)[0]] = True
+            changed[index] = True
+
+    # close the rings again, and drop the rings that collapsed
+    simplified = []
+    ring_index = 0
+    for polygon in polygons:
+        polygon_rings = [None if ids is None else vertices[numpy.append(ids, ids[0])]
+                         for ids in joined[ring_index:ring_index + len(polygon)]]
+        ring_index += len(polygon)
+        simplified.append(None if polygon_rings[0] is None else
+                          [polygon_rings[0]] + [ring for ring in polygon_rings[1:] if ring is not None])
+    return simplified
+
+
+def _split_ring(ids: numpy.ndarray, junctions: numpy.ndarray, arcs: List[numpy.ndarray],
+                arc_index: Dict[Tuple[int, int], int]) -> List[Tuple[int, bool]]:
+    """
+    Split a ring into arcs between its junctions, adding the arcs that are new to the list of arcs
+    :param ids: Point numbers of the ring, without repeating the first point
+    :param junctions: Boolean array that is True for each point number that is a junction
+    :param arcs: List of the point numbers of each arc
+    :param arc_index: Index in the list of arcs by the first two point numbers of either end of each arc
+    :return: Index of each arc of the ring, and whether the ring goes along the arc in its direction
+    """
+    positions = numpy.flatnonzero(junctions[ids])
+    if len(positions) == 0:
+        # a ring without junctions is a single arc, starting at the same point for every ring using it
+        start = int(numpy.argmin(ids))
+        chains = [numpy.concatenate([ids[start:], ids[:start + 1]])]
+    else:
+        closed = numpy.concatenate([ids[positions[0]:], ids[:positions[0] + 1]])
+        positions = numpy.append(positions - positions[0], len(ids))
+        chains = [closed[start:end + 1] for start, end in zip(positions[:-1], positions[1:])]
+
+    parts = []
+    for chain in chains:
+        forward = (int(chain[0]), int(chain[1]))
+        key = min(forward, (int(chain[-1]), int(chain[-2])))
+        if key not in arc_index:
+            arc_index[key] = len(arcs)
+            arcs.append(chain if key == forward else chain[::-1])
+        parts.append((arc_index[key], key == forward))
+    return parts
+
+
+def _get_arc_mask(vertices: numpy.ndarray, arc: numpy.ndarray, tolerance: float) -> numpy.ndarray:
+    """
+    Find the points of an arc that the Douglas-Peucker algorithm keeps
+    :param vertices: Array of XY points by point number
+    :param arc: Point numbers of the arc, which may end where it starts
+    :param tolerance: Largest allowed distance between the simplified and original arcs
+    :return: Boolean array that is True for each point that is kept
+    """
+    keep = None
+    if len(arc) >= 3:
+        keep = _get_ring_mask(vertices[arc], tolerance) if arc[0] == arc[-1] else \
+            _get_line_mask(vertices[arc], tolerance)
+    return numpy.ones(len(arc), dtype=bool) if keep is None else keep
+
+
+def _join_arcs(parts: List[Tuple[int, bool]], arcs: List[numpy.ndarray],
+               masks: List[numpy.ndarray]) -> Union[numpy.ndarray, None]:
+    """
+    Join the simplified arcs of a ring
+    :param parts: Index of each arc of the ring, and whether the ring goes along the arc in its direction
+    :param arcs: List of the point numbers of each arc
+    :param masks: Boolean array for each arc that is True for each point that is kept
+    :return: Point numbers of the ring without repeating the first point, or None if the ring collapsed
+    """
+    # each arc ends where the next one starts, so leaving out the last point of each arc joins them
+    ids = numpy.concatenate([(arcs[index][masks[index]] if forward else arcs[index][masks[index]][::-1])[:-1]
+                             for index, forward in parts])
+    return ids if len(ids) >= 3 and len(numpy.unique(ids)) >= 3 else None
+
+
+def _find_crossing_segments(vertices: numpy.ndarray, arcs: List[numpy.ndarray], masks: List[numpy.ndarray],
+                            drawn: numpy.ndarray,
+                            changed: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """
+    Find the new segments of the simplified arcs that touch or cross a segment of another arc
+    :param vertices: Array of XY points by point number
+    :param arcs: List of the point numbers of each arc
+    :param masks: Boolean array for each arc that is True for each point that is kept
+    :param drawn: Boolean array that is True for each arc of a ring that did not collapse
+    :param changed: Boolean array that is True for each arc whose segments were not checked yet
+    :return: Arrays of the arc index, and the positions in the arc of the first and last point, of each
+             crossing segment
+    """
+    indexes = numpy.flatnonzero(drawn)
+    positions = [numpy.flatnonzero(masks[index]) for index in indexes]
+    owners = numpy.repeat(indexes, [len(kept) - 1 for kept in positions])
+    if len(owners) == 0:
+        return owners, owners, owners
+    first_positions = numpy.concatenate([kept[:-1] for kept in positions])
+    last_positions = numpy.concatenate([kept[1:] for kept in positions])
+    starts = numpy.concatenate([arcs[index][kept[:-1]] for index, kept in zip(indexes, positions)])
+    ends = numpy.concatenate([arcs[index][kept[1:]] for index, kept in zip(indexes, positions)])
+    new = last_positions - first_positions > 1
+    fresh = changed[owners]
+    failed = numpy.zeros(len(starts), dtype=bool)
+    if not new.any() or not fresh.any():
+        return owners[failed], first_positions[failed], last_positions[failed]
+
+    # register each segment in every grid cell under its bounding box, with cells about as large as the
+    # new segments
+    a, b = vertices[starts], vertices[ends]
+    lengths = numpy.hypot(*(b[new] - a[new]).T)
+    cell_size = max(float(numpy.median(lengths)), _SNAP_RESOLUTION)
+    low = numpy.floor(numpy.minimum(a, b) / cell_size).astype(numpy.int64)
+    size = numpy.floor(numpy.maximum(a, b) / cell_size).astype(numpy.int64) - low + 1
+    counts = size[:, 0] * size[:, 1]
+    segments = numpy.repeat(numpy.arange(len(a)), counts)
+    offsets = numpy.arange(len(segments)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    cells_x = low[segments, 0] + offsets % size[segments, 0]
+    cells_y = low[segments, 1] + offsets // size[segments, 0]
+    cells = (cells_x - cells_x.min()) * (cells_y.max() - cells_y.min() + 1) + cells_y - cells_y.min()
+    order = numpy.argsort(cells, kind='stable')
+    cells, segments = cells[order], segments[order]
+
+    # pair the segments in each cell
+    first, second = [], []
+    for distance in range(1, len(cells)):
+        same = cells[:-distance] == cells[distance:]
+        if not same.any():
+            break
+        first.append(segments[:-distance][same])
+        second.append(segments[distance:][same])
+    if not first:
+        return owners[failed], first_positions[failed], last_positions[failed]
+    first, second = numpy.concatenate(first), numpy.concatenate(second)
+
+    # only a new segment can cross another segment, pairs of unchanged segments were checked before, and
+    # segments with a common point only meet there
+    check = (new[first] | new[second]) & (fresh[first] | fresh[second]) & \
+        (starts[first] != starts[second]) & (starts[first] != ends[second]) & \
+        (ends[first] != starts[second]) & (ends[first] != ends[second])
+    first, second = first[check], second[check]
+    crossing = _segments_intersect(a[first], b[first], a[second], b[second])
+    failed[first[crossing & new[first]]] = True
+    failed[second[crossing & new[second]]] = True
+    return owners[failed], first_positions[failed], last_positions[failed]
+
+
+def _segments_intersect(a1: numpy.ndarray, a2: numpy.ndarray, b1: numpy.ndarray, b2: numpy.ndarray) -> numpy.ndarray:
+    """
+    Check if pairs of line segments touch or cross
+    :param a1: Array of XY start points of the first segments
+    :param a2: Array of XY end points of the first segments
+    :param b1: Array of XY start points of the second segments
+    :param b2: Array of XY end points of the second segments
+    :return: Boolean array that is True for each pair that touches or crosses
+    """
+    def _side(o: numpy.ndarray, p: numpy.ndarray, q: numpy.ndarray) -> numpy.ndarray:
+        return (p[:, 0] - o[:, 0]) * (q[:, 1] - o[:, 1]) - (p[:, 1] - o[:, 1]) * (q[:, 0] - o[:, 0])
+
+    overlap = numpy.all(numpy.minimum(a1, a2) <= numpy.maximum(b1, b2), axis=1) & \
+        numpy.all(numpy.minimum(b1, b2) <= numpy.maximum(a1, a2), axis=1)
+    return overlap & (_side(a1, a2, b1) * _side(a1, a2, b2) <= 0) & (_side(b1, b2, a1) * _side(b1, b2, a2) <= 0)
+
+
+def _find_misplaced_segments(vertices: numpy.ndarray, polygons: List[List[numpy.ndarray]],
+                             joined: List[Union[numpy.ndarray, None]],
+                             ring_arcs: List[Union[List[Tuple[int, bool]], None]], arcs: List[numpy.ndarray],
+                             masks: List[numpy.ndarray], rings: Set[int]) -> List[Tuple[int, int, int]]:
+    """
+    Find the new segments of the simplified outer rings that moved past one of their holes, or of the
+    outer rings that collapsed around a hole that did not
+    :param vertices: Array of XY points by point number
+    :param polygons: List of polygons, each a list of closed rings, outer ring first
+    :param joined: Point numbers of each simplified ring, or None if the ring collapsed
+    :param ring_arcs: Index of each arc of each ring, and whether the ring goes along the arc in its direction
+    :param arcs: List of the point numbers of each arc
+    :param masks: Boolean array for each arc that is True for each point that is kept
+    :param rings: Indexes of the rings that changed since they were checked
+    :return: List of the arc index, and the positions in the arc of the first and last point, of each segment
+    """
+    misplaced = []
+    ring_index = 0
+    for polygon in polygons:
+        outer = ring_index
+        ring_index += len(polygon)
+        if ring_arcs[outer] is None or rings.isdisjoint(range(outer, ring_index)):
+            continue
+        for hole in range(outer + 1, ring_index):
+            if joined[hole] is None:
+                continue
+
+            # a point of the hole that is not on the outer ring tells if the hole is still inside it
+            point = None
+            if joined[outer] is not None:
+                points = joined[hole][~numpy.isin(joined[hole], joined[outer])]
+                if len(points) == 0 or _point_in_ring(vertices[points[0]], vertices[joined[outer]]):
+                    continue
+                point = vertices[points[0]]
+
+            # the segments that moved past the hole are between the point and the original arc
+            segments = []
+            for index, _ in ring_arcs[outer]:
+                positions = numpy.flatnonzero(masks[index])
+                segments += [(index, first, last) for first, last in zip(positions[:-1], positions[1:])
+                             if last - first > 1]
+            moved = [(index, first, last) for index, first, last in segments
+                     if point is not None and _point_in_ring(point, vertices[arcs[index][first:last + 1]])]
+            misplaced += moved or segments
+    return misplaced
+
+
+def _point_in_ring(point: numpy.ndarray, ring: numpy.ndarray) -> bool:
+    """
+    Check if a point is inside a ring with the even-odd rule
+    :param point: XY point
+    :param ring: Array of XY points of the ring, without repeating the first point
+    :return: True if the point is inside the ring
+    """
+    start, end = ring, numpy.roll(ring, -1, axis=0)
+    spans = (start[:, 1] > point[1]) != (end[:, 1] > point[1])
+    start, end = start[spans], end[spans]
+    x = start[:, 0] + (point[1] - start[:, 1]) * (end[:, 0] - start[:, 0]) / (end[:, 1] - start[:, 1])
+    return bool(numpy.count_nonzero(x > point[0]) % 2)
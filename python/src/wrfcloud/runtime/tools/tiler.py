@@ -0,0 +1,252 @@
+"""
+Module to slice contour and vector layers into z/x/y tiles on the Web Mercator tile grid
+
+Each tile is stored in the same compact JSON format as the whole layer: a GeoJSON feature collection
+with the polygons clipped to the tile, or a vector JSON document with the points inside the tile.
+Tiles are written for a few zoom levels chosen from the grid spacing, and clients use the tiles
+from the highest zoom level for any map zoom level above it.
+"""
+import math
+import os
+from gzip import compress
+import json
+from typing import List, Dict, Tuple, Union
+import numpy
+from numpy.ma.core import MaskedArray
+from wrfcloud.jobs.job import WrfLayer
+from wrfcloud.jobs.tiles import MAX_LATITUDE, get_meters_per_pixel, get_tile_bounds, get_tile_range
+
+
+"""
+Width of a tile in pixels
+"""
+TILE_SIZE = 256
+
+"""
+Tiles at the highest zoom level span at least this many grid cells
+"""
+MIN_TILE_GRID_CELLS = 64
+
+"""
+Number of zoom levels with tiles
+"""
+TILE_ZOOM_LEVELS = 4
+
+
+def get_tile_zooms(grid_spacing: float, latitude: float) -> List[int]:
+    """
+    Get the zoom levels to tile a layer at, where the highest zoom level's tiles span at least
+    MIN_TILE_GRID_CELLS grid cells
+    :param grid_spacing: Grid spacing in meters
+    :param latitude: Latitude at the center of the domain
+    :return: List of zoom levels, lowest first
+    """
+    if grid_spacing <= 0:
+        return []
+    max_pixel_ratio = get_meters_per_pixel(0, latitude) * TILE_SIZE / (MIN_TILE_GRID_CELLS * grid_spacing)
+    max_zoom = max(0, int(math.floor(math.log2(max_pixel_ratio)))) if max_pixel_ratio > 1 else 0
+    return list(range(max(0, max_zoom - TILE_ZOOM_LEVELS + 1), max_zoom + 1))
+
+
+def get_grid_spacing(grid_lat: MaskedArray, grid_lon: MaskedArray) -> float:
+    """
+    Get the approximate grid spacing from the latitude and longitude grids
+    :param grid_lat: Latitude grid
+    :param grid_lon: Longitude grid
+    :return: Mean distance between neighbouring grid points in the X dimension, in meters
+    """
+    grid_lat = numpy.radians(numpy.ma.getdata(grid_lat))
+    grid_lon = numpy.radians(numpy.ma.getdata(grid_lon))
+    if grid_lat.ndim != 2 or grid_lat.shape[1] < 2:
+        return 0
+
+    # equirectangular distance between neighbouring points, which is accurate at the grid scale
+    d_lat = numpy.diff(grid_lat, axis=1)
+    d_lon = numpy.diff(grid_lon, axis=1) * numpy.cos(0.5 * (grid_lat[:, 1:] + grid_lat[:, :-1]))
+    return float(numpy.mean(numpy.hypot(d_lat, d_lon)) * 6371000)
+
+
+def get_bounds(grid_lat: MaskedArray, grid_lon: MaskedArray) -> List[float]:
+    """
+    Get the bounding box of the latitude and longitude grids
+    :param grid_lat: Latitude grid
+    :param grid_lon: Longitude grid
+    :return: West, south, east, and north bounds in degrees
+    """
+    return [float(numpy.min(grid_lon)), float(numpy.min(grid_lat)),
+            float(numpy.max(grid_lon)), float(numpy.max(grid_lat))]
+
+
+def get_tile_layout(grid_lat: MaskedArray, grid_lon: MaskedArray) -> (List[int], List[float]):
+    """
+    Get the zoom levels and bounding box to tile a layer on a latitude and longitude grid
+    :param grid_lat: Latitude grid
+    :param grid_lon: Longitude grid
+    :return: Zoom levels, and west, south, east, and north bounds in degrees
+    """
+    bounds = get_bounds(grid_lat, grid_lon)
+    return get_tile_zooms(get_grid_spacing(grid_lat, grid_lon), 0.5 * (bounds[1] + bounds[3])), bounds
+
+
+def _lon_to_tile_x(lon: Union[float, numpy.ndarray], zoom: int) -> Union[float, numpy.ndarray]:
+    """
+    Convert longitudes to fractional tile X coordinates, for many points at once
+    :param lon: Longitude in degrees
+    :param zoom: Zoom level
+    :return: Tile X coordinate
+    """
+    return (numpy.asarray(lon) + 180) / 360 * 2 ** zoom
+
+
+def _lat_to_tile_y(lat: Union[float, numpy.ndarray], zoom: int) -> Union[float, numpy.ndarray]:
+    """
+    Convert latitudes to fractional tile Y coordinates, which increase southward, for many points at once
+    :param lat: Latitude in degrees
+    :param zoom: Zoom level
+    :return: Tile Y coordinate
+    """
+    lat = numpy.radians(numpy.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    return (1 - numpy.arcsinh(numpy.tan(lat)) / math.pi) / 2 * 2 ** zoom
+
+
+def _clip_to_edge(points: numpy.ndarray, axis: int, value: float, keep_greater: bool) -> numpy.ndarray:
+    """
+    Clip an open ring to one side of a line of constant longitude or latitude (Sutherland-Hodgman)
+    :param points: Array of lon/lat points with shape (N, 2), without the closing point
+    :param axis: 0 to clip at a longitude or 1 to clip at a latitude
+    :param value: Longitude or latitude of the line
+    :param keep_greater: True to keep the points east/north of the line, False to keep west/south
+    :return: Clipped open ring
+    """
+    inside = points[:, axis] >= value if keep_greater else points[:, axis] <= value
+    if inside.all() or not inside.any():
+        return points if inside.all() else points[:0]
+
+    # each point adds the crossing from the previous point, if any, then itself if it is inside
+    previous = numpy.roll(points, 1, axis=0)
+    previous_inside = numpy.roll(inside, 1)
+    crossing = inside != previous_inside
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        fraction = (value - previous[:, axis]) / (points[:, axis] - previous[:, axis])
+        intersections = previous + fraction[:, numpy.newaxis] * (points - previous)
+    intersections[:, axis] = value
+
+    counts = crossing.astype(int) + inside.astype(int)
+    starts = numpy.cumsum(counts) - counts
+    clipped = numpy.empty((int(counts.sum()), 2))
+    clipped[starts[crossing]] = intersections[crossing]
+    clipped[(starts + crossing)[inside]] = points[inside]
+    return clipped
+
+
+def clip_ring(ring: numpy.ndarray, bounds: Tuple[float, float, float, float]) -> Union[numpy.ndarray, None]:
+    """
+    Clip a closed polygon ring to a bounding box
+    :param ring: Array of lon/lat points with shape (N, 2), where the last point repeats the first
+    :param bounds: West, south, east, and north bounds in degrees
+    :return: Clipped closed ring, or None if nothing is left inside the bounding box
+    """
+    points = ring[:-1] if len(ring) > 1 and numpy.array_equal(ring[0], ring[-1]) else ring
+    west, south, east, north = bounds
+    for axis, value, keep_greater in [(0, west, True), (0, east, False), (1, south, True), (1, north, False)]:
+        points = _clip_to_edge(points, axis, value, keep_greater)
+        if len(points) < 3:
+            return None
+
+    # drop rings that only run along the edge of the bounding box
+    area = 0.5 * abs(numpy.dot(points[:, 0], numpy.roll(points[:, 1], 1)) -
+                     numpy.dot(points[:, 1], numpy.roll(points[:, 0], 1)))
+    if area == 0:
+        return None
+
+    return numpy.concatenate([points, points[:1]])
+
+
+def tile_features(features: List[dict], zoom: int, bounds: List[float]) -> Dict[Tuple[int, int], dict]:
+    """
+    Clip GeoJSON MultiPolygon features to each tile at a zoom level
+    :param features: GeoJSON features from the GeoJSON converter
+    :param zoom: Zoom level
+    :param bounds: West, south, east, and north bounds of the layer in degrees
+    :return: GeoJSON feature collection for each tile X and Y in the layer bounds
+    """
+    x_min, y_min, x_max, y_max = get_tile_range(bounds, zoom)
+    tiles = {(x, y): [] for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)}
+
+    for feature in features:
+        # collect the clipped polygons of this feature for each tile
+        tile_polygons: Dict[Tuple[int, int], list] = {}
+        for polygon in feature['geometry']['coordinates']:
+            rings = [numpy.asarray(ring, dtype=numpy.float64).reshape(-1, 2) for ring in polygon]
+            if len(rings[0]) == 0:
+                continue
+
+            # only clip to the tiles that the outer ring's bounding box overlaps
+            outer = rings[0]
+            tile_x = _lon_to_tile_x(outer[:, 0], zoom)
+            tile_y = _lat_to_tile_y(outer[:, 1], zoom)
+            for x in range(max(x_min, int(tile_x.min())), min(x_max, int(tile_x.max())) + 1):
+                for y in range(max(y_min, int(tile_y.min())), min(y_max, int(tile_y.max())) + 1):
+                    clip_bounds = get_tile_bounds(zoom, x, y)
+                    clipped_outer = clip_ring(outer, clip_bounds)
+                    if clipped_outer is None:
+                        continue
+                    clipped_holes = [clip_ring(hole, clip_bounds) for hole in rings[1:]]
+                    clipped = [clipped_outer] + [hole for hole in clipped_holes if hole is not None]
+                    tile_polygons.setdefault((x, y), []).append(
+                        [numpy.round(ring, 5).tolist() for ring in clipped])
+
+        for tile, polygons in tile_polygons.items():
+            tiles[tile].append({
+                'type': 'Feature',
+                'geometry': {
+                    'type': 'MultiPolygon',
+                    'coordinates': polygons
+                },
+                'properties': feature['properties']
+            })
+
+    return {tile: {'type': 'FeatureCollection', 'features': tile_features_list}
+            for tile, tile_features_list in tiles.items()}
+
+
+def tile_vectors(doc: dict, zoom: int, bounds: List[float]) -> Dict[Tuple[int, int], dict]:
+    """
+    Split the points of a vector JSON document into each tile at a zoom level
+    :param doc: Vector JSON document from the vector JSON converter, in the columnar or legacy format
+    :param zoom: Zoom level
+    :param bounds: West, south, east, and north bounds of the layer in degrees
+    :return: Vector JSON document for each tile X and Y in the layer bounds
+    """
+    x_min, y_min, x_max, y_max = get_tile_range(bounds, zoom)
+
+    # find the tile of every point
+    legacy = 'vectors' in doc
+    lon = [float(item['lon']) for item in doc['vectors']] if legacy else doc['lon']
+    lat = [float(item['lat']) for item in doc['vectors']] if legacy else doc['lat']
+    tile_x = numpy.clip(numpy.floor(_lon_to_tile_x(numpy.asarray(lon, dtype=numpy.float64), zoom)), x_min, x_max)
+    tile_y = numpy.clip(numpy.floor(_lat_to_tile_y(numpy.asarray(lat, dtype=numpy.float64), zoom)), y_min, y_max)
+
+    # copy the points in each tile, keeping the other document fields
+    columns = ['vectors'] if legacy else [name for name, values in doc.items() if isinstance(values, list)]
+    tiles = {}
+    for x in range(x_min, x_max + 1):
+        for y in range(y_min, y_max + 1):
+            indices = numpy.flatnonzero((tile_x == x) & (tile_y == y)).tolist()
+            tiles[(x, y)] = {**doc, **{name: [doc[name][i] for i in indices] for name in columns}}
+
+    return tiles
+
+
+def write_tiles(layer_file: str, zoom: int, tiles: Dict[Tuple[int, int], dict]) -> None:
+    """
+    Write the tiles for a zoom level next to the layer file
+    :param layer_file: Full path to the layer file
+    :param zoom: Zoom level
+    :param tiles: Document for each tile X and Y
+    """
+    for (x, y), doc in tiles.items():
+        tile_file = WrfLayer.get_tile_file_name(layer_file, zoom, x, y)
+        os.makedirs(os.path.dirname(tile_file), exist_ok=True)
+        with open(tile_file, 'wb') as file:
+            file.write(compress(json.dumps(doc).encode()))
@@ -0,0 +1,108 @@
+"""
+Module with a thread pool that uploads files to S3 concurrently
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Union, List, Tuple
+# pylint: disable=E0401
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from wrfcloud.log import Logger
+from wrfcloud.system import get_aws_session
+
+
+class UploadPool:
+    """
+    A bounded number of threads that upload files to S3 with a single shared client, so the HTTP
+    connections are reused across files.  Large files are uploaded in parts, and failed uploads are
+    retried with exponential backoff.
+    """
+
+    """
+    Default number of files uploaded at the same time
+    """
+    DEFAULT_MAX_WORKERS: int = 16
+
+    """
+    Files larger than this are uploaded in parts
+    """
+    MULTIPART_THRESHOLD: int = 16 * 1024 * 1024
+
+    """
+    Number of parts of a single file uploaded at the same time
+    """
+    MULTIPART_CONCURRENCY: int = 4
+
+    def __init__(self, max_workers: Union[int, None] = None, max_attempts: int = 4, backoff: float = 0.5):
+        """
+        Create the upload threads and the S3 client
+        :param max_workers: Number of files uploaded at the same time, defaults to DEFAULT_MAX_WORKERS
+        :param max_attempts: Number of times to try each file before giving up
+        :param backoff: Seconds to wait before the first retry, doubled for each retry after that
+        """
+        self.log = Logger(self.__class__.__name__)
+        self.max_workers = max_workers or self.DEFAULT_MAX_WORKERS
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+
+        # share one client so every thread draws from the same connection pool
+        config = Config(max_pool_connections=self.max_workers * self.MULTIPART_CONCURRENCY,
+                        retries={'mode': 'standard'})
+        self.s3 = get_aws_session().client('s3', config=config)
+        self.transfer_config = TransferConfig(multipart_threshold=self.MULTIPART_THRESHOLD,
+                                              multipart_chunksize=self.MULTIPART_THRESHOLD,
+                                              max_concurrency=self.MULTIPART_CONCURRENCY)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def __enter__(self) -> 'UploadPool':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.shutdown()
+
+    def submit(self, filename: str, bucket: str, key: str) -> Future:
+        """
+        Queue a file to upload
+        :param filename: Full path to the local file
+        :param bucket: S3 bucket name
+        :param key: S3 object key
+        :return: Future for the upload, which raises the last error if every attempt failed
+        """
+        return self.executor.submit(self._upload, filename, bucket, key)
+
+    def upload(self, files: List[Tuple[str, str, str]]) -> List[Tuple[str, Exception]]:
+        """
+        Upload files and wait for them to finish
+        :param files: List of (filename, bucket, key) to upload
+        :return: List of (filename, error) for each file that failed to upload
+        """
+        futures = [(filename, self.submit(filename, bucket, key)) for filename, bucket, key in files]
+        wait([future for _, future in futures])
+        return [(filename, future.exception()) for filename, future in futures if future.exception() is not None]
+
+    def shutdown(self) -> None:
+        """
+        Wait for the queued uploads to finish and stop the threads
+        """
+        self.executor.shutdown(wait=True)
+
+    def _upload(self, filename: str, bucket: str, key: str) -> None:
+        """
+        Upload a single file, retrying with exponential backoff and jitter
+        :param filename: Full path to the local file
+        :param bucket: S3 bucket name
+        :param key: S3 object key
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                self.log.debug(f'Uploading {filename} to s3://{bucket}/{key}')
+                self.s3.upload_file(Filename=filename, Bucket=bucket, Key=key, Config=self.transfer_config)
+                return
+            except Exception as e:
+                if attempt == self.max_attempts - 1:
+                    raise
+                delay = self.backoff * 2 ** attempt * (0.5 + random.random())
+                self.log.warn(f'Failed to upload {filename}, retrying in {delay:.1f} seconds: {e}')
+                time.sleep(delay)
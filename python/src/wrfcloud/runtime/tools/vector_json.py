@@ -3,45 +3,66 @@ Module to convert WRF output to JSON containing vector info, e.g. wind
 """
 import os
 import pkgutil
-from concurrent.futures import ProcessPoolExecutor, wait
-from typing import Union, List
+from typing import Union, List, Dict
 from gzip import compress
 import json
 from argparse import ArgumentParser
 import yaml
-# pylint: disable=E0401,E0611
-from netCDF4 import Dataset
-from numpy.ma.core import MaskedArray
-from datetime import datetime
+import numpy
 from wrfcloud.jobs.job import WrfLayer
+from wrfcloud.jobs.tiles import get_meters_per_pixel
 from wrfcloud.log import Logger
+from wrfcloud.runtime.tools.converter_pool import ConverterPool, remove_missing_layers
+from wrfcloud.runtime.tools.field_cache import FieldCache, SharedArray
+from wrfcloud.runtime.tools.tiler import get_tile_layout, tile_vectors, write_tiles
 from wrfcloud.system import init_environment
 
 
 class VectorJson:
     """
-    Class to convert WRF output to JSON vector format
+    Class to convert WRF output to JSON vector format.  The default columnar format has parallel arrays
+    of numbers, e.g. {"lon": [...], "lat": [...], "wind_speed": [...], "wind_direction": [...],
+    "row_length": 50, "dx": 20000, "dy": 20000}, where masked points are null.  The legacy format has
+    a list of points with string values, e.g. {"vectors": [{"lon": "-105.25", "lat": "40.02",
+    "wind_speed": "3.2", "wind_direction": "271.0"}, ...], "row_length": "50", "dx": 20000, "dy": 20000}.
     """
 
+    # Meters between the sampled points of each vector density, where zero samples every grid point
+    DENSITY_SPACING: Dict[str, int] = {
+        WrfLayer.DENSITY_80KM: 80000,
+        WrfLayer.DENSITY_40KM: 40000,
+        WrfLayer.DENSITY_20KM: 20000,
+        WrfLayer.DENSITY_NATIVE: 0
+    }
+
     def __init__(self, wrf_file: str, variable: str, input_variables: dict,
-                 z_level: Union[int, None] = None):
+                 z_level: Union[int, None] = None, tiles: bool = False, legacy_schema: bool = False,
+                 densities: Union[List[str], None] = None):
         """
         Construct a WRF to vector JSON converter
         :param wrf_file: Full path to the WRF output file
         :param variable: Name of the variable to create
         :param input_variables: Dictionary of input var names in the NetCDF file
         :param z_level: Height level in the to convert
+        :param tiles: Also slice the output into z/x/y tiles
+        :param legacy_schema: Write the legacy list of points instead of the columnar format
+        :param densities: Vector densities of the output files, see WrfLayer.DENSITIES, defaults to
+                          WrfLayer.DENSITY_DEFAULT only
         """
         self.log = Logger(self.__class__.__name__)
         self.wrf_file = wrf_file
         self.variable = variable
         self.input_variables = input_variables
         self.z_level = z_level
-        self.grid = None
+        self.grids = None
+        self.dx = None
+        self.dy = None
         self.grid_lat = None
         self.grid_lon = None
         self.time_step = 0
-        self.meters_between_points = 20000  # 20 km
+        self.tiles = tiles
+        self.legacy_schema = legacy_schema
+        self.densities = densities or [WrfLayer.DENSITY_DEFAULT]
 
     def convert(self, out_file: Union[str, None]) -> Union[None, dict]:
         """
@@ -53,74 +74,138 @@ class VectorJson:
         self.log.info(f'Converting {self.variable} to {out_file}')
 
         try:
-            # get the data, lat, and lon grids of each field
-            grids = {}
-            for var_id, var_name in self.input_variables.items():
-                grid, dx, dy = self._read_var_from_netcdf(var_name)
-                grids[var_id] = grid
-
-            # loop through grid points and create vector JSON file
-            items = []
-            skip_x, skip_y = self._get_skip_values(dx, dy)
-            first_field = list(grids.keys())[0]
-            for y, row in enumerate(grids[first_field]):
-                if y % skip_y != 0: continue
-                for x in range(0, len(row)):
-                    if x % skip_x != 0: continue
-                    lon, lat = self._grid_to_lonlat(x, y)
-                    item = {'lon': f'{lon:.2f}', 'lat': f'{lat:.2f}'}
-                    for field, grid in grids.items():
-                        item[f'{self.variable}_{field}'] = f'{grid[y][x]:.1f}'
-                    items.append(item)
-            # save number of points in a row to allow subsetting in display
-            row_length = str(len(row) // skip_x)
-            doc = {'vectors': items, 'row_length': row_length,
-                   'dx': self.meters_between_points, 'dy': self.meters_between_points}
+            # get the data, lat, and lon grids of each field, unless they were already provided
+            if self.grids is None and not self._read_from_netcdf():
+                self.log.error(f'Could not read the input variables for {self.variable}')
+                return None
+
+            # sample the grids once for each density
+            docs = {density: self._get_doc(density) for density in self.densities}
 
             # return the document if no output file was provided
             if out_file is None:
-                return doc
+                return docs.get(WrfLayer.DENSITY_DEFAULT, docs[self.densities[0]])
+
+            # write the data for each density to a file
+            for density, doc in docs.items():
+                with open(WrfLayer.get_density_file_name(out_file, density), 'wb') as file_handle:
+                    file_handle.write(compress(json.dumps(doc).encode()))
 
-            # write the data to a file or return as a string if no data were
-            with open(out_file, 'wb') as file_handle:
-                file_handle.write(compress(json.dumps(doc).encode()))
+            # slice the points into z/x/y tiles
+            if self.tiles:
+                self._write_tiles(out_file, docs)
         except Exception as e:
             self.log.error(f'Exception occurred trying to create {out_file}: {e}')
 
         return None
 
-    def _read_var_from_netcdf(self, variable: str) -> (MaskedArray, int, int):
+    def _get_doc(self, density: str) -> dict:
+        """
+        Sample the grids at a vector density
+        :param density: Vector density, see WrfLayer.DENSITIES
+        :return: Vector JSON document
+        """
+        # sample every skip_x column of every skip_y row of the grids at once, treating NaN as missing
+        skip_x, skip_y = self._get_skip_values(self.dx, self.dy, self.DENSITY_SPACING[density])
+        lon = numpy.round(numpy.ma.getdata(self.grid_lon)[::skip_y, ::skip_x], 5)
+        lat = numpy.round(numpy.ma.getdata(self.grid_lat)[::skip_y, ::skip_x], 5)
+        fields = {f'{self.variable}_{field}': numpy.ma.masked_invalid(grid[::skip_y, ::skip_x])
+                  for field, grid in self.grids.items()}
+
+        # save number of points in a row to allow subsetting in display
+        row_length = lon.shape[1]
+        if self.legacy_schema:
+            return self._get_legacy_doc(lon, lat, fields, row_length, skip_x * self.dx, skip_y * self.dy)
+
+        return {
+            'lon': numpy.round(lon.astype(numpy.float64), 2).ravel().tolist(),
+            'lat': numpy.round(lat.astype(numpy.float64), 2).ravel().tolist(),
+            **{name: numpy.ma.round(numpy.ma.asarray(grid, dtype=numpy.float64), 1).ravel().tolist()
+               for name, grid in fields.items()},
+            'row_length': row_length,
+            'dx': skip_x * self.dx,
+            'dy': skip_y * self.dy
+        }
+
+    def _write_tiles(self, out_file: str, docs: Dict[str, dict]) -> None:
         """
-        Read the variable data, lat, and lon grids, dx/dy values from a NetCDF file
-        Save grid_lat and grid_lon in class variables
-        :return: data, delta x, delta y
+        Write the z/x/y tiles for the layer, using the densest vector density that keeps the vectors
+        apart at each zoom level
+        :param out_file: Full path to the default density output file
+        :param docs: Vector JSON document for each density
         """
-        # open the NetCDF file and get the requested horizontal slice
-        # pylint thinks that the Dataset class does not exist in netCDF4 pylint: disable=E1101
-        wrf = Dataset(self.wrf_file)
-        data = wrf[variable]
-        grid = data[:] if data.dimensions[0] != 'Time' else data[0]
-        if self.z_level:
-            z_index = None
-            for idx, z_val in enumerate(wrf[data.dimensions[0]]):
-                if int(z_val) == self.z_level:
-                    z_index = idx
-            if z_index is None:
-                self.log.error(f'Could not find z level: {self.z_level}')
-            grid = grid[z_index]
-
-        # get the latitude and longitude grids
-        self.grid_lat = wrf['XLAT'][0]
-        self.grid_lon = wrf['XLONG'][0]
-
-        # get dx/dy from global attributes
-        dx = int(wrf.getncattr('DX'))
-        dy = int(wrf.getncattr('DY'))
-
-        return grid, dx, dy
-
-    def _get_skip_values(self, dx: int, dy: int):
-        return self.meters_between_points // dx, self.meters_between_points // dy
+        tile_zooms, bounds = get_tile_layout(self.grid_lat, self.grid_lon)
+        latitude = 0.5 * (bounds[1] + bounds[3])
+        densities = [density for density in WrfLayer.DENSITIES if density in docs]
+
+        for zoom in tile_zooms:
+            meters_per_pixel = get_meters_per_pixel(zoom, latitude)
+            fitting = [density for density in densities
+                       if docs[density]['dx'] >= WrfLayer.MIN_VECTOR_PIXELS * meters_per_pixel]
+            density = fitting[-1] if fitting else densities[0]
+            write_tiles(out_file, zoom, tile_vectors(docs[density], zoom, bounds))
+
+    @staticmethod
+    def _get_legacy_doc(lon: numpy.ndarray, lat: numpy.ndarray, fields: dict, row_length: int,
+                        dx: int, dy: int) -> dict:
+        """
+        Create a vector JSON document in the legacy format with a list of points
+        :param lon: Longitude of each sampled point
+        :param lat: Latitude of each sampled point
+        :param fields: Sampled grid of each field by output name
+        :param row_length: Number of points in each row
+        :param dx: Meters between points in the X dimension
+        :param dy: Meters between points in the Y dimension
+        :return: Vector JSON document
+        """
+        columns = [[f'{value:.2f}' for value in lon.ravel().tolist()],
+                   [f'{value:.2f}' for value in lat.ravel().tolist()]]
+        for grid in fields.values():
+            values = numpy.ma.filled(grid.astype(numpy.float64), numpy.nan).ravel().tolist()
+            columns.append([f'{value:.1f}' for value in values])
+        names = ['lon', 'lat'] + list(fields.keys())
+        items = [dict(zip(names, values)) for values in zip(*columns)]
+        return {'vectors': items, 'row_length': str(row_length), 'dx': dx, 'dy': dy}
+
+    def _read_from_netcdf(self) -> bool:
+        """
+        Open the NetCDF file once and read every input variable, the lat/lon grids, and dx/dy values
+        :return: True if all the input variables were read, otherwise False
+        """
+        cache = FieldCache(self.wrf_file, 'netcdf')
+        if not cache.load([(var_name, self.z_level) for var_name in self.input_variables.values()]):
+            return False
+
+        self.grid_lat = cache.grid_lat
+        self.grid_lon = cache.grid_lon
+        self.dx = cache.dx
+        self.dy = cache.dy
+        self.grids = {var_id: cache.get_grid(var_name, self.z_level)
+                      for var_id, var_name in self.input_variables.items()}
+
+        return all(grid is not None for grid in self.grids.values())
+
+    @staticmethod
+    def _get_skip_values(dx: int, dy: int, spacing: int) -> (int, int):
+        """
+        Get the number of grid points between sampled points
+        :param dx: Grid spacing in the X dimension in meters
+        :param dy: Grid spacing in the Y dimension in meters
+        :param spacing: Meters between sampled points
+        :return: Number of columns and rows between sampled points, at least 1
+        """
+        return max(1, spacing // dx), max(1, spacing // dy)
+
+    @staticmethod
+    def get_density_spacing(density: str, dx: int, dy: int) -> int:
+        """
+        Get the distance between the sampled points of a vector density
+        :param density: Vector density, see WrfLayer.DENSITIES
+        :param dx: Grid spacing in the X dimension in meters
+        :param dy: Grid spacing in the Y dimension in meters
+        :return: Meters between sampled points in the X dimension
+        """
+        return VectorJson._get_skip_values(dx, dy, VectorJson.DENSITY_SPACING[density])[0] * dx
 
     def _grid_to_lonlat(self, x: float, y: float) -> (float, float):
         """
@@ -167,6 +252,10 @@ def main():
     parser.add_argument('--wind-speed', type=str, help='Variable name of wind speed, required if creating wind variable', required=False)
     parser.add_argument('--wind-dir', type=str, help='Variable name of wind direction, required if creating wind variable', required=False)
     parser.add_argument('--z-level', type=int, help='Z-level if a 3D field', required=False)
+    parser.add_argument('--legacy-schema', help='Write the legacy list of points instead of columns',
+                        required=False, action='store_true')
+    parser.add_argument('--densities', type=str, nargs='+', help='Output file vector densities', required=False,
+                        choices=WrfLayer.DENSITIES)
     parser.add_argument('--auto', help='Automatically creates full output set', required=False, action='store_true')
     args = parser.parse_args()
 
@@ -175,6 +264,8 @@ def main():
     out_file = args.out_file or None
     variable = args.variable
     z_level = args.z_level or None
+    legacy_schema = args.legacy_schema
+    densities = args.densities
     auto = args.auto
 
     input_vars = {}
@@ -190,13 +281,14 @@ def main():
 
     # select mode and convert the WRF data to GeoJSON
     if not auto:
-        _manual_product(wrf_file, out_file, variable, input_vars, z_level)
+        _manual_product(wrf_file, out_file, variable, input_vars, z_level, legacy_schema, densities)
     else:
-        automate_vector_products(wrf_file)
+        automate_vector_products(wrf_file, legacy_schema=legacy_schema, densities=densities)
 
 
 def _manual_product(wrf_file: str, out_file: Union[str, None], variable: str,
-                    input_vars: dict, z_level: Union[int, None]) -> None:
+                    input_vars: dict, z_level: Union[int, None], legacy_schema: bool = False,
+                    densities: Union[List[str], None] = None) -> None:
     """
     Generate a single product defined by manual CLI inputs
     :param wrf_file: Input file name
@@ -204,9 +296,11 @@ def _manual_product(wrf_file: str, out_file: Union[str, None], variable: str,
     :param variable: Variable to extract
     :param input_vars: Dictionary of input var names in the file
     :param z_level: Vertical level to export, or None if a 2D variable
+    :param legacy_schema: Write the legacy list of points instead of the columnar format
+    :param densities: Vector densities of the output files, see WrfLayer.DENSITIES
     """
     # convert the WRF data to vector JSON
-    converter = VectorJson(wrf_file, variable, input_vars, z_level)
+    converter = VectorJson(wrf_file, variable, input_vars, z_level, legacy_schema=legacy_schema, densities=densities)
     output = converter.convert(out_file)
 
     # print the output to stdout if we do not have an output file
@@ -214,24 +308,85 @@ def _manual_product(wrf_file: str, out_file: Union[str, None], variable: str,
         print(json.dumps(output, indent=2))
 
 
-def automate_vector_products(wrf_file: str) -> List[WrfLayer]:
+def _out_files_exist(out_file: str, densities: List[str], tiles: bool = False) -> bool:
+    """
+    Check if the output files and tiles already exist in every density
+    :param out_file: Full path to the default density vector JSON output file
+    :param densities: Vector densities of the output files
+    :param tiles: True if the output is also sliced into tiles
+    :return: True if all the files exist, otherwise False
+    """
+    if tiles and not os.path.isdir(os.path.dirname(WrfLayer.get_tile_file_name(out_file, 0, 0, 0))):
+        return False
+    return all(os.path.exists(WrfLayer.get_density_file_name(out_file, density)) for density in densities)
+
+
+def automate_vector_products(wrf_file: str, tiles: bool = False, legacy_schema: bool = False,
+                             densities: Union[List[str], None] = None) -> List[WrfLayer]:
     """
     Generate all the products defined in the vector_products.yaml file
     :param wrf_file: Input file name
+    :param tiles: Also slice the output into z/x/y tiles
+    :param legacy_schema: Write the legacy list of points instead of the columnar format
+    :param densities: Vector densities of the output files, see WrfLayer.DENSITIES, defaults to
+                      WrfLayer.DENSITY_DEFAULT only
     :return: List of JSON output files
     """
+    with ConverterPool() as pool:
+        out_layers = submit_vector_products(wrf_file, pool, tiles, legacy_schema, densities)
+
+    return remove_missing_layers(out_layers)
+
+
+def _convert_shared_fields(converter: VectorJson, grids: Dict[str, SharedArray], grid_lat: SharedArray,
+                           grid_lon: SharedArray, out_file: str) -> None:
+    """
+    Convert fields that were read by the parent process and placed in shared memory
+    :param converter: Vector JSON converter for the product
+    :param grids: Shared data grid of each input variable by ID, e.g. 'speed' or 'direction'
+    :param grid_lat: Shared latitude grid
+    :param grid_lon: Shared longitude grid
+    :param out_file: Full path to the output file
+    """
+    shms = []
+    converter.grids = {}
+    for var_id, grid in grids.items():
+        shm, converter.grids[var_id] = grid.attach()
+        shms.append(shm)
+    lat_shm, converter.grid_lat = grid_lat.attach()
+    lon_shm, converter.grid_lon = grid_lon.attach()
+    try:
+        converter.convert(out_file)
+    finally:
+        # release the views before detaching from the shared memory
+        converter.grids = converter.grid_lat = converter.grid_lon = None
+        for shm in shms + [lat_shm, lon_shm]:
+            shm.close()
+
+
+def submit_vector_products(wrf_file: str, pool: ConverterPool, tiles: bool = False,
+                           legacy_schema: bool = False, densities: Union[List[str], None] = None) -> List[WrfLayer]:
+    """
+    Submit all the products defined in the vector_products.yaml file to a shared converter pool.
+    The caller must wait for the pool to finish before using the layer data files.
+    :param wrf_file: Input file name
+    :param pool: Converter pool to run the conversions
+    :param tiles: Also slice the output into z/x/y tiles
+    :param legacy_schema: Write the legacy list of points instead of the columnar format
+    :param densities: Vector densities of the output files, see WrfLayer.DENSITIES, the default density is
+                      always included
+    :return: List of JSON output layers, some of which may fail to be created
+    """
     log = Logger()
+    densities = [density for density in WrfLayer.DENSITIES
+                 if density in (densities or []) or density == WrfLayer.DENSITY_DEFAULT]
 
     # load the product list from the yaml file
     products_data = pkgutil.get_data('wrfcloud', 'runtime/resources/vector_products.yaml')
     products = yaml.safe_load(products_data)['products']
 
-    # create a process pool for concurrent execution
-    ppe = ProcessPoolExecutor(max_workers=8)
-    futures = []
-
-    # create each product
-    out_layers: List[WrfLayer] = []
+    # find each product and z-level
+    product_levels = []
     for product in products:
         z_levels = product['z_levels'] if 'z_levels' in product else [None]
         if 'wind' in product:
@@ -249,42 +404,55 @@ def automate_vector_products(wrf_file: str) -> List[WrfLayer]:
             continue
 
         for z_level in z_levels:
-            # create the output file name
             out_file = (f'{wrf_file}_{variable}' if z_level is None else f'{wrf_file}_{variable}_{z_level}')
             out_file += '.json.gz'
+            product_levels.append((product, variable, input_vars, z_level, out_file))
+
+    # open the file once and read every field that still needs to be converted
+    cache = FieldCache(wrf_file, 'netcdf')
+    if not cache.load([(var_name, z_level)
+                       for product, variable, input_vars, z_level, out_file in product_levels
+                       if not _out_files_exist(out_file, densities, tiles)
+                       for var_name in input_vars.values()]):
+        return []
+    shared = cache.share()
+    tile_zooms, bounds = get_tile_layout(cache.grid_lat, cache.grid_lon) if tiles else ([], None)
+    spacings = {density: VectorJson.get_density_spacing(density, cache.dx, cache.dy)
+                for density in densities} if cache.dx and cache.dy else {}
+    futures = []
 
-            # create the WRF Layer details for this output product
-            wrf_layer = WrfLayer()
-            wrf_layer.plot_type = 'vector'
-            wrf_layer.variable_name = variable if z_level is None else f'{variable}_3d'
-            wrf_layer.display_name = product['display_name']
-            wrf_layer.layer_data = out_file
-            wrf_layer.z_level = z_level
-
-            with Dataset(wrf_file) as wrf_nc:
-                file_time = wrf_nc['Times'][:].tobytes().decode()
-                dt = datetime.strptime(file_time, '%Y-%m-%d_%H:%M:%S')
-                wrf_layer.dt = dt.timestamp()
-
-            out_layers.append(wrf_layer)
-
-            # convert the file if it does not already exist
-            if not os.path.exists(out_file):
-                converter = VectorJson(wrf_file, variable, input_vars, z_level)
-                future = ppe.submit(converter.convert, out_file)
-                futures.append(future)
-
-    wait(futures)
-
-    # remove any layers if the file does not exist
-    existing_layers = []
-    for layer in out_layers:
-        if os.path.exists(layer.layer_data):
-            existing_layers.append(layer)
-        else:
-            log.error(f'Layer does not exist: {layer.layer_data}')
-
-    return existing_layers
+    # create each product
+    out_layers: List[WrfLayer] = []
+    for product, variable, input_vars, z_level, out_file in product_levels:
+        # create the WRF Layer details for this output product
+        wrf_layer = WrfLayer()
+        wrf_layer.plot_type = 'vector'
+        wrf_layer.variable_name = variable if z_level is None else f'{variable}_3d'
+        wrf_layer.display_name = product['display_name']
+        wrf_layer.layer_data = out_file
+        wrf_layer.z_level = z_level
+        wrf_layer.dt = cache.get_valid_time(input_vars['speed']) or 0
+        wrf_layer.tile_zooms = tile_zooms
+        wrf_layer.bounds = bounds
+        wrf_layer.densities = spacings if len(spacings) > 1 else {}
+
+        out_layers.append(wrf_layer)
+
+        # convert the file if it does not already exist
+        keys = {var_id: (var_name, z_level) for var_id, var_name in input_vars.items()}
+        if not _out_files_exist(out_file, densities, tiles) and all(key in shared['grids'] for key in keys.values()):
+            converter = VectorJson(wrf_file, variable, input_vars, z_level, tiles, legacy_schema, densities)
+            converter.dx = cache.dx
+            converter.dy = cache.dy
+            future = pool.submit(_convert_shared_fields, converter,
+                                 {var_id: shared['grids'][key] for var_id, key in keys.items()},
+                                 shared['grid_lat'], shared['grid_lon'], out_file)
+            futures.append(future)
+
+    # release the shared memory once all the products from this file are done
+    pool.when_done(futures, cache.close)
+
+    return out_layers
 
 
 if __name__ == '__main__':
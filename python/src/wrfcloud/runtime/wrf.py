@@ -61,32 +61,41 @@ class Wrf(Process):
         Executes the wrf.exe program
         """
         self.log.debug(f'Linking {self.EXE} to wrf working directory')
-        self.symlink(f'{self.job.wrf_code_dir}/main/{self.EXE}', self.EXE)
+        self.symlink(f'{self.job.wrf_code_dir}/main/{self.EXE}', f'{self.job.wrf_dir}/{self.EXE}')
 
         self.log.debug(f'Executing {self.EXE}')
         if self.job.cores == 1:
-            wrf_cmd = f'./{self.EXE} >& {os.path.splitext(self.EXE)[0]}.log'
+            wrf_cmd = f'cd {self.job.wrf_dir} && ./{self.EXE} > {os.path.splitext(self.EXE)[0]}.log 2>&1'
             if os.system(wrf_cmd):
                 self.log.error(f'{self.EXE} returned non-zero')
                 return False
             return True
 
-        return self.submit_job(self.EXE, self.job.cores, 'wrf')
-
-    def run(self) -> bool:
-        """Main routine that sets up, runs, and monitors WRF end-to-end"""
-        self.log.info(f'Setting up {self.EXE} for "{self.job.job_id}"')
+        return self.submit_job(self.EXE, self.job.cores, 'wrf', self.job.wrf_dir)
 
+    def setup(self) -> bool:
+        """
+        Create the WRF working directory and get the input files
+        :return: True if wrf.exe should run, or False if the task is skipped
+        """
         # Check if experiment working directory already exists, take action based on value of runinfo.exists
         action = check_wd_exist(self.job.exists, self.job.wrf_dir)
         if action == "skip":
-            return True
+            return False
 
         os.mkdir(self.job.wrf_dir)
         os.chdir(self.job.wrf_dir)
 
         self.log.debug('Calling get_files')
         self.get_files()
+        return True
+
+    def run(self) -> bool:
+        """Main routine that sets up, runs, and monitors WRF end-to-end"""
+        self.log.info(f'Setting up {self.EXE} for "{self.job.job_id}"')
+
+        if not self.setup():
+            return True
 
         self.log.debug('Calling run_wrf')
         return self.run_wrf()
@@ -6,7 +6,7 @@ The SubscriberDao class is a data access object that performs basic CRUD
 import os
 import json
 from typing import List, Union
-from wrfcloud.system import get_aws_session
+from wrfcloud.system import get_aws_client
 from wrfcloud.schedule.schedule import Schedule
 from wrfcloud.log import Logger
 
@@ -133,8 +133,7 @@ class ScheduleDao:
         Get a client object for the AWS Events service
         """
         if self.aws_client is None:
-            session = get_aws_session()
-            self.aws_client = session.client('events')
+            self.aws_client = get_aws_client('events')
         return self.aws_client
 
     def _get_all_rules(self) -> List[dict]:
@@ -82,9 +82,9 @@ def message_all_subscribers(message: dict) -> List[Subscriber]:
         future.result()
 
     # delete the subscribers if we were not able to get a message through
-    for sub in subscribers:
-        if not sub.message_delivered:
-            delete_subscriber_from_system(sub);
+    stale_subscribers = [sub for sub in subscribers if not sub.message_delivered]
+    if stale_subscribers:
+        SubscriberDao().delete_subscribers(stale_subscribers)
 
     # return list of subscribers, each of which includes success/failure to send
     return subscribers
@@ -63,6 +63,14 @@ class SubscriberDao(DynamoDao):
         client_url = subscriber.client_url
         return super().delete_item({'client_url': client_url})
 
+    def delete_subscribers(self, subscribers: List[Subscriber]) -> bool:
+        """
+        Delete many subscribers from the database with as few requests as possible
+        :param subscribers: List of subscriber objects
+        :return: True if successful, otherwise False
+        """
+        return super().batch_delete_items([{'client_url': subscriber.client_url} for subscriber in subscribers])
+
     def create_subscriber_table(self) -> bool:
         """
         Create the subscriber table
@@ -7,6 +7,8 @@ same name will be overwritten.
 import os
 import sys
 import pkgutil
+from threading import Lock
+from typing import Dict, Tuple, Union
 import yaml
 from wrfcloud.log import LogLevel
 
@@ -21,6 +23,12 @@ AWS_REGION = ''
 # The environment that has been set
 ENVIRONMENT = None
 
+# Process-wide AWS sessions and clients, reused across warm Lambda invocations and threads
+_AWS_LOCK = Lock()
+_AWS_SESSIONS: Dict[Tuple[str, str], any] = {}
+_AWS_CLIENTS: Dict[Tuple[str, str, str, Union[str, None]], any] = {}
+_AWS_CLIENT_STATS: Dict[str, int] = {'hits': 0, 'misses': 0}
+
 
 def init_environment(env='test'):
     """
@@ -65,14 +73,98 @@ def get_aws_session(region: str = None, profile: str = None):
     """
     import boto3
 
-    region = region if region is not None else AWS_REGION
-    profile = profile if profile is not None else AWS_PROFILE
+    region, profile = _get_region_and_profile(region, profile)
 
-    if profile is not None and profile != '' and region is not None and region != '':
+    if profile != '' and region != '':
         return boto3.Session(profile_name=profile, region_name=region)
-    elif profile is not None and profile != '':
+    elif profile != '':
         return boto3.Session(profile_name=profile)
-    elif region is not None and region != '':
+    elif region != '':
         return boto3.Session(region_name=region)
     else:
         return boto3.Session()
+
+
+def get_cached_aws_session(region: str = None, profile: str = None):
+    """
+    Get a process-wide AWS session, e.g. to read credentials.  Sessions are not thread-safe, so use
+    get_aws_client to create clients from it.
+    :param region: Optional AWS region name (e.g. us-west-2)
+    :param profile: Optional AWS profile name available in credentials file
+    :return: AWS session
+    """
+    with _AWS_LOCK:
+        return _get_cached_aws_session(*_get_region_and_profile(region, profile))
+
+
+def get_aws_client(service: str, region: str = None, profile: str = None, endpoint_url: str = None):
+    """
+    Get a process-wide AWS client.  Clients are thread-safe and are created once per service, region,
+    profile, and endpoint URL.
+    :param service: AWS service name (e.g. s3 or dynamodb)
+    :param region: Optional AWS region name (e.g. us-west-2)
+    :param profile: Optional AWS profile name available in credentials file
+    :param endpoint_url: Optional endpoint URL, e.g. for a local DynamoDB
+    :return: AWS client
+    """
+    region, profile = _get_region_and_profile(region, profile)
+    key = (service, region, profile, endpoint_url)
+
+    with _AWS_LOCK:
+        client = _AWS_CLIENTS.get(key)
+        if client is not None:
+            _AWS_CLIENT_STATS['hits'] += 1
+            return client
+
+        _AWS_CLIENT_STATS['misses'] += 1
+        session = _get_cached_aws_session(region, profile)
+        client = session.client(service, endpoint_url=endpoint_url)
+        _AWS_CLIENTS[key] = client
+        return client
+
+
+def get_aws_client_stats() -> Dict[str, int]:
+    """
+    Get the number of times get_aws_client reused a client or created a new one
+    :return: Dictionary with 'hits', 'misses', and 'clients', the number of cached clients
+    """
+    with _AWS_LOCK:
+        return {**_AWS_CLIENT_STATS, 'clients': len(_AWS_CLIENTS)}
+
+
+def clear_aws_clients() -> None:
+    """
+    Remove all the cached AWS sessions and clients, and reset the counters
+    :return: None
+    """
+    with _AWS_LOCK:
+        _AWS_SESSIONS.clear()
+        _AWS_CLIENTS.clear()
+        _AWS_CLIENT_STATS['hits'] = 0
+        _AWS_CLIENT_STATS['misses'] = 0
+
+
+def _get_region_and_profile(region: Union[str, None], profile: Union[str, None]) -> (str, str):
+    """
+    Fill in the default region and profile from the environment
+    :param region: AWS region name or None for the default
+    :param profile: AWS profile name or None for the default
+    :return: Region and profile, where an empty string means not set
+    """
+    region = region if region is not None else AWS_REGION
+    profile = profile if profile is not None else AWS_PROFILE
+    return region or '', profile or ''
+
+
+def _get_cached_aws_session(region: str, profile: str):
+    """
+    Get or create a session in the cache, the caller must hold _AWS_LOCK
+    :param region: AWS region name, or an empty string
+    :param profile: AWS profile name, or an empty string
+    :return: AWS session
+    """
+    session = _AWS_SESSIONS.get((region, profile))
+    if session is None:
+        session = get_aws_session(region, profile)
+        _AWS_SESSIONS[(region, profile)] = session
+    return session
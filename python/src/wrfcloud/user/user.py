@@ -11,7 +11,7 @@ import sys
 from datetime import datetime
 from typing import Union, List
 import bcrypt
-from wrfcloud.system import get_aws_session
+from wrfcloud.system import get_aws_client
 from wrfcloud.log import Logger
 
 
@@ -292,8 +292,7 @@ class User:
                 }
             }
 
-            session = get_aws_session()
-            ses = session.client('ses')
+            ses = get_aws_client('ses')
             ses.send_email(Source=source, Destination=dest, Message=message)
 
             return True
@@ -333,8 +332,7 @@ class User:
                 }
             }
 
-            session = get_aws_session()
-            ses = session.client('ses')
+            ses = get_aws_client('ses')
             ses.send_email(Source=source, Destination=dest, Message=message)
 
             return True
@@ -0,0 +1,145 @@
+"""
+Benchmark the dynamodb attribute value codec against the original recursive converters, on typical
+job, user, and audit log payloads
+
+Usage (from python/test): PYTHONPATH=../src python benchmarks/benchmark_dynamodb_codec.py
+"""
+
+
+from argparse import ArgumentParser
+from timeit import repeat
+import yaml
+from wrfcloud.system import init_environment
+from wrfcloud.api.audit import AuditEntry
+from wrfcloud.dynamodb.codec import dict_to_dynamo, dynamo_to_dict
+from wrfcloud.jobs import WrfJob
+from wrfcloud.user import User
+
+
+def _original_dict_to_dynamo(data: dict, set_ok: bool = False, recursed: bool = False) -> dict:
+    """
+    The original DynamoDao._dict_to_dynamo
+    """
+    if isinstance(data, dict):
+        dynamo = {
+            key: _original_dict_to_dynamo(value, set_ok, True)
+            for key, value in data.items()
+        }
+        if recursed:
+            return {'M': dynamo}
+        return dynamo
+
+    if isinstance(data, list):
+        if set_ok:
+            if all(isinstance(e, str) for e in data):
+                return {'SS': data}
+            if all(isinstance(e, (int, float)) for e in data):
+                return {'NS': [str(e) for e in data]}
+            if all(isinstance(e, (bytes, bytearray)) for e in data):
+                return {'BS': [e for e in data]}
+        return {'L': [_original_dict_to_dynamo(value, set_ok, True) for value in data]}
+
+    if isinstance(data, str):
+        return {'S': data}
+    if isinstance(data, bool):
+        return {'BOOL': data}
+    if isinstance(data, (int, float)):
+        return {'N': str(data)}
+    if isinstance(data, bytes):
+        return {'B': data}
+    if data is None:
+        return {'NULL': True}
+    assert False  # we missed a case
+
+
+def _original_dynamo_to_dict(dynamo: dict, recursed: bool = False) -> any:
+    """
+    The original DynamoDao._dynamo_to_dict
+    """
+    if not recursed:
+        return {
+            key: _original_dynamo_to_dict(value, True)
+            for key, value in dynamo.items()
+        }
+
+    if 'S' in dynamo:
+        return dynamo['S']
+    if 'N' in dynamo and '.' in dynamo['N']:
+        return float(dynamo['N'])
+    if 'N' in dynamo and '.' not in dynamo['N']:
+        return int(dynamo['N'])
+    if 'B' in dynamo:
+        return dynamo['B']
+    if 'BOOL' in dynamo:
+        return dynamo['BOOL']
+    if 'NULL' in dynamo:
+        return None
+    if 'SS' in dynamo:
+        return dynamo['SS']
+    if 'NS' in dynamo and '.' in dynamo['NS'][0]:
+        return [float(e) for e in dynamo['NS']]
+    if 'NS' in dynamo and '.' not in dynamo['NS'][0]:
+        return [int(e) for e in dynamo['NS']]
+    if 'BS' in dynamo:
+        return dynamo['BS']
+    if 'L' in dynamo:
+        return [_original_dynamo_to_dict(e, True) for e in dynamo['L']]
+    if 'M' in dynamo:
+        return _original_dynamo_to_dict(dynamo['M'], False)
+
+    raise RuntimeError('Missed a case converting dynamo dict to normal dict')
+
+
+def _get_payloads() -> dict:
+    """
+    Get typical items from each table
+    :return: Dictionary of payload name to item
+    """
+    job = yaml.safe_load(open('resources/sample_jobs.yaml'))['jobs'][2][0]
+    user = yaml.safe_load(open('resources/sample_users.yaml'))['users']['admin'][0]
+
+    audit = AuditEntry()
+    audit.ref_id = 'a5b2c3d4-0000-4000-8000-000000000000'
+    audit.action = 'ListJobs'
+    audit.authenticated = True
+    audit.username = user['email']
+    audit.ip_address = '10.0.0.151'
+    audit.start_time = 1700000000.123456
+    audit.end_time = audit.start_time + 0.25
+    audit.duration_ms = 250
+    audit.action_success = True
+
+    return {
+        f'WrfJob ({len(job["layers"])} layers)': WrfJob(job).data,
+        'WrfJob (no layers)': {**WrfJob(job).data, 'layers': 's3://bucket/jobs/P1/layers.yaml'},
+        'User': User(user).data,
+        'AuditEntry': audit.data,
+    }
+
+
+def main() -> None:
+    """
+    Compare the converters on each payload
+    """
+    parser = ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200, help='Number of conversions in each of five timing runs')
+    args = parser.parse_args()
+
+    init_environment('test')
+
+    for name, item in _get_payloads().items():
+        # both codecs must give exactly the same results
+        dynamo = _original_dict_to_dynamo(item)
+        assert dict_to_dynamo(item) == dynamo
+        assert dict_to_dynamo(item, set_ok=True) == _original_dict_to_dynamo(item, set_ok=True)
+        assert dynamo_to_dict(dynamo) == _original_dynamo_to_dict(dynamo) == item
+
+        times = [min(repeat(lambda: function(value), number=args.repeat, repeat=5)) / args.repeat * 1e6
+                 for function, value in [(_original_dict_to_dynamo, item), (dict_to_dynamo, item),
+                                         (_original_dynamo_to_dict, dynamo), (dynamo_to_dict, dynamo)]]
+        print(f'{name + ":":24} encode {times[0]:8.1f} -> {times[1]:8.1f} us ({times[0] / times[1]:.1f}x)  '
+              f'decode {times[2]:8.1f} -> {times[3]:8.1f} us ({times[2] / times[3]:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
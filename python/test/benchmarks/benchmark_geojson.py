@@ -0,0 +1,102 @@
+"""
+Benchmark the GeoJSON grid-to-lon/lat projection and the filled contour engines on a synthetic grid
+
+Usage (from python/test): PYTHONPATH=../src python benchmarks/benchmark_geojson.py
+"""
+
+
+from argparse import ArgumentParser
+from timeit import timeit
+import numpy
+from numpy.ma.core import MaskedArray
+from wrfcloud.system import init_environment
+from wrfcloud.runtime.tools.geojson import GeoJson
+
+
+def _get_synthetic_converter(size: int) -> GeoJson:
+    """
+    Get a GeoJson converter with a synthetic lat/lon grid
+    :param size: Number of grid points in each horizontal dimension
+    :return: GeoJson converter with grid_lat and grid_lon set
+    """
+    converter = GeoJson('synthetic.nc', 'netcdf', 'temp_2m', [-15, 45], 2, 'viridis')
+    x, y = numpy.meshgrid(numpy.arange(size), numpy.arange(size))
+    converter.grid_lat = MaskedArray(10 + y * 0.05 + x * 0.001)
+    converter.grid_lon = MaskedArray(-80 + x * 0.05 - y * 0.002)
+    return converter
+
+
+def _per_point(converter: GeoJson, polygon: numpy.ndarray) -> list:
+    """
+    The original per-vertex projection path
+    :param converter: Converter with lat/lon grids set
+    :param polygon: Array of grid XY vertices
+    :return: List of lon/lat tuples
+    """
+    return [converter._grid_to_lonlat(point[0], point[1]) for point in polygon]
+
+
+def _synthetic_field(size: int) -> numpy.ma.MaskedArray:
+    """
+    Get a synthetic temperature-like field
+    :param size: Number of grid points in each horizontal dimension
+    :return: Data grid
+    """
+    x, y = numpy.meshgrid(numpy.arange(size), numpy.arange(size))
+    rng = numpy.random.default_rng(0)
+    return numpy.ma.MaskedArray(15 + 20 * numpy.sin(x / 25.0) * numpy.cos(y / 18.0) + rng.normal(0, 1, (size, size)))
+
+
+def _benchmark_contour_engines(size: int, repeat: int) -> None:
+    """
+    Time the contouring step alone and all of _create_features with each of the contour engines
+    :param size: Number of grid points in each horizontal dimension
+    :param repeat: Number of timed repetitions
+    """
+    converter = _get_synthetic_converter(size)
+    grid = _synthetic_field(size)
+    levels = converter._get_contour_levels()
+
+    for engine in GeoJson.CONTOUR_ENGINES:
+        converter.contour_engine = engine
+        contour_function = getattr(converter, f'_contour_with_{engine}')
+        try:
+            contours = timeit(lambda: contour_function(grid, levels), number=repeat) / repeat
+            features = timeit(lambda: converter._create_features(grid), number=repeat) / repeat
+            print(f'{engine + " engine:":18} contours {contours:.4f} s  features {features:.4f} s')
+        except AttributeError:
+            print(f'{engine + " engine:":18} not supported by this matplotlib version')
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    init_environment('test')
+
+    parser = ArgumentParser(description='Benchmark the grid-to-lon/lat projection')
+    parser.add_argument('--size', type=int, default=400, help='Grid points in each dimension')
+    parser.add_argument('--vertices', type=int, default=100000, help='Number of polygon vertices')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed repetitions')
+    args = parser.parse_args()
+
+    converter = _get_synthetic_converter(args.size)
+    rng = numpy.random.default_rng(0)
+    polygon = rng.uniform(0, args.size - 1.01, (args.vertices, 2))
+
+    # make sure both paths agree before timing them
+    assert _per_point(converter, polygon[:1000]) == converter._polygon_to_coord_array(polygon[:1000])
+
+    per_point = timeit(lambda: _per_point(converter, polygon), number=args.repeat) / args.repeat
+    batched = timeit(lambda: converter._polygon_to_coord_array(polygon), number=args.repeat) / args.repeat
+
+    print(f'grid: {args.size}x{args.size}  vertices: {args.vertices}')
+    print(f'per-point: {per_point:.4f} s')
+    print(f'batched:   {batched:.4f} s')
+    print(f'speedup:   {per_point / batched:.1f}x')
+
+    _benchmark_contour_engines(args.size, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
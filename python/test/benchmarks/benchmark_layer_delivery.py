@@ -0,0 +1,117 @@
+"""
+Benchmark the duration, peak memory, and response size of each GetWrfGeoJson delivery on a synthetic
+contour layer, including the gzip and base64 encoding of the response body done by lambda_handler
+
+Usage (from python/test): PYTHONPATH=../src python benchmarks/benchmark_layer_delivery.py
+"""
+
+
+from argparse import ArgumentParser
+import base64
+import gzip
+import io
+import json
+from timeit import repeat
+import tracemalloc
+import boto3
+import numpy
+from numpy.ma.core import MaskedArray
+import wrfcloud.api.actions.action
+import wrfcloud.api.actions.wrf
+from wrfcloud.system import init_environment
+from wrfcloud.api.actions import GetWrfGeoJson
+from wrfcloud.jobs import WrfLayer
+from wrfcloud.runtime.tools.geojson import GeoJson
+
+
+class _FakeS3:
+    """
+    S3 client that reads one object from memory and signs URLs with a real client
+    """
+    def __init__(self, data: bytes):
+        """
+        :param data: Gzipped layer data
+        """
+        self.data = data
+        self.signer = boto3.client('s3', region_name='us-east-2', aws_access_key_id='benchmark',
+                                   aws_secret_access_key='benchmark')
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        """
+        Pretend to read the object
+        """
+        return {'Body': io.BytesIO(self.data)}
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        """
+        Pretend to check that the object exists
+        """
+        return {'ContentLength': len(self.data)}
+
+    def generate_presigned_url(self, *args, **kwargs) -> str:
+        """
+        Sign a URL to the object
+        """
+        return self.signer.generate_presigned_url(*args, **kwargs)
+
+
+def _get_synthetic_layer(size: int) -> bytes:
+    """
+    Get a gzipped GeoJSON contour layer for a synthetic temperature-like field
+    :param size: Number of grid points in each horizontal dimension
+    :return: Gzipped layer data, as stored in S3
+    """
+    converter = GeoJson('synthetic.nc', 'netcdf', 'temp_2m', [-15, 45], 2, 'viridis')
+    x, y = numpy.meshgrid(numpy.arange(size), numpy.arange(size))
+    converter.grid_lat = MaskedArray(10 + y * 0.05 + x * 0.001)
+    converter.grid_lon = MaskedArray(-80 + x * 0.05 - y * 0.002)
+    rng = numpy.random.default_rng(0)
+    grid = MaskedArray(15 + 20 * numpy.sin(x / 25.0) * numpy.cos(y / 18.0) + rng.normal(0, 1, (size, size)))
+    doc = {'type': 'FeatureCollection', 'features': converter._create_features(grid)}
+    return gzip.compress(json.dumps(doc).encode())
+
+
+def _handle(delivery: str) -> bytes:
+    """
+    Run the action and encode the response body the way lambda_handler does
+    :param delivery: Requested delivery
+    :return: Response body
+    """
+    request = {'job_id': 'P1', 'valid_time': 1669075200, 'variable': '2t', 'delivery': delivery}
+    action = GetWrfGeoJson(ref_id='WBENCHMARK', request=request)
+    assert action.run()
+    body = {'ok': action.success, 'data': action.response}
+    return base64.b64encode(gzip.compress(json.dumps(body).encode()))
+
+
+def main() -> None:
+    """
+    Compare the deliveries
+    """
+    parser = ArgumentParser(description='Benchmark the GetWrfGeoJson deliveries')
+    parser.add_argument('--size', type=int, default=400, help='Grid points in each dimension')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed repetitions')
+    args = parser.parse_args()
+
+    init_environment('test')
+
+    data = _get_synthetic_layer(args.size)
+    fake_s3 = _FakeS3(data)
+    wrfcloud.api.actions.action.get_aws_client = lambda service: fake_s3
+    wrfcloud.api.actions.wrf.get_aws_client = lambda service: fake_s3
+
+    print(f'grid: {args.size}x{args.size}  layer: {len(gzip.decompress(data)):,} B  gzip {len(data):,} B')
+    for delivery in GetWrfGeoJson.DELIVERIES:
+        duration = min(repeat(lambda: _handle(delivery), number=1, repeat=args.repeat))
+
+        tracemalloc.start()
+        body = _handle(delivery)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f'{delivery + ":":8} duration {duration * 1000:8.1f} ms  peak memory {peak / 2 ** 20:7.1f} MiB  '
+              f'response {len(body):>10,} B')
+
+
+if __name__ == '__main__':
+    main()
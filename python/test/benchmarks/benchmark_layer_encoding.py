@@ -0,0 +1,69 @@
+"""
+Benchmark the size and encode time of the binary layer encoding against gzipped GeoJSON
+
+Usage (from python/test): PYTHONPATH=../src python benchmarks/benchmark_layer_encoding.py
+"""
+
+
+from argparse import ArgumentParser
+from gzip import compress, decompress
+import json
+from timeit import timeit
+import numpy
+from numpy.ma.core import MaskedArray
+from wrfcloud.system import init_environment
+from wrfcloud.runtime.tools.geojson import GeoJson
+from wrfcloud.runtime.tools.layer_encoding import encode_features, decode_layer
+
+
+def _get_synthetic_features(size: int) -> list:
+    """
+    Get contour features for a synthetic temperature-like field
+    :param size: Number of grid points in each horizontal dimension
+    :return: List of GeoJSON features
+    """
+    converter = GeoJson('synthetic.nc', 'netcdf', 'temp_2m', [-15, 45], 2, 'viridis')
+    x, y = numpy.meshgrid(numpy.arange(size), numpy.arange(size))
+    converter.grid_lat = MaskedArray(10 + y * 0.05 + x * 0.001)
+    converter.grid_lon = MaskedArray(-80 + x * 0.05 - y * 0.002)
+    rng = numpy.random.default_rng(0)
+    grid = MaskedArray(15 + 20 * numpy.sin(x / 25.0) * numpy.cos(y / 18.0) + rng.normal(0, 1, (size, size)))
+    return converter._create_features(grid)
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    init_environment('test')
+
+    parser = ArgumentParser(description='Benchmark the binary layer encoding')
+    parser.add_argument('--size', type=int, default=400, help='Grid points in each dimension')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed repetitions')
+    args = parser.parse_args()
+
+    features = _get_synthetic_features(args.size)
+    doc = {'type': 'FeatureCollection', 'features': features}
+
+    # make sure the binary encoding is lossless before timing it
+    geojson_gz = compress(json.dumps(doc).encode())
+    binary_gz = compress(encode_features(features))
+    assert json.loads(json.dumps(decode_layer(decompress(binary_gz)))) == json.loads(decompress(geojson_gz))
+
+    encodings = {
+        'geojson': (lambda: compress(json.dumps(doc).encode()), lambda: json.loads(decompress(geojson_gz)),
+                    len(json.dumps(doc).encode()), len(geojson_gz)),
+        'binary': (lambda: compress(encode_features(features)), lambda: decode_layer(decompress(binary_gz)),
+                   len(encode_features(features)), len(binary_gz)),
+    }
+
+    print(f'grid: {args.size}x{args.size}  features: {len(features)}')
+    for name, (encode, decode, raw_size, gz_size) in encodings.items():
+        encode_time = timeit(encode, number=args.repeat) / args.repeat
+        decode_time = timeit(decode, number=args.repeat) / args.repeat
+        print(f'{name + ":":9} raw {raw_size:>10,} B  gzip {gz_size:>10,} B  '
+              f'encode {encode_time:.4f} s  decode {decode_time:.4f} s')
+
+
+if __name__ == '__main__':
+    main()
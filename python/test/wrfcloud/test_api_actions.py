@@ -4,9 +4,19 @@ Test the wrfcloud.api.actions module
 
 
 import os
+import io
+import json
 import secrets
 import hashlib
 import base64
+import gzip
+from collections import OrderedDict
+from typing import Union
+from botocore.exceptions import ClientError
+import wrfcloud.jobs
+import wrfcloud.api.actions.wrf
+import wrfcloud.api.actions.action
+from wrfcloud.api.actions.wrf import _get_layer_location, _set_layer_location
 from wrfcloud.api.actions import Login
 from wrfcloud.api.actions import RefreshToken
 from wrfcloud.api.actions import ChangePassword
@@ -21,11 +31,12 @@ from wrfcloud.api.actions import ResetPassword
 from wrfcloud.api.actions import RunWrf
 from wrfcloud.api.actions import GetWrfMetaData
 from wrfcloud.api.actions import GetWrfGeoJson
+from wrfcloud.api.actions import GetWrfGeoJsonBatch
 from wrfcloud.api.auth import create_jwt, validate_jwt
 from wrfcloud.api.auth import issue_refresh_token
 from wrfcloud.api.auth import get_refresh_token
 from wrfcloud.api.handler import create_reference_id
-from wrfcloud.jobs import add_job_to_system, WrfJob
+from wrfcloud.jobs import add_job_to_system, WrfJob, WrfLayer
 from wrfcloud.user import User
 from wrfcloud.user import add_user_to_system
 from wrfcloud.user import get_user_from_system
@@ -733,3 +744,235 @@ def test_refresh_token() -> None:
 #
 #     # teardown test case
 #     assert _test_teardown()
+
+
+def test_get_wrf_geojson_resolved_key(monkeypatch) -> None:
+    """
+    Test that GetWrfGeoJson reads layers from their S3 keys without reading the job layers when it can
+    :return: None
+    """
+    # layer files of one job where the post-processor writes them, and of another job somewhere else
+    objects = {
+        ('wrfcloud-output', WrfLayer.get_layer_key('/P1', 1669075200, '2t', 0, 'contour')): b'{"p1": "2t"}',
+        ('wrfcloud-output', WrfLayer.get_layer_key('/P1', 1669075200, 'wind', 0, 'vector')): b'{"p1": "wind"}',
+        ('other', WrfLayer.get_layer_key('moved/P2', 1669075200, '2t', 0, 'contour')): b'{"p2": 0}',
+        ('other', WrfLayer.get_layer_key('moved/P2', 1669078800, '2t', 0, 'contour')): b'{"p2": 1}',
+    }
+    reads = []
+    job_reads = []
+
+    def _s3_read(_, bucket: str, key: str) -> bytes:
+        reads.append(key)
+        if (bucket, key) not in objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return gzip.compress(objects[(bucket, key)])
+
+    def _get_job_by_id(_, job_id: str, load_layers_from_s3: bool = True) -> Union[WrfJob, None]:
+        job_reads.append((job_id, load_layers_from_s3))
+        if job_id == 'P3':
+            return None
+        layers = [{'variable_name': '2t', 'dt': dt, 'layer_data': f's3://other/{key}'}
+                  for (bucket, key), dt in zip(list(objects)[2:4], [1669075200, 1669078800])]
+        return WrfJob({'job_id': job_id, 'layers': layers})
+
+    monkeypatch.setattr(wrfcloud.api.actions.wrf.GetWrfGeoJson, '_s3_read', _s3_read)
+    monkeypatch.setattr(wrfcloud.jobs.JobDao, 'get_job_by_id', _get_job_by_id)
+    monkeypatch.setattr(wrfcloud.api.actions.wrf, '_LAYER_LOCATIONS', OrderedDict())
+
+    def _get_layer(job_id: str, valid_time: int, variable: str) -> Union[dict, None]:
+        request = {'job_id': job_id, 'valid_time': valid_time, 'variable': variable}
+        action = GetWrfGeoJson(ref_id=create_reference_id(), request=request)
+        action.run()
+        return json.loads(base64.b64decode(action.response['geojson'])) if action.success else None
+
+    # contour and vector layers are read from their keys without reading the job
+    assert _get_layer('P1', 1669075200, '2t') == {'p1': '2t'}
+    assert _get_layer('P1', 1669075200, 'wind') == {'p1': 'wind'}
+    assert job_reads == []
+
+    # the job is read when the layer is not at its key, and its other layers are then found directly
+    assert _get_layer('P2', 1669075200, '2t') == {'p2': 0}
+    assert _get_layer('P2', 1669078800, '2t') == {'p2': 1}
+    assert job_reads == [('P2', True)]
+    assert len(reads) == 5
+
+    # a deleted job has no layer files left, and no job to read
+    job_reads.clear()
+    assert _get_layer('P3', 1669075200, '2t') is None
+    assert job_reads == [('P3', True)]
+    assert len(reads) == 6
+
+    # other errors reading the layer fall back to reading the job
+    def _s3_read_denied(_, bucket: str, key: str) -> bytes:
+        reads.append(key)
+        raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'GetObject')
+
+    monkeypatch.setattr(wrfcloud.api.actions.wrf.GetWrfGeoJson, '_s3_read', _s3_read_denied)
+    job_reads.clear()
+    assert _get_layer('P1', 1669075200, '2t') is None
+    assert job_reads == [('P1', True)]
+
+
+def test_layer_locations(monkeypatch) -> None:
+    """
+    Test that the least recently used layer locations are forgotten first
+    :return: None
+    """
+    monkeypatch.setattr(wrfcloud.api.actions.wrf, '_LAYER_LOCATIONS', OrderedDict())
+    monkeypatch.setattr(wrfcloud.api.actions.wrf, '_MAX_LAYER_LOCATIONS', 2)
+    monkeypatch.delenv('WRF_OUTPUT_PREFIX', raising=False)
+
+    _set_layer_location('P1', 'bucket', 'jobs/P1/2t.geojson.gz')
+    _set_layer_location('P2', 'bucket', 'jobs/P2/2t.geojson.gz')
+    assert _get_layer_location('P1') == ('bucket', 'jobs/P1')
+    _set_layer_location('P3', 'bucket', 'jobs/P3/2t.geojson.gz')
+    assert _get_layer_location('P1') == ('bucket', 'jobs/P1')
+    assert _get_layer_location('P2') is None
+    assert _get_layer_location('P3') == ('bucket', 'jobs/P3')
+
+
+def test_get_wrf_geojson_delivery(monkeypatch) -> None:
+    """
+    Test the inline, gzip, and url deliveries of GetWrfGeoJson
+    :return: None
+    """
+    key = WrfLayer.get_layer_key('P1', 1669075200, '2t', 0, 'contour')
+    objects = {('wrfcloud-output', key): gzip.compress(b'{"p1": "2t"}')}
+
+    class _FakeS3:
+        """
+        S3 client that reads and signs URLs to the objects
+        """
+        def get_object(self, Bucket: str, Key: str) -> dict:
+            """
+            Pretend to read an object
+            """
+            return {'Body': io.BytesIO(objects[(Bucket, Key)])}
+
+        def head_object(self, Bucket: str, Key: str) -> dict:
+            """
+            Pretend to check that an object exists
+            """
+            return {'ContentLength': len(objects[(Bucket, Key)])}
+
+        def generate_presigned_url(self, method: str, Params: dict, ExpiresIn: int) -> str:
+            """
+            Pretend to sign a URL
+            """
+            return f'https://{Params["Bucket"]}/{Params["Key"]}?{method}&{ExpiresIn}&{Params["ResponseContentEncoding"]}'
+
+    monkeypatch.setattr(wrfcloud.api.actions.wrf, 'get_aws_client', lambda service: _FakeS3())
+    monkeypatch.setattr(wrfcloud.api.actions.action, 'get_aws_client', lambda service: _FakeS3())
+    monkeypatch.setattr(wrfcloud.api.actions.wrf, '_LAYER_LOCATIONS', OrderedDict())
+
+    def _get_layer(delivery: str, variable: str = '2t') -> GetWrfGeoJson:
+        request = {'job_id': 'P1', 'valid_time': 1669075200, 'variable': variable, 'delivery': delivery}
+        action = GetWrfGeoJson(ref_id=create_reference_id(), request=request)
+        action.run()
+        return action
+
+    # inline data is unzipped, and gzip data is passed through as it is stored
+    action = _get_layer(GetWrfGeoJson.DELIVERY_INLINE)
+    assert base64.b64decode(action.response['geojson']) == b'{"p1": "2t"}'
+    assert action.response['delivery'] == GetWrfGeoJson.DELIVERY_INLINE
+    action = _get_layer(GetWrfGeoJson.DELIVERY_GZIP)
+    assert base64.b64decode(action.response['geojson']) == objects[('wrfcloud-output', key)]
+
+    # the url delivery signs a short-lived URL without reading the object
+    action = _get_layer(GetWrfGeoJson.DELIVERY_URL)
+    assert 'geojson' not in action.response
+    assert action.response['url'] == f'https://wrfcloud-output/{key}?get_object&300&gzip'
+    assert action.response['expires_in'] == GetWrfGeoJson.URL_EXPIRATION
+
+    # unknown deliveries are rejected
+    action = _get_layer('email')
+    assert not action.success
+    assert action.errors == ['Invalid delivery: email']
+
+
+def test_get_wrf_geojson_batch(monkeypatch) -> None:
+    """
+    Test reading the layers of many valid times with one GetWrfGeoJsonBatch request
+    :return: None
+    """
+    times = [1669075200 + 3600 * i for i in range(4)]
+    objects = {f'jobs/P1/2t_{t}.geojson.gz': gzip.compress(json.dumps({'t': t}).encode()) for t in times}
+    layers = [{'variable_name': '2t', 'dt': t, 'layer_data': f's3://bucket/jobs/P1/2t_{t}.geojson.gz'} for t in times]
+    layers.append({'variable_name': 'wind', 'dt': times[0], 'layer_data': 's3://bucket/jobs/P1/wind.geojson.gz'})
+    job_reads = []
+
+    class _FakeS3:
+        """
+        S3 client that reads the layers and signs URLs to them
+        """
+        def get_object(self, Bucket: str, Key: str) -> dict:
+            """
+            Pretend to read an object
+            """
+            return {'Body': io.BytesIO(objects[Key])}
+
+        def generate_presigned_url(self, method: str, Params: dict, ExpiresIn: int) -> str:
+            """
+            Pretend to sign a URL
+            """
+            return f'https://{Params["Bucket"]}/{Params["Key"]}'
+
+    def _get_job_by_id(_, job_id: str) -> WrfJob:
+        job_reads.append(job_id)
+        return WrfJob({'job_id': job_id, 'layers': layers})
+
+    monkeypatch.setattr(wrfcloud.api.actions.wrf, 'get_aws_client', lambda service: _FakeS3())
+    monkeypatch.setattr(wrfcloud.api.actions.action, 'get_aws_client', lambda service: _FakeS3())
+    monkeypatch.setattr(wrfcloud.api.actions.wrf.JobDao, 'get_job_by_id', _get_job_by_id)
+
+    def _get_layers(**request) -> GetWrfGeoJsonBatch:
+        action = GetWrfGeoJsonBatch(ref_id=create_reference_id(), request={'job_id': 'P1', 'variable': '2t', **request})
+        action.run()
+        return action
+
+    # a list of valid times reads the job once and reports the times without a layer
+    action = _get_layers(valid_times=[times[2], times[0], 1])
+    assert [json.loads(base64.b64decode(frame['geojson'])) for frame in action.response['frames']] == \
+        [{'t': times[2]}, {'t': times[0]}]
+    assert action.response['missing_times'] == [1]
+    assert action.response['remaining_times'] == []
+    assert job_reads == ['P1']
+
+    # a time range gets the layers of the variable in time order
+    action = _get_layers(start_time=times[1], end_time=times[3], delivery=GetWrfGeoJson.DELIVERY_GZIP)
+    assert [json.loads(gzip.decompress(base64.b64decode(frame['geojson'])))['t']
+            for frame in action.response['frames']] == times[1:]
+
+    # signed URLs are returned instead of the data
+    action = _get_layers(start_time=times[0], end_time=times[3], delivery=GetWrfGeoJson.DELIVERY_URL)
+    assert [frame['url'] for frame in action.response['frames']] == \
+        [f'https://bucket/jobs/P1/2t_{t}.geojson.gz' for t in times]
+
+    # a frame that cannot be read is missing, and the other frames are still returned
+    unreadable = objects.pop(f'jobs/P1/2t_{times[1]}.geojson.gz')
+    action = _get_layers(start_time=times[0], end_time=times[3])
+    assert [frame['valid_time'] for frame in action.response['frames']] == [times[0]] + times[2:]
+    assert action.response['missing_times'] == [times[1]]
+    objects[f'jobs/P1/2t_{times[1]}.geojson.gz'] = unreadable
+
+    # frames past the maximum number of frames in a time range are left for the next request
+    monkeypatch.setattr(GetWrfGeoJsonBatch, 'MAX_FRAMES', 3)
+    action = _get_layers(start_time=times[0], end_time=times[3])
+    assert [frame['valid_time'] for frame in action.response['frames']] == times[:3]
+    assert action.response['remaining_times'] == times[3:]
+
+    # frames that do not fit in the encoded response are left for the next request
+    monkeypatch.setattr(GetWrfGeoJsonBatch, 'MAX_FRAMES', 240)
+    all_frames = _get_layers(start_time=times[0], end_time=times[3]).response['frames']
+    max_size = len(base64.b64encode(gzip.compress(json.dumps(all_frames).encode()))) - 1
+    monkeypatch.setattr(GetWrfGeoJsonBatch, 'MAX_RESPONSE_BYTES', max_size)
+    action = _get_layers(start_time=times[0], end_time=times[3])
+    frames = action.response['frames']
+    assert 0 < len(frames) < len(times)
+    assert [frame['valid_time'] for frame in frames] + action.response['remaining_times'] == times
+    assert len(base64.b64encode(gzip.compress(json.dumps(frames).encode()))) <= max_size
+
+    # the request needs either a list of valid times or a time range
+    assert not _get_layers(valid_times=times, start_time=times[0]).success
+    assert not _get_layers().success
+    assert not _get_layers(valid_times=[str(times[0])]).success
@@ -10,6 +10,7 @@ from wrfcloud.api.audit import AuditEntry
 from wrfcloud.api.audit import save_audit_log_entry
 from wrfcloud.api.audit import get_audit_log_entry
 from wrfcloud.api.audit import get_all_audit_logs
+from wrfcloud.api.audit import get_user_audit_logs
 from wrfcloud.api.handler import create_reference_id
 from helper import _test_setup, _test_teardown
 
@@ -99,3 +100,38 @@ def test_audit_dao_read_entry() -> None:
 
     # teardown the test resources
     assert _test_teardown()
+
+
+def test_audit_dao_user_entries() -> None:
+    """
+    Test reading the entries for a user and time range
+    :return: None
+    """
+    # set up the test
+    assert _test_setup()
+
+    # create entries for two users and for unauthenticated requests
+    for n in range(30):
+        audit = AuditEntry()
+        audit.ref_id = create_reference_id()
+        audit.action = 'Login'
+        audit.username = [None, 'user1@example.com', 'user2@example.com'][n % 3]
+        audit.start_time = 1700000000.5 + n
+        assert save_audit_log_entry(audit)
+
+    # get all entries for a user in order of start time
+    entries = get_user_audit_logs('user1@example.com')
+    assert [entry.start_time for entry in entries] == [1700000000.5 + n for n in range(1, 30, 3)]
+
+    # get the entries in a time range
+    entries = get_user_audit_logs('user2@example.com', start_time=1700000010, end_time=1700000020)
+    assert [entry.start_time for entry in entries] == [1700000011.5, 1700000014.5, 1700000017.5]
+    assert len(get_user_audit_logs('user2@example.com', start_time=1700000020)) == 4
+    assert len(get_user_audit_logs('user2@example.com', end_time=1700000020)) == 6
+    assert get_user_audit_logs('nobody@example.com') == []
+
+    # the unauthenticated entries are still stored
+    assert len(get_all_audit_logs()) == 30
+
+    # teardown the test resources
+    assert _test_teardown()
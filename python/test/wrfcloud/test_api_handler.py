@@ -8,6 +8,8 @@ import secrets
 import json
 import gzip
 import base64
+import subprocess
+import sys
 import wrfcloud
 from wrfcloud.user import update_user_in_system
 from wrfcloud.user import add_user_to_system
@@ -22,6 +24,10 @@ from helper import _test_setup, _test_teardown, _get_sample_user
 init_environment(env='test')
 os.environ['JWT_KEY'] = secrets.token_hex(64)
 
+# Packages that install_bootstrap.sh removes from the API Lambda layer
+LAMBDA_LAYER_EXCLUDED = {'pygrib', 'matplotlib', 'numpy', 'pyproj', 'netCDF4', 'PIL', 'fontTools', 'kiwisolver',
+                         'cftime', 'contourpy', 'mpl_toolkits'}
+
 
 def test_lambda_handler_valid_request() -> None:
     """
@@ -267,3 +273,21 @@ def test_lambda_handler_eventbridge_parsing():
     # response = lambda_handler(event, None)
     # runwrf_response = json.loads(gzip.decompress(base64.b64decode(response['body'].decode())).decode())
     # assert runwrf_response['ok']
+
+
+def test_lambda_handler_imports() -> None:
+    """
+    Test that the API imports without the packages that install_bootstrap.sh removes from the Lambda layer
+    :return: None
+    """
+    script = '\n'.join([
+        'import sys',
+        'class _Blocker:',
+        '    def find_spec(self, name, path, target=None):',
+        '        if name.split(".")[0] in ' + repr(LAMBDA_LAYER_EXCLUDED) + ':',
+        '            raise ImportError(name)',
+        'sys.meta_path.insert(0, _Blocker())',
+        'import wrfcloud.api.handler'
+    ])
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=False)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,139 @@
+"""
+Test the wrfcloud.runtime.tools.derivations module
+"""
+
+
+from collections import Counter
+import numpy
+import pytest
+from netCDF4 import Dataset
+import wrfcloud.runtime.tools.derivations
+from wrfcloud.runtime.tools.derivations import derive_fields, CACHE_VARIABLES, SHARED_DIAGNOSTICS
+
+
+# Raw inputs of the diagnostics in derive_products.yaml
+_DIAGNOSTIC_INPUTS = {
+    'slp': ['P', 'PB', 'PH', 'PHB', 'T', 'QVAPOR'],
+    'td2': ['PSFC', 'Q2'],
+    'rh2': ['T2', 'PSFC', 'Q2'],
+    'mdbz': ['P', 'PB', 'T', 'QVAPOR', 'QRAIN', 'QSNOW', 'QGRAUP'],
+    'pw': ['P', 'PB', 'PH', 'PHB', 'T', 'QVAPOR'],
+    'rh': ['P', 'PB', 'T', 'QVAPOR'],
+    'temp': ['P', 'PB', 'T'],
+    'wa': ['W'],
+    'height': ['PH', 'PHB'],
+    'wspd_wdir': ['U', 'V'],
+    'wspd_wdir10': ['U10', 'V10', 'SINALPHA', 'COSALPHA'],
+    'cloudfrac': ['P', 'PB', 'QVAPOR', 'HGT']
+}
+
+# Fields that wrf-python takes from a diagnostic it computes as a whole, with their descriptions
+_DIAGNOSTIC_PARTS = {
+    'wspd': ('wspd_wdir', 0, 'wspd in projection space'),
+    'wdir': ('wspd_wdir', 1, 'wdir in projection space'),
+    'wspd10': ('wspd_wdir10', 0, '10m wspd in projection space'),
+    'wdir10': ('wspd_wdir10', 1, '10m wdir in projection space'),
+    'low_cloudfrac': ('cloudfrac', 0, 'low clouds'),
+    'mid_cloudfrac': ('cloudfrac', 1, 'mid clouds'),
+    'high_cloudfrac': ('cloudfrac', 2, 'high clouds')
+}
+
+
+def _create_wrf_file(path: str) -> None:
+    """
+    Write a small file with the raw WRF variables used by the derivations
+    :param path: Path of the file
+    :return: None
+    """
+    rng = numpy.random.default_rng(0)
+    with Dataset(path, mode='w') as data:
+        data.TITLE = ' OUTPUT FROM WRF'
+        data.createDimension('Time', None)
+        data.createDimension('DateStrLen', 19)
+        data.createDimension('south_north', 3)
+        data.createDimension('west_east', 4)
+        data.createVariable('Times', 'S1', ('Time', 'DateStrLen'))
+        data['Times'][0] = numpy.array(list('2023-01-02_03:00:00'), dtype='S1')
+        for name in ['XLAT', 'XLONG'] + CACHE_VARIABLES:
+            data.createVariable(name, numpy.float32, ('Time', 'south_north', 'west_east'))
+            data[name][0] = rng.random((3, 4))
+            data[name].units = 'm'
+
+
+def test_derive_fields_cache(tmp_path, monkeypatch) -> None:
+    """
+    Test that the derived fields are the same with the shared inputs and diagnostics, and that each shared
+    input is read and each shared diagnostic computed once
+    :return: None
+    """
+    xarray = pytest.importorskip('xarray')
+    reads = Counter()
+    computes = Counter()
+
+    def _read(in_data: Dataset, name: str, cache: dict) -> xarray.DataArray:
+        if cache is not None and name in cache:
+            return cache[name]
+        reads[name] += 1
+        return xarray.DataArray(in_data[name][0].data, dims=('south_north', 'west_east'),
+                                attrs={'description': name, 'units': in_data[name].units})
+
+    def _extract_vars(in_data: Dataset, timeidx: int, names: list) -> dict:
+        return {name: _read(in_data, name, None) for name in names}
+
+    def _getvar(in_data: Dataset, name: str, cache: dict = None, **kwargs) -> xarray.DataArray:
+        if name in in_data.variables:
+            return _read(in_data, name, cache)
+        if name in _DIAGNOSTIC_PARTS:
+            diagnostic_name, index, description = _DIAGNOSTIC_PARTS[name]
+            var = _getvar(in_data, diagnostic_name, cache, **kwargs)[index, :]
+            var.attrs['description'] = description
+            return var
+
+        computes[name] += 1
+        values = sum(_read(in_data, input_name, cache).values for input_name in _DIAGNOSTIC_INPUTS[name])
+        attrs = {'description': name, 'units': kwargs.get('units', '-')}
+        if name in ['wspd_wdir', 'wspd_wdir10', 'cloudfrac']:
+            parts = numpy.stack([values * (part + 1) for part in range(3 if name == 'cloudfrac' else 2)])
+            return xarray.DataArray(parts, dims=(name, 'south_north', 'west_east'), attrs=attrs)
+        return xarray.DataArray(values, dims=('south_north', 'west_east'), attrs=attrs)
+
+    def _vinterp(in_data: Dataset, field: xarray.DataArray, vert_coord: str, interp_levels: list,
+                 extrapolate: bool, cache: dict) -> xarray.DataArray:
+        pressure = _read(in_data, 'P', cache).values + _read(in_data, 'PB', cache).values
+        values = numpy.stack([field.values * pressure / level for level in interp_levels])
+        return xarray.DataArray(values, dims=('interp_level', *field.dims), attrs=field.attrs)
+
+    monkeypatch.setattr(wrfcloud.runtime.tools.derivations, 'extract_vars', _extract_vars)
+    monkeypatch.setattr(wrfcloud.runtime.tools.derivations, 'getvar', _getvar)
+    monkeypatch.setattr(wrfcloud.runtime.tools.derivations, 'vinterp', _vinterp)
+    in_file = str(tmp_path / 'wrfout_d01_2023-01-02_03:00:00')
+    _create_wrf_file(in_file)
+
+    # derive the fields one at a time
+    monkeypatch.setattr(wrfcloud.runtime.tools.derivations, 'CACHE_VARIABLES', [])
+    monkeypatch.setattr(wrfcloud.runtime.tools.derivations, 'SHARED_DIAGNOSTICS', {})
+    expected_file = derive_fields(in_file, str(tmp_path / 'expected'))
+    assert expected_file is not None
+    assert reads['P'] > 1
+    assert computes['cloudfrac'] == 3
+
+    # derive the fields with the shared inputs and diagnostics
+    monkeypatch.setattr(wrfcloud.runtime.tools.derivations, 'CACHE_VARIABLES', CACHE_VARIABLES)
+    monkeypatch.setattr(wrfcloud.runtime.tools.derivations, 'SHARED_DIAGNOSTICS', SHARED_DIAGNOSTICS)
+    reads.clear()
+    computes.clear()
+    timings = {}
+    out_file = derive_fields(in_file, str(tmp_path / 'derived'), timings)
+    assert out_file is not None
+    assert reads == Counter(CACHE_VARIABLES)
+    assert computes['wspd_wdir'] == 1
+    assert computes['wspd_wdir10'] == 1
+    assert computes['cloudfrac'] == 1
+    assert 'shared inputs' in timings
+
+    with Dataset(expected_file) as expected_data, Dataset(out_file) as out_data:
+        assert list(out_data.variables) == list(expected_data.variables)
+        for name, expected in expected_data.variables.items():
+            assert out_data[name].dimensions == expected.dimensions
+            assert out_data[name].__dict__ == expected.__dict__
+            assert numpy.array_equal(out_data[name][:], expected[:])
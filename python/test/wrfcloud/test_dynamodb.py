@@ -71,6 +71,45 @@ def test_update_and_read_item() -> None:
     assert _test_teardown()
 
 
+def test_conditional_update(monkeypatch) -> None:
+    """
+    Test updating and removing attributes in one request, with and without a condition
+    :return: None
+    """
+    # set up the test resources
+    assert _test_setup()
+
+    # create DAO and add the item to the database
+    dao = DynamoDao(TABLE, KEY_FIELDS, ENDPOINT_URL)
+    assert dao.put_item({'id': 'dynamo1', 'name': 'first', 'status': 'new', 'my_value': 3})
+
+    # count the requests sent to the database
+    client = dao._get_client()
+    requests = []
+    update_item = client.update_item
+    monkeypatch.setattr(client, 'update_item', lambda **kwargs: requests.append(kwargs) or update_item(**kwargs))
+
+    # set and remove attributes named with reserved words in a single request
+    assert dao.update_item({'id': 'dynamo1', 'name': 'second', 'status': None, 'my_value': 4})
+    assert dao.get_item({'id': 'dynamo1'}) == {'id': 'dynamo1', 'name': 'second', 'my_value': 4}
+    assert len(requests) == 1
+
+    # update only if the condition is met
+    assert dao.update_item({'id': 'dynamo1', 'my_value': 5}, 'attribute_exists(id)')
+    assert dao.update_item({'id': 'dynamo1', 'my_value': 6}, 'my_value < :max', {':max': 6})
+    assert not dao.update_item({'id': 'dynamo1', 'my_value': 7}, 'my_value < :max', {':max': 6})
+    assert not dao.update_item({'id': 'dynamo2', 'my_value': 1}, 'attribute_exists(id)')
+    assert dao.get_item({'id': 'dynamo1'})['my_value'] == 6
+    assert dao.get_item({'id': 'dynamo2'}) is None
+    assert len(requests) == 5
+
+    # nothing to update
+    assert not dao.update_item({'id': 'dynamo1'})
+
+    # teardown the test resources
+    assert _test_teardown()
+
+
 def test_create_and_delete_item() -> None:
     """
     Test the operations to create and delete an item
@@ -167,6 +206,201 @@ def test_create_complex_item() -> None:
     assert _test_teardown()
 
 
+def test_iter_items() -> None:
+    """
+    Test iterating over the items with projections, filters, and parallel segments
+    :return: None
+    """
+    # set up the test resources
+    assert _test_setup()
+
+    # create dao and sample data
+    dao = DynamoDao(TABLE, KEY_FIELDS, ENDPOINT_URL)
+    assert dao.batch_put_items([{'id': f'dynamo{n}', 'my_value': n, 'name': f'item {n}'} for n in range(50)])
+
+    # iterate over all the items in one or more segments
+    assert sorted(item['my_value'] for item in dao.iter_items()) == list(range(50))
+    assert sorted(item['my_value'] for item in dao.iter_items(segments=4)) == list(range(50))
+
+    # read only some attributes, including a reserved word, of the items that match a filter
+    items = dao.get_all_items(projection=['id', 'name'], filter_expression='my_value >= :min',
+                              expression_values={':min': 45}, segments=3)
+    assert sorted(item['name'] for item in items) == [f'item {n}' for n in range(45, 50)]
+    assert all(set(item.keys()) == {'id', 'name'} for item in items)
+
+    # stop iterating early
+    iterator = dao.iter_items(segments=4)
+    assert next(iterator)['id'].startswith('dynamo')
+    iterator.close()
+
+    # teardown the test resources
+    assert _test_teardown()
+
+
+def test_query() -> None:
+    """
+    Test querying the table and a secondary index, one page at a time
+    :return: None
+    """
+    # create a table with an index on group and rank
+    dao = DynamoDao(TABLE, KEY_FIELDS, ENDPOINT_URL, index_fields=['group', 'rank'])
+    dao.delete_table(TABLE)
+    assert dao.create_table(ATTRIBUTE_DEFINITIONS + [{'AttributeName': 'group', 'AttributeType': 'S'},
+                                                     {'AttributeName': 'rank', 'AttributeType': 'N'}],
+                            KEY_SCHEMA,
+                            [{'IndexName': 'group-rank-index',
+                              'KeySchema': [{'AttributeName': 'group', 'KeyType': 'HASH'},
+                                            {'AttributeName': 'rank', 'KeyType': 'RANGE'}],
+                              'Projection': {'ProjectionType': 'ALL'}}])
+
+    # items without a group are stored, but are not in the index
+    items = [{'id': f'dynamo{n}', 'group': ['even', 'odd'][n % 2], 'rank': n} for n in range(40)]
+    assert dao.batch_put_items(items + [{'id': 'dynamo40', 'group': None, 'rank': 40}])
+    assert dao.put_item({'id': 'dynamo41', 'group': None, 'rank': 41})
+    assert 'group' not in dao.get_item({'id': 'dynamo41'})
+
+    # query the table key
+    found, last_key = dao.query('id = :id', {':id': 'dynamo3'})
+    assert found == [items[3]] and last_key is None
+
+    # query the index with a range, in both directions
+    found, _ = dao.query('#g = :group AND #r BETWEEN :low AND :high', {':group': 'odd', ':low': 10, ':high': 20},
+                         index_name='group-rank-index', expression_names={'#g': 'group', '#r': 'rank'})
+    assert [item['rank'] for item in found] == [11, 13, 15, 17, 19]
+    found, _ = dao.query('#g = :group', {':group': 'even'}, index_name='group-rank-index',
+                         expression_names={'#g': 'group'}, scan_forward=False, projection=['id'])
+    assert found == [{'id': f'dynamo{n}'} for n in range(38, -1, -2)]
+
+    # read the index one page at a time
+    pages = []
+    last_key = None
+    while True:
+        found, last_key = dao.query('#g = :group', {':group': 'even'}, index_name='group-rank-index',
+                                    expression_names={'#g': 'group'}, limit=6, start_key=last_key)
+        pages.append([item['rank'] for item in found])
+        if last_key is None:
+            break
+    assert [len(page) for page in pages[:3]] == [6, 6, 6]
+    assert sum(pages, []) == list(range(0, 40, 2))
+
+    # teardown the test resources
+    assert _test_teardown()
+
+
+def test_codec() -> None:
+    """
+    Test converting values to and from dynamodb attribute values
+    :return: None
+    """
+    class _Name(str):
+        """
+        A subclass of a standard type
+        """
+
+    data = {'s': 'text', 'i': 7, 'f': 2.5, 't': True, 'n': None, 'b': b'xy', 'sub': _Name('name'),
+            'l': ['a', 1, 1.5, False, None, {'k': 'v'}], 'm': {'lat': 40.0, 'lon': -105, 'deep': {'x': [1, 2]}},
+            'e': [], 'em': {}}
+    dynamo = {'s': {'S': 'text'}, 'i': {'N': '7'}, 'f': {'N': '2.5'}, 't': {'BOOL': True}, 'n': {'NULL': True},
+              'b': {'B': b'xy'}, 'sub': {'S': 'name'},
+              'l': {'L': [{'S': 'a'}, {'N': '1'}, {'N': '1.5'}, {'BOOL': False}, {'NULL': True},
+                          {'M': {'k': {'S': 'v'}}}]},
+              'm': {'M': {'lat': {'N': '40.0'}, 'lon': {'N': '-105'},
+                          'deep': {'M': {'x': {'L': [{'N': '1'}, {'N': '2'}]}}}}},
+              'e': {'L': []}, 'em': {'M': {}}}
+    assert DynamoDao._dict_to_dynamo(data) == dynamo
+    assert DynamoDao._dynamo_to_dict(dynamo) == data
+
+    # lists become sets if allowed
+    assert DynamoDao._dict_to_dynamo({'ss': ['a', 'b'], 'ns': [1, 2.5], 'bs': [b'a'], 'l': ['a', 1], 'e': []},
+                                     set_ok=True) == \
+        {'ss': {'SS': ['a', 'b']}, 'ns': {'NS': ['1', '2.5']}, 'bs': {'BS': [b'a']},
+         'l': {'L': [{'S': 'a'}, {'N': '1'}]}, 'e': {'SS': []}}
+    assert DynamoDao._dynamo_to_dict({'ns': {'NS': ['1.5', '2']}, 'ni': {'NS': ['1', '2']}}) == \
+        {'ns': [1.5, 2.0], 'ni': [1, 2]}
+
+    # single values and unsupported types
+    assert DynamoDao._dict_to_dynamo({'k': 'v'}, recursed=True) == {'M': {'k': {'S': 'v'}}}
+    assert DynamoDao._dynamo_to_dict({'N': '3'}, recursed=True) == 3
+    try:
+        DynamoDao._dynamo_to_dict({'X': {'Y': '1'}})
+        assert False
+    except RuntimeError:
+        pass
+
+
+def test_batch_items() -> None:
+    """
+    Test the batch operations to put, get, and delete many items
+    :return: None
+    """
+    # set up the test resources
+    assert _test_setup()
+
+    # create dao
+    dao = DynamoDao(TABLE, KEY_FIELDS, ENDPOINT_URL)
+
+    # put more items than fit in a single request, including a repeated key
+    items = [{'id': f'dynamo{n}', 'my_value': n*n} for n in range(60)]
+    assert dao.batch_put_items(items + [{'id': 'dynamo0', 'my_value': -1}])
+    assert len(dao.get_all_items()) == 60
+    assert dao.get_item({'id': 'dynamo0'})['my_value'] == -1
+
+    # get more items than fit in a single request, skipping missing keys and repeated keys
+    keys = [{'id': f'dynamo{n}'} for n in reversed(range(120))] + [{'id': 'dynamo5'}]
+    items_ = dao.batch_get_items(keys)
+    assert [item['id'] for item in items_] == [f'dynamo{n}' for n in reversed(range(60))]
+    assert items_[-2]['my_value'] == 1
+
+    # delete some of the items
+    assert dao.batch_delete_items(items[:30])
+    assert sorted(item['id'] for item in dao.get_all_items()) == sorted(item['id'] for item in items[30:])
+    assert dao.batch_get_items([]) == []
+
+    # teardown the test resources
+    assert _test_teardown()
+
+
+def test_batch_unprocessed_items() -> None:
+    """
+    Test that unprocessed items and keys are sent again
+    :return: None
+    """
+    class _ThrottledClient:
+        """
+        Client that leaves the last item of every request unprocessed
+        """
+        def __init__(self):
+            self.requests = []
+
+        def batch_write_item(self, RequestItems: dict) -> dict:
+            self.requests.append(RequestItems[TABLE])
+            return {'UnprocessedItems': {TABLE: RequestItems[TABLE][1:]} if len(RequestItems[TABLE]) > 1 else {}}
+
+        def batch_get_item(self, RequestItems: dict) -> dict:
+            keys = RequestItems[TABLE]['Keys']
+            self.requests.append(keys)
+            return {'Responses': {TABLE: [{**keys[0], 'my_value': {'N': '1'}}]},
+                    'UnprocessedKeys': {TABLE: {'Keys': keys[1:]}} if len(keys) > 1 else {}}
+
+    dao = DynamoDao(TABLE, KEY_FIELDS, ENDPOINT_URL)
+    dao.BATCH_BACKOFF = 0
+    dao.client = _ThrottledClient()
+
+    # every item is eventually written, one more on each attempt
+    assert dao.batch_put_items([{'id': f'dynamo{n}'} for n in range(3)])
+    assert [len(request) for request in dao.client.requests] == [3, 2, 1]
+
+    # every key is eventually read
+    dao.client.requests = []
+    assert len(dao.batch_get_items([{'id': f'dynamo{n}'} for n in range(3)])) == 3
+    assert [len(request) for request in dao.client.requests] == [3, 2, 1]
+
+    # give up after the maximum number of attempts
+    dao.client.requests = []
+    assert not dao.batch_delete_items([{'id': f'dynamo{n}'} for n in range(20)])
+    assert len(dao.client.requests) == DynamoDao.BATCH_MAX_ATTEMPTS
+
+
 def _test_setup() -> bool:
     """
     Setup required test resources (i.e. DynamoDB table in local dynamodb)
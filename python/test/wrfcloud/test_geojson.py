@@ -0,0 +1,385 @@
+"""
+Test the wrfcloud.runtime.tools.geojson module
+"""
+
+
+import json
+from collections import Counter
+from datetime import datetime
+from multiprocessing import resource_tracker
+from gzip import decompress
+import numpy
+import pytest
+from matplotlib.path import Path
+from netCDF4 import Dataset
+from numpy.ma.core import MaskedArray
+from wrfcloud.system import init_environment
+from wrfcloud.runtime.tools.converter_pool import ConverterPool, remove_missing_layers
+from wrfcloud.jobs import WrfLayer
+from wrfcloud.runtime.tools.field_cache import FieldCache
+from wrfcloud.runtime.tools.geojson import GeoJson, automate_geojson_products, submit_geojson_products
+from wrfcloud.runtime.tools.layer_encoding import encode_features, decode_layer
+from wrfcloud.runtime.tools.simplify import simplify_ring, simplify_polygons
+
+
+# initialize the test environment
+init_environment(env='test')
+
+
+def _get_synthetic_converter(nx: int = 60, ny: int = 40) -> GeoJson:
+    """
+    Get a GeoJson converter with a synthetic, slightly curved lat/lon grid
+    :param nx: Number of grid points in the X dimension
+    :param ny: Number of grid points in the Y dimension
+    :return: GeoJson converter with grid_lat and grid_lon set
+    """
+    converter = GeoJson('synthetic.nc', 'netcdf', 'temp_2m', [-15, 45], 2, 'viridis')
+    x, y = numpy.meshgrid(numpy.arange(nx), numpy.arange(ny))
+    converter.grid_lat = MaskedArray(10 + y * 0.05 + x * 0.001)
+    converter.grid_lon = MaskedArray(-80 + x * 0.05 - y * 0.002)
+    return converter
+
+
+def _get_synthetic_grid(nx: int = 60, ny: int = 40) -> MaskedArray:
+    """
+    Get a synthetic data grid with peaks, valleys, and a masked corner
+    :param nx: Number of grid points in the X dimension
+    :param ny: Number of grid points in the Y dimension
+    :return: Synthetic data grid
+    """
+    x, y = numpy.meshgrid(numpy.arange(nx), numpy.arange(ny))
+    grid = 15 + 20 * numpy.sin(x / 5.0) * numpy.cos(y / 4.0)
+    return numpy.ma.masked_where((x > 50) & (y < 8), grid)
+
+
+def test_grid_to_lonlat_array() -> None:
+    """
+    Test that the vectorized grid projection matches the per-point projection
+    :return: None
+    """
+    converter = _get_synthetic_converter()
+
+    # random fractional points, integer points, and points on the last row/column
+    rng = numpy.random.default_rng(0)
+    points = numpy.column_stack([rng.uniform(0, 58.99, 500), rng.uniform(0, 38.99, 500)])
+    points = numpy.vstack([points, [[0, 0], [59, 39], [12, 7], [59, 20.5], [30.5, 39]]])
+
+    expected = [converter._grid_to_lonlat(point[0], point[1]) for point in points]
+    actual = converter._polygon_to_coord_array(points)
+
+    assert len(actual) == len(expected)
+    for actual_point, expected_point in zip(actual, expected):
+        assert actual_point[0] == expected_point[0]
+        assert actual_point[1] == expected_point[1]
+
+    # values half-way between two 5 decimal values are rounded the same way, where Python's round differs
+    assert round(1.000005, 5) != numpy.round(1.000005, 5)
+    converter.grid_lat = MaskedArray(numpy.repeat(numpy.arange(40.0)[:, None] * 1000, 60, axis=1))
+    converter.grid_lon = MaskedArray(numpy.full((40, 60), 0.000025))
+    expected = converter._grid_to_lonlat(1.0, 1.000005)
+    assert expected == (2e-05, 1000.0)
+    assert converter._polygon_to_coord_array(numpy.array([[1.0, 1.000005]])) == [expected]
+
+    # an empty polygon has no coordinates
+    assert converter._polygon_to_coord_array(numpy.empty((0, 2))) == []
+
+
+def test_contourpy_features() -> None:
+    """
+    Test creating features with the contourpy engine
+    :return: None
+    """
+    converter = _get_synthetic_converter()
+    features = converter._create_features(_get_synthetic_grid())
+
+    assert len(features) > 0
+    fill_colors = set()
+    for feature in features:
+        assert feature['geometry']['type'] == 'MultiPolygon'
+        for ring in feature['geometry']['coordinates'][0]:
+            # rings are closed
+            assert ring[0] == ring[-1]
+        fill_colors.add(feature['properties']['fill'])
+
+    # the lowest band below the range and the highest band above the range are not in the data
+    assert '#440154' not in fill_colors
+    assert '#fde725' not in fill_colors
+    assert len(fill_colors) > 10
+
+
+def test_contour_engines_match() -> None:
+    """
+    Test that the contourpy and pyplot engines create identical features
+    :return: None
+    """
+    grid = _get_synthetic_grid()
+    features = {}
+    for engine in GeoJson.CONTOUR_ENGINES:
+        converter = _get_synthetic_converter()
+        converter.contour_engine = engine
+        try:
+            features[engine] = json.dumps(converter._create_features(grid))
+        except AttributeError:
+            # ContourSet.collections was removed in matplotlib 3.10
+            pytest.skip('pyplot engine is not supported by this matplotlib version')
+
+    assert features['contourpy'] == features['pyplot']
+
+
+def test_invalid_contour_engine() -> None:
+    """
+    Test that an unknown contour engine is rejected
+    :return: None
+    """
+    converter = _get_synthetic_converter()
+    converter.contour_engine = 'junk'
+    with pytest.raises(ValueError):
+        converter._create_features(_get_synthetic_grid())
+
+
+def _write_synthetic_netcdf(path: str, nx: int = 60, ny: int = 40) -> None:
+    """
+    Write a small derived WRF NetCDF file with a 2D and a 3D field
+    :param path: Full path to the output file
+    :param nx: Number of grid points in the X dimension
+    :param ny: Number of grid points in the Y dimension
+    """
+    x, y = numpy.meshgrid(numpy.arange(nx), numpy.arange(ny))
+    with Dataset(path, mode='w') as wrf:
+        wrf.createDimension('Time', None)
+        wrf.createDimension('DateStrLen', 19)
+        wrf.createDimension('south_north', ny)
+        wrf.createDimension('west_east', nx)
+        wrf.createDimension('interp_level', 2)
+        wrf.createVariable('Times', 'S1', ('Time', 'DateStrLen'))
+        wrf['Times'][0] = numpy.array(list('2023-01-02_03:00:00'), dtype='S1')
+        wrf.createVariable('XLAT', 'f4', ('Time', 'south_north', 'west_east'))
+        wrf['XLAT'][0] = 10 + y * 0.05
+        wrf.createVariable('XLONG', 'f4', ('Time', 'south_north', 'west_east'))
+        wrf['XLONG'][0] = -80 + x * 0.05
+        wrf.createVariable('interp_level', 'f4', ('interp_level',))
+        wrf['interp_level'][:] = [1000, 850]
+        wrf.createVariable('temp_2m', 'f4', ('south_north', 'west_east'))
+        wrf['temp_2m'][:] = _get_synthetic_grid(nx, ny).filled(numpy.nan)
+        wrf.createVariable('temp_pres', 'f4', ('interp_level', 'south_north', 'west_east'))
+        wrf['temp_pres'][:] = numpy.stack([_get_synthetic_grid(nx, ny), _get_synthetic_grid(nx, ny) - 10])
+
+
+def test_field_cache(tmp_path, monkeypatch) -> None:
+    """
+    Test reading fields once and sharing them through shared memory
+    :return: None
+    """
+    wrf_file = str(tmp_path / 'wrfderive_d01_2023-01-02_03:00:00.nc')
+    _write_synthetic_netcdf(wrf_file)
+
+    cache = FieldCache(wrf_file, 'netcdf')
+    assert cache.load([('temp_2m', None), ('temp_pres', 850), ('temp_pres', 500), ('junk', None)])
+    assert set(cache.grids.keys()) == {('temp_2m', None), ('temp_pres', 850)}
+    assert cache.get_valid_time('temp_2m') == datetime(2023, 1, 2, 3).timestamp()
+
+    # shared arrays are identical, read-only copies with masked values set to NaN, and workers that attach
+    # to them leave them to the resource tracker of the process that created them
+    cache.grids[('count', None)] = numpy.ma.masked_equal(numpy.arange(6, dtype=numpy.int16), 3)
+    shared = cache.share()
+    registered = []
+    monkeypatch.setattr(resource_tracker, 'register', lambda name, rtype: registered.append(name))
+    try:
+        shm, grid = shared['grids'][('temp_pres', 850)].attach()
+        assert not grid.flags.writeable
+        assert grid.dtype == cache.get_grid('temp_pres', 850).dtype == numpy.float32
+        assert numpy.array_equal(grid, cache.get_grid('temp_pres', 850).filled(numpy.nan), equal_nan=True)
+        del grid
+        shm.close()
+
+        shm, grid = shared['grids'][('count', None)].attach()
+        assert grid.dtype == numpy.float32
+        assert numpy.array_equal(grid, [0, 1, 2, numpy.nan, 4, 5], equal_nan=True)
+        del grid
+        shm.close()
+        assert not registered
+    finally:
+        cache.close()
+
+
+def test_automate_geojson_products(tmp_path) -> None:
+    """
+    Test creating all products from a file using the field cache
+    :return: None
+    """
+    wrf_file = str(tmp_path / 'wrfderive_d01_2023-01-02_03:00:00.nc')
+    _write_synthetic_netcdf(wrf_file)
+
+    layers = automate_geojson_products(wrf_file, 'netcdf')
+
+    assert [(layer.variable_name, layer.z_level) for layer in layers] == \
+           [('temp_2m', None), ('temp_pres', 1000), ('temp_pres', 850)]
+    assert layers[0].dt == datetime(2023, 1, 2, 3).timestamp()
+    with open(layers[0].layer_data, 'rb') as file:
+        doc = json.loads(decompress(file.read()))
+
+    # the converted file matches a conversion that reads the file directly
+    converter = GeoJson(wrf_file, 'netcdf', 'temp_2m', [-15, 45], 2, 'viridis')
+    assert doc == converter.convert(None)
+
+
+def test_shared_converter_pool(tmp_path) -> None:
+    """
+    Test converting products from several files in one converter pool
+    :return: None
+    """
+    wrf_files = [str(tmp_path / f'wrfderive_d01_2023-01-02_0{hour}:00:00.nc') for hour in range(3)]
+    for wrf_file in wrf_files:
+        _write_synthetic_netcdf(wrf_file)
+
+    # a small queue makes the pool wait for tasks from earlier files while submitting later files
+    layers = []
+    with ConverterPool(max_workers=2, max_queued=2) as pool:
+        assert pool.max_workers == 2
+        for wrf_file in wrf_files:
+            layers += submit_geojson_products(wrf_file, 'netcdf', pool)
+            assert len(pool.futures) <= 2
+
+    assert len(remove_missing_layers(layers)) == 3 * len(wrf_files)
+
+    # the pool size is limited by the cores allotted to the job
+    assert ConverterPool.get_worker_count(1) == 1
+    assert ConverterPool.get_worker_count(None) >= 1
+
+
+def test_binary_encoding() -> None:
+    """
+    Test that the binary layer encoding is lossless and smaller than GeoJSON
+    :return: None
+    """
+    features = _get_synthetic_converter()._create_features(_get_synthetic_grid())
+    doc = {'type': 'FeatureCollection', 'features': features}
+
+    data = encode_features(features)
+    assert json.loads(json.dumps(decode_layer(data))) == json.loads(json.dumps(doc))
+    assert len(data) < len(json.dumps(doc))
+
+    # an empty layer also round trips
+    assert decode_layer(encode_features([])) == {'type': 'FeatureCollection', 'features': []}
+
+    # other data are rejected
+    with pytest.raises(ValueError):
+        decode_layer(json.dumps(doc).encode())
+
+
+def test_binary_layer_files(tmp_path) -> None:
+    """
+    Test writing layer files in the GeoJSON and binary encodings
+    :return: None
+    """
+    wrf_file = str(tmp_path / 'wrfderive_d01_2023-01-02_03:00:00.nc')
+    _write_synthetic_netcdf(wrf_file)
+
+    encodings = [WrfLayer.ENCODING_GEOJSON, WrfLayer.ENCODING_BINARY]
+    layers = automate_geojson_products(wrf_file, 'netcdf', encodings=encodings)
+    assert len(layers) == 3
+
+    # the layer records both encodings, and the files have the same features
+    layer = layers[0]
+    assert layer.encodings == encodings
+    assert layer.get_layer_data(WrfLayer.ENCODING_BINARY).endswith('_temp_2m.wcl.gz')
+    with open(layer.get_layer_data(WrfLayer.ENCODING_GEOJSON), 'rb') as file:
+        doc = json.loads(decompress(file.read()))
+    with open(layer.get_layer_data(WrfLayer.ENCODING_BINARY), 'rb') as file:
+        assert json.loads(json.dumps(decode_layer(decompress(file.read())))) == doc
+
+    # the encodings are saved with the layer, and old layers only have GeoJSON
+    assert WrfLayer(layer.data).encodings == encodings
+    assert WrfLayer({'layer_data': 's3://bucket/key.geojson.gz'}).get_layer_data(WrfLayer.ENCODING_BINARY) is None
+
+
+def test_simplify_ring() -> None:
+    """
+    Test simplifying closed polygon rings
+    :return: None
+    """
+    # a finely sampled square simplifies to its four corners
+    side = numpy.linspace(0, 10, 21)
+    square = numpy.concatenate([numpy.column_stack([side, numpy.zeros(21)]),
+                                numpy.column_stack([numpy.full(21, 10), side])[1:],
+                                numpy.column_stack([side[::-1], numpy.full(21, 10)])[1:],
+                                numpy.column_stack([numpy.zeros(21), side[::-1]])[1:]])
+    simplified = simplify_ring(square, 0.5)
+    assert simplified.tolist() == [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]
+
+    # no tolerance keeps every point, and a ring smaller than the tolerance collapses
+    assert len(simplify_ring(square, 0)) == len(square)
+    assert simplify_ring(square * 0.01, 0.5) is None
+
+
+def test_simplify_polygons() -> None:
+    """
+    Test that contour bands simplified together still share their boundaries and keep their holes inside
+    :return: None
+    """
+    # a noisy field has many small bands and holes close to each other
+    converter = _get_synthetic_converter()
+    rng = numpy.random.default_rng(0)
+    grid = MaskedArray(_get_synthetic_grid().data + 0.5 + rng.normal(0, 1, (40, 60)))
+    polygons = [path.to_polygons() for _, paths in converter._get_contour_bands(grid) for path in paths]
+    polygons = [polygon for polygon in polygons if len(polygon) > 0]
+
+    def _on_grid_edge(point: tuple) -> bool:
+        return bool(numpy.isclose(point[0], [0, 59]).any() or numpy.isclose(point[1], [0, 39]).any())
+
+    for tolerance in [tolerance for tolerance in GeoJson.DETAIL_TOLERANCES.values() if tolerance > 0]:
+        simplified = [polygon for polygon in simplify_polygons(polygons, tolerance) if polygon is not None]
+        assert sum(len(ring) for polygon in simplified for ring in polygon) < \
+               sum(len(ring) for polygon in polygons for ring in polygon) / 2
+
+        # each boundary between two bands is in both bands, going the other way, so there are no gaps or overlaps
+        edges = Counter((tuple(start), tuple(end)) for polygon in simplified for ring in polygon
+                        for start, end in zip(ring[:-1], ring[1:]))
+        assert max(edges.values()) == 1
+        for start, end in edges:
+            assert (end, start) in edges or (_on_grid_edge(start) and _on_grid_edge(end))
+
+        # the holes are still inside their polygon
+        for polygon in simplified:
+            outer = Path(polygon[0])
+            for hole in polygon[1:]:
+                points = numpy.array([point for point in hole if not (point == polygon[0]).all(axis=1).any()])
+                assert len(points) == 0 or outer.contains_points(points).all()
+
+
+def test_detail_levels(tmp_path) -> None:
+    """
+    Test writing simplified layer files for each level of detail
+    :return: None
+    """
+    wrf_file = str(tmp_path / 'wrfderive_d01_2023-01-02_03:00:00.nc')
+    _write_synthetic_netcdf(wrf_file)
+
+    encodings = [WrfLayer.ENCODING_GEOJSON, WrfLayer.ENCODING_BINARY]
+    layers = automate_geojson_products(wrf_file, 'netcdf', encodings=encodings, detail_levels=WrfLayer.DETAIL_LEVELS)
+    assert len(layers) == 3
+    layer = layers[0]
+
+    # coarser levels have fewer vertices, and the same features in each encoding
+    vertex_counts = {}
+    for detail_level in WrfLayer.DETAIL_LEVELS:
+        with open(layer.get_layer_data(WrfLayer.ENCODING_GEOJSON, detail_level), 'rb') as file:
+            doc = json.loads(decompress(file.read()))
+        with open(layer.get_layer_data(WrfLayer.ENCODING_BINARY, detail_level), 'rb') as file:
+            assert json.loads(json.dumps(decode_layer(decompress(file.read())))) == doc
+        vertex_counts[detail_level] = sum(len(ring) for feature in doc['features']
+                                          for ring in feature['geometry']['coordinates'][0])
+    assert vertex_counts['coarse'] < vertex_counts['medium'] < vertex_counts['full']
+    assert layer.get_layer_data(detail_level=WrfLayer.DETAIL_COARSE).endswith('_temp_2m.coarse.geojson.gz')
+
+    # the tolerance is tied to the grid spacing of about 5.5 km, and zoomed out maps get coarser levels
+    assert 20000 < layer.detail_levels[WrfLayer.DETAIL_COARSE] < 24000
+    assert layer.get_detail_level(50000) == WrfLayer.DETAIL_COARSE
+    assert layer.get_detail_level(10000) == WrfLayer.DETAIL_MEDIUM
+    assert layer.get_detail_level(1000) == WrfLayer.DETAIL_FULL
+
+    # old layers only have the full resolution
+    assert WrfLayer(layer.data).detail_levels == layer.detail_levels
+    old_layer = WrfLayer({'layer_data': 's3://bucket/key.geojson.gz'})
+    assert old_layer.get_layer_data(detail_level=WrfLayer.DETAIL_COARSE) is None
+    assert old_layer.get_detail_level(50000) == WrfLayer.DETAIL_FULL
@@ -3,13 +3,22 @@ Test the wrfcloud.jobs module
 """
 
 
+import os
+import io
+from typing import Tuple
+import yaml
 import wrfcloud.system
-from wrfcloud.jobs import WrfJob
+import wrfcloud.jobs.job_cache
+import wrfcloud.jobs.job_dao
+from wrfcloud.dynamodb import DynamoDao
+from wrfcloud.jobs import WrfJob, WrfLayer, JobDao
 from wrfcloud.jobs import add_job_to_system
 from wrfcloud.jobs import get_job_from_system
 from wrfcloud.jobs import get_all_jobs_in_system
 from wrfcloud.jobs import update_job_in_system
 from wrfcloud.jobs import delete_job_from_system
+from wrfcloud.jobs import get_job_cache_stats, clear_job_cache
+from wrfcloud.jobs.tiles import list_tiles
 from helper import _test_setup, _test_teardown, _get_sample_job, _get_all_sample_jobs
 
 # initialize the test environment
@@ -158,3 +167,231 @@ wrfcloud.system.init_environment(env='test')
 #
 #     # teardown the test resources
 #     assert _test_teardown()
+
+
+def test_layers_manifest() -> None:
+    """
+    Test writing and reading the layers manifest, and finding layers with its index
+    :return: None
+    """
+    job = _get_sample_job(2)
+    layers = job.layers
+    palette = layers[0].data['palette']
+    layers.append(WrfLayer({'variable_name': 'wind', 'dt': layers[0].dt, 'z_level': 500, 'palette': palette}))
+
+    # the manifest and the YAML format give the same layers and index
+    manifest = JobDao.encode_layers(layers)
+    layers_yaml = yaml.safe_dump([layer.data for layer in layers]).encode()
+    for data, key in [(manifest, f'jobs/{job.job_id}/{JobDao.LAYERS_MANIFEST}'), (layers_yaml, 'layers.yaml')]:
+        layers_, index = JobDao.decode_layers(data, key)
+        assert [layer.data for layer in layers_] == [layer.data for layer in layers]
+        assert index == WrfLayer.get_layer_index(layers)
+
+    # the index finds the same layers as a search of the list, and a z level of None is the same as zero
+    job.layers, index = JobDao.decode_layers(manifest, JobDao.LAYERS_MANIFEST)
+    job.set_layer_index(index)
+    for layer in layers:
+        z_level = 0 if layer.z_level is None else layer.z_level
+        found = job.get_layer(layer.dt, layer.variable_name, z_level)
+        assert found.dt == layer.dt and found.variable_name == layer.variable_name
+    assert job.get_layer(float(layers[0].dt), 'wind', 500.0).data == layers[-1].data
+    assert job.get_layer(layers[0].dt, 'wind', 850) is None
+
+    # the index is rebuilt when the layers change
+    job.layers.append(WrfLayer({'variable_name': 'wind', 'dt': layers[0].dt, 'z_level': 850}))
+    assert job.get_layer(layers[0].dt, 'wind', 850) is job.layers[-1]
+    job.layers = 's3://bucket/jobs/P1/layers.json.gz'
+    assert job.get_layer(layers[0].dt, 'wind', 850) is None
+
+
+def test_job_cache(monkeypatch) -> None:
+    """
+    Test that finished jobs are cached, checked against their status code, and invalidated
+    :return: None
+    """
+    statuses = {'P1': WrfJob.STATUS_CODE_FINISHED, 'P2': WrfJob.STATUS_CODE_RUNNING, 'P3': WrfJob.STATUS_CODE_FINISHED}
+    job_reads = []
+    layer_loads = []
+
+    def _get_job_by_id(_, job_id: str) -> WrfJob:
+        job_reads.append(job_id)
+        return WrfJob({'job_id': job_id, 'status_code': statuses[job_id], 'layers': []})
+
+    def _get_all_jobs(_, full_load: bool = True) -> list:
+        return [WrfJob({'job_id': job_id, 'status_code': status_code, 'layers': f's3://bucket/jobs/{job_id}'})
+                for job_id, status_code in statuses.items()]
+
+    def _load_all_layers(_, jobs: list) -> None:
+        for job in jobs:
+            layer_loads.append(job.job_id)
+            job.layers = []
+
+    monkeypatch.setattr(JobDao, 'get_job_by_id', _get_job_by_id)
+    monkeypatch.setattr(JobDao, 'get_all_jobs', _get_all_jobs)
+    monkeypatch.setattr(JobDao, 'load_all_layers', _load_all_layers)
+    monkeypatch.setattr(JobDao, 'update_job', lambda _, job: True)
+    clear_job_cache()
+
+    # finished jobs are read once, and running jobs every time
+    for _ in range(3):
+        assert get_job_from_system('P1').job_id == 'P1'
+        assert get_job_from_system('P2').job_id == 'P2'
+    assert job_reads == ['P1', 'P2', 'P2', 'P2']
+    assert get_job_cache_stats() == {'hits': 2, 'misses': 4, 'jobs': 1}
+
+    # layers of cached jobs with the same status code are not loaded again
+    assert [job.job_id for job in get_all_jobs_in_system()] == ['P1', 'P2', 'P3']
+    assert layer_loads == ['P2', 'P3']
+    statuses['P3'] = WrfJob.STATUS_CODE_CANCELED
+    get_all_jobs_in_system()
+    assert layer_loads == ['P2', 'P3', 'P2', 'P3']
+
+    # updating a job removes it from the cache
+    assert update_job_in_system(get_job_from_system('P1'), False)
+    get_job_from_system('P1')
+    assert job_reads[-1] == 'P1'
+
+    # the cache is bounded, and jobs expire
+    monkeypatch.setattr(wrfcloud.jobs.job_cache, 'JOB_CACHE_SIZE', 1)
+    statuses['P3'] = WrfJob.STATUS_CODE_FINISHED
+    get_job_from_system('P3')
+    assert get_job_cache_stats()['jobs'] == 1
+    monkeypatch.setattr(wrfcloud.jobs.job_cache, 'JOB_CACHE_TTL', 0)
+    get_job_from_system('P3')
+    assert job_reads[-2:] == ['P3', 'P3']
+    clear_job_cache()
+
+
+def test_delete_layers(monkeypatch) -> None:
+    """
+    Test that deleting the layers of a job removes every file of every layer and the layers manifest
+    :return: None
+    """
+    prefix = 's3://bucket/output/P1/wrf_DXX_20230102030000'
+    contour = WrfLayer({'variable_name': 'T2', 'dt': 1672628400, 'palette': {'name': 'viridis'},
+                        'layer_data': f'{prefix}_T2_0.geojson.gz',
+                        'encodings': [WrfLayer.ENCODING_GEOJSON, WrfLayer.ENCODING_BINARY],
+                        'detail_levels': {WrfLayer.DETAIL_COARSE: 5000, WrfLayer.DETAIL_MEDIUM: 1000,
+                                          WrfLayer.DETAIL_FULL: 0},
+                        'tile_zooms': [2, 3], 'bounds': [-100, 30, -80, 45]})
+    vector = WrfLayer({'variable_name': 'wind', 'dt': 1672628400, 'palette': {'name': 'viridis'},
+                       'plot_type': 'vector', 'layer_data': f'{prefix}_wind_0.json.gz',
+                       'densities': {WrfLayer.DENSITY_80KM: 80000, WrfLayer.DENSITY_40KM: 40000}})
+    manifest_key = f'jobs/P1/{JobDao.LAYERS_MANIFEST}'
+    deleted = []
+
+    class _FakeS3:
+        """
+        S3 client that reads the layers manifest and records deleted keys
+        """
+        def get_object(self, Bucket: str, Key: str) -> dict:
+            """
+            Pretend to read the layers manifest
+            """
+            assert Key == manifest_key
+            return {'Body': io.BytesIO(JobDao.encode_layers([contour, vector]))}
+
+        def delete_object(self, Bucket: str, Key: str) -> None:
+            """
+            Pretend to delete an object
+            """
+            deleted.append(f's3://{Bucket}/{Key}')
+
+        def delete_objects(self, Bucket: str, Delete: dict) -> dict:
+            """
+            Pretend to delete many objects
+            """
+            deleted.extend(f's3://{Bucket}/{item["Key"]}' for item in Delete['Objects'])
+            return {}
+
+    monkeypatch.setattr(wrfcloud.jobs.job_dao, 'get_aws_client', lambda service: _FakeS3())
+    monkeypatch.setattr(JobDao, 'MAX_DELETE_KEYS', 5)
+    job = WrfJob({'job_id': 'P1', 'layers': f's3://bucket/{manifest_key}'})
+    assert JobDao()._delete_layers(job)
+
+    # every encoding, level of detail, density, and tile of the layers is deleted, and then the manifest
+    tiles = [WrfLayer.get_tile_file_name(contour.layer_data, zoom, x, y)
+             for zoom, x, y in list_tiles(contour.tile_zooms, contour.bounds)]
+    assert len(tiles) > 2
+    expected = [f'{prefix}_T2_0{name}' for name in ['.geojson.gz', '.coarse.geojson.gz', '.medium.geojson.gz',
+                                                     '.coarse.wcl.gz', '.medium.wcl.gz', '.wcl.gz']]
+    expected += [f'{prefix}_wind_0{name}' for name in ['.json.gz', '.80km.json.gz', '.40km.json.gz']]
+    assert sorted(deleted[:-1]) == sorted(expected + tiles)
+    assert deleted[-1] == f's3://bucket/{manifest_key}'
+
+
+def test_update_job_layers(monkeypatch) -> None:
+    """
+    Test that updating a job writes the layers manifest only if the layers changed, before the job points
+    to it, and that the job keeps its layers if the manifest cannot be written
+    :return: None
+    """
+    layer = WrfLayer({'variable_name': 'T2', 'dt': 1672628400, 'palette': {'name': 'viridis'},
+                      'layer_data': 's3://bucket/output/P1/wrf_DXX_20230102030000_T2_0.geojson.gz'})
+    manifest_key = f'jobs/P1/{JobDao.LAYERS_MANIFEST}'
+    manifest_url = f's3://{os.environ["WRFCLOUD_BUCKET"]}/{manifest_key}'
+    requests = []
+    job_exists = [True]
+    put_fails = [False]
+
+    class _FakeS3:
+        """
+        S3 client that reads and records writes of the layers manifest
+        """
+        def get_object(self, Bucket: str, Key: str) -> dict:
+            """
+            Pretend to read the layers manifest
+            """
+            return {'Body': io.BytesIO(JobDao.encode_layers([layer]))}
+
+        def put_object(self, Body: bytes, Bucket: str, Key: str) -> None:
+            """
+            Pretend to write the layers manifest
+            """
+            if put_fails[0]:
+                raise IOError('put failed')
+            requests.append(('put_object', Key))
+
+        def delete_object(self, Bucket: str, Key: str) -> None:
+            """
+            Pretend to delete the layers manifest
+            """
+            requests.append(('delete_object', Key))
+
+    def _update_item(_, data: dict, condition_expression: str = None,
+                     condition_values: dict = None) -> Tuple[bool, bool]:
+        requests.append(('update_item', data['layers']))
+        return job_exists[0], job_exists[0]
+
+    monkeypatch.setattr(wrfcloud.jobs.job_dao, 'get_aws_client', lambda service: _FakeS3())
+    monkeypatch.setattr(DynamoDao, '_update_item', _update_item)
+    dao = JobDao()
+    job = WrfJob({'job_id': 'P1', 'layers': f's3://bucket/{manifest_key}'})
+    assert dao._load_layers(job)
+
+    # a status update does not write the layers again
+    job.status_code = WrfJob.STATUS_CODE_FINISHED
+    assert dao.update_job(job)
+    assert requests == [('update_item', manifest_url)]
+
+    # changed layers are written before the job is updated
+    job.layers.append(WrfLayer({**layer.data, 'dt': 1672632000}))
+    assert dao.update_job(job)
+    assert requests[1:] == [('put_object', manifest_key), ('update_item', manifest_url)]
+    assert dao.update_job(job)
+    assert len(requests) == 4
+
+    # a legacy job is not updated, and keeps its layers, if the manifest cannot be written
+    del requests[:]
+    put_fails[0] = True
+    legacy_job = WrfJob({'job_id': 'P1', 'layers': 's3://bucket/jobs/P1/layers.yaml'})
+    legacy_job.layers = [layer]
+    assert not dao.update_job(legacy_job)
+    assert not requests
+    put_fails[0] = False
+
+    # the manifest written for a job that does not exist is deleted again
+    job_exists[0] = False
+    job.layers.append(WrfLayer({**layer.data, 'dt': 1672635600}))
+    assert not dao.update_job(job)
+    assert [request[0] for request in requests] == ['put_object', 'update_item', 'delete_object']
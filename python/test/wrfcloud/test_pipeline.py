@@ -0,0 +1,92 @@
+"""
+Test the wrfcloud.runtime.pipeline module
+"""
+
+
+import os
+from threading import Thread, Semaphore
+from wrfcloud.system import init_environment
+from wrfcloud.jobs import WrfJob
+from wrfcloud.runtime.pipeline import Pipeline
+from helper import _get_sample_job
+
+
+# initialize the test environment
+init_environment(env='test')
+
+
+def _get_pipeline_job() -> WrfJob:
+    """
+    Get a three-hour job with hourly output
+    :return: Sample job
+    """
+    job = _get_sample_job(WrfJob.STATUS_CODE_RUNNING)
+    job.start_dt = '2023-01-02_00:00:00'
+    job.end_dt = '2023-01-02_03:00:00'
+    job.output_frequency = 3600
+    return job
+
+
+def test_output_dts(tmp_path, monkeypatch) -> None:
+    """
+    Test the list of output times for a job
+    :return: None
+    """
+    monkeypatch.setenv('WORK_DIR', str(tmp_path))
+    job = _get_pipeline_job()
+    assert [output_dt.hour for output_dt in job.output_dts] == [0, 1, 2, 3]
+
+    pipeline = Pipeline(job)
+    assert pipeline.get_wrf_file(job.output_dts[1]) == f'{job.wrf_dir}/wrfout_d01_2023-01-02_01:00:00'
+
+
+def test_wait_for_file(tmp_path, monkeypatch) -> None:
+    """
+    Test that an output file is complete only once WRF starts the next file or exits
+    :return: None
+    """
+    monkeypatch.setenv('WORK_DIR', str(tmp_path))
+    job = _get_pipeline_job()
+    os.makedirs(job.wrf_dir)
+    pipeline = Pipeline(job)
+    pipeline.POLL_SECONDS = 0.01
+    files = [pipeline.get_wrf_file(output_dt) for output_dt in job.output_dts]
+
+    # simulate WRF writing the output files one at a time, then exiting
+    step = Semaphore(0)
+
+    def _fake_wrf() -> None:
+        for file in files:
+            step.acquire()
+            open(file, 'w').close()
+        step.acquire()
+
+    pipeline.wrf_thread = Thread(target=_fake_wrf)
+    pipeline.wrf_thread.start()
+
+    # the first file is complete once the second file is started
+    step.release()
+    waiter = Thread(target=pipeline._wait_for_file, args=(files[0], files[1]))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive()
+    step.release()
+    waiter.join(5)
+    assert not waiter.is_alive()
+
+    # the last file is complete once WRF exits
+    step.release()
+    step.release()
+    assert pipeline._wait_for_file(files[2], files[3])
+    waiter = Thread(target=pipeline._wait_for_file, args=(files[3], None))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive()
+    step.release()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert pipeline._wait_for_file(files[3], None)
+
+    # a file that WRF never wrote is not complete
+    os.remove(files[3])
+    assert not pipeline._wait_for_file(files[3], None)
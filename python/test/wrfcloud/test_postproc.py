@@ -0,0 +1,72 @@
+"""
+Test the wrfcloud.runtime.postproc module
+"""
+
+
+import os
+import pkgutil
+import yaml
+from wrfcloud.system import init_environment
+from wrfcloud.jobs import WrfJob
+from wrfcloud.runtime.postproc import UPP
+from helper import _get_sample_job
+
+
+# initialize the test environment
+init_environment(env='test')
+
+
+def _make_fake_upp_home(upp_home: str) -> None:
+    """
+    Create a UPP installation with empty static files and a unipost.exe that writes a GRIB2 file named
+    for its forecast hour, finishing the first forecast hours last
+    :param upp_home: Directory for the fake UPP installation
+    """
+    upp_files = yaml.safe_load(pkgutil.get_data('wrfcloud', 'runtime/resources/upp_files.yaml'))
+    static_files = upp_files['static_files'] + upp_files['control_files']
+    static_files += [f'src/lib/crtm2/src/fix/{sat_fix_file}' for sat_fix_file in upp_files['sat_fix_files']]
+    for static_file in static_files:
+        os.makedirs(os.path.dirname(f'{upp_home}/{static_file}'), exist_ok=True)
+        open(f'{upp_home}/{static_file}', 'w').close()
+
+    os.makedirs(f'{upp_home}/bin')
+    with open(f'{upp_home}/bin/{UPP.EXE}', 'w') as file:
+        file.write('#!/bin/bash\n')
+        file.write('FHR=$(basename $(pwd) | cut -c5-)\n')
+        file.write('sleep 0.$((4 - 10#$FHR))\n')
+        file.write('touch WRFPRS.GrbF$FHR\n')
+    os.chmod(f'{upp_home}/bin/{UPP.EXE}', 0o755)
+
+
+def test_upp_modes(tmp_path, monkeypatch) -> None:
+    """
+    Test that running the forecast hours one at a time or concurrently collects the same GRIB2 files
+    :return: None
+    """
+    monkeypatch.setenv('UPP_HOME', str(tmp_path / 'UPP'))
+    _make_fake_upp_home(str(tmp_path / 'UPP'))
+
+    job = _get_sample_job(WrfJob.STATUS_CODE_RUNNING)
+    job.start_dt = '2023-01-02_00:00:00'
+    job.end_dt = '2023-01-02_03:00:00'
+    job.output_frequency = 3600
+
+    grib_files = {}
+    for mode in ['serial', 'local']:
+        monkeypatch.setenv('WORK_DIR', str(tmp_path / mode))
+        # a single core runs serial mode on this node instead of in the batch queue
+        job.cores = 1 if mode == 'serial' else 4
+        upp = UPP(job, mode)
+        assert upp.run()
+        grib_files[mode] = [os.path.relpath(grib_file, job.upp_dir) for grib_file in upp.grib_files]
+
+    # the files are in forecast hour order even when later hours finish first
+    assert grib_files['local'] == [f'fhr_00{fhr}/WRFPRS.GrbF00{fhr}' for fhr in range(4)]
+    assert grib_files['local'] == grib_files['serial']
+
+    # the itag points each forecast hour at its WRF output file
+    with open(f'{job.upp_dir}/fhr_002/itag') as file:
+        assert file.readline().strip() == f'{job.wrf_dir}/wrfout_d01_2023-01-02_02:00:00'
+
+    # an unknown mode fails
+    assert not UPP(job, 'junk').run()
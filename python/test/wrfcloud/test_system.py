@@ -0,0 +1,38 @@
+"""
+Test the wrfcloud.system module
+"""
+
+
+from concurrent.futures import ThreadPoolExecutor
+from wrfcloud.system import init_environment, get_aws_client, get_aws_client_stats, clear_aws_clients
+
+
+# initialize the test environment
+init_environment(env='test')
+
+
+def test_aws_client_pool() -> None:
+    """
+    Test that AWS clients are created once per service, region, profile, and endpoint URL
+    :return: None
+    """
+    clear_aws_clients()
+
+    # the same client is returned for the same key from any thread
+    s3 = get_aws_client('s3', region='us-east-2')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        clients = list(executor.map(lambda _: get_aws_client('s3', region='us-east-2'), range(32)))
+    assert all(client is s3 for client in clients)
+
+    # a different service, region, or endpoint URL gets its own client
+    assert get_aws_client('dynamodb', region='us-east-2') is not s3
+    assert get_aws_client('s3', region='us-west-2') is not s3
+    local = get_aws_client('dynamodb', region='us-east-2', endpoint_url='http://localhost:8000')
+    assert local.meta.endpoint_url == 'http://localhost:8000'
+
+    assert get_aws_client_stats() == {'hits': 32, 'misses': 4, 'clients': 4}
+
+    # clearing the cache creates new clients
+    clear_aws_clients()
+    assert get_aws_client('s3', region='us-east-2') is not s3
+    assert get_aws_client_stats() == {'hits': 0, 'misses': 1, 'clients': 1}
@@ -0,0 +1,165 @@
+"""
+Test the wrfcloud.runtime.tools.tiler module
+"""
+
+
+import json
+import os
+from gzip import decompress
+import numpy
+from netCDF4 import Dataset
+from wrfcloud.system import init_environment
+from wrfcloud.jobs import WrfLayer
+from wrfcloud.runtime.tools.geojson import automate_geojson_products
+from wrfcloud.jobs.tiles import get_tile_bounds, get_tile_range, list_tiles
+from wrfcloud.runtime.tools.tiler import clip_ring, get_tile_zooms, tile_vectors
+
+
+# initialize the test environment
+init_environment(env='test')
+
+
+def _ring_area(ring: list) -> float:
+    """
+    Get the area of a closed ring with the shoelace formula
+    :param ring: List of lon/lat points
+    :return: Area in square degrees
+    """
+    points = numpy.asarray(ring)
+    return 0.5 * abs(numpy.dot(points[:, 0], numpy.roll(points[:, 1], 1)) -
+                     numpy.dot(points[:, 1], numpy.roll(points[:, 0], 1)))
+
+
+def _feature_area(feature: dict) -> float:
+    """
+    Get the area of a MultiPolygon feature, subtracting the holes
+    :param feature: GeoJSON feature
+    :return: Area in square degrees
+    """
+    return sum(_ring_area(polygon[0]) - sum(_ring_area(hole) for hole in polygon[1:])
+               for polygon in feature['geometry']['coordinates'])
+
+
+def _write_synthetic_netcdf(path: str, nx: int = 120, ny: int = 80) -> None:
+    """
+    Write a small derived WRF NetCDF file with a 2D field on a 10 km grid
+    :param path: Full path to the output file
+    :param nx: Number of grid points in the X dimension
+    :param ny: Number of grid points in the Y dimension
+    """
+    x, y = numpy.meshgrid(numpy.arange(nx), numpy.arange(ny))
+    with Dataset(path, mode='w') as wrf:
+        wrf.createDimension('Time', None)
+        wrf.createDimension('DateStrLen', 19)
+        wrf.createDimension('south_north', ny)
+        wrf.createDimension('west_east', nx)
+        wrf.createVariable('Times', 'S1', ('Time', 'DateStrLen'))
+        wrf['Times'][0] = numpy.array(list('2023-01-02_03:00:00'), dtype='S1')
+        wrf.createVariable('XLAT', 'f4', ('Time', 'south_north', 'west_east'))
+        wrf['XLAT'][0] = 35 + y * 0.09
+        wrf.createVariable('XLONG', 'f4', ('Time', 'south_north', 'west_east'))
+        wrf['XLONG'][0] = -105 + x * 0.11
+        wrf.createVariable('temp_2m', 'f4', ('south_north', 'west_east'))
+        wrf['temp_2m'][:] = 15 + 20 * numpy.sin(x / 9.0) * numpy.cos(y / 7.0)
+
+
+def test_tile_grid() -> None:
+    """
+    Test the tile zoom levels, ranges, and bounds
+    :return: None
+    """
+    # finer grids get tiles at higher zoom levels
+    assert get_tile_zooms(3000, 40) == [4, 5, 6, 7]
+    assert get_tile_zooms(12000, 40) == [2, 3, 4, 5]
+    assert get_tile_zooms(0, 40) == []
+
+    # the tile that contains Boulder, CO at zoom level 6
+    assert get_tile_range([-105.3, 40.0, -105.2, 40.1], 6) == (13, 24, 13, 24)
+    west, south, east, north = get_tile_bounds(6, 13, 24)
+    assert west < -105.3 and east > -105.2 and south < 40.0 and north > 40.1
+
+    # every tile in the range is listed
+    assert len(list_tiles([5, 6], [-110, 35, -100, 45])) == len(set(list_tiles([5, 6], [-110, 35, -100, 45])))
+
+
+def test_clip_ring() -> None:
+    """
+    Test clipping polygon rings to a bounding box
+    :return: None
+    """
+    square = numpy.array([[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]], dtype=float)
+
+    # a ring inside the box is not changed, and a ring outside the box is dropped
+    assert clip_ring(square, (-1, -1, 5, 5)).tolist() == square.tolist()
+    assert clip_ring(square, (5, 5, 6, 6)) is None
+
+    # a ring across the box is cut at its edges
+    clipped = clip_ring(square, (2, 1, 6, 3))
+    assert clipped[0].tolist() == clipped[-1].tolist()
+    assert _ring_area(clipped) == 4
+    assert clipped[:, 0].min() == 2 and clipped[:, 1].min() == 1 and clipped[:, 1].max() == 3
+
+
+def test_contour_tiles(tmp_path) -> None:
+    """
+    Test slicing a contour layer into tiles
+    :return: None
+    """
+    wrf_file = str(tmp_path / 'wrfderive_d01_2023-01-02_03:00:00.nc')
+    _write_synthetic_netcdf(wrf_file)
+    layer = automate_geojson_products(wrf_file, 'netcdf', tiles=True)[0]
+    assert layer.tile_zooms == [2, 3, 4, 5]
+
+    with open(layer.layer_data, 'rb') as file:
+        doc = json.loads(decompress(file.read()))
+    full_area = sum(_feature_area(feature) for feature in doc['features'])
+
+    # the tiles at each zoom level cover the same area as the whole layer
+    for zoom in layer.tile_zooms:
+        x_min, y_min, x_max, y_max = get_tile_range(layer.bounds, zoom)
+        tile_area = 0
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                with open(layer.get_tile_data(zoom, x, y), 'rb') as file:
+                    tile = json.loads(decompress(file.read()))
+                west, south, east, north = get_tile_bounds(zoom, x, y)
+                for feature in tile['features']:
+                    points = numpy.concatenate([numpy.asarray(ring) for polygon in feature['geometry']['coordinates']
+                                                for ring in polygon])
+                    assert points[:, 0].min() >= round(west, 5) and points[:, 0].max() <= round(east, 5)
+                    assert points[:, 1].min() >= round(south, 5) and points[:, 1].max() <= round(north, 5)
+                    tile_area += _feature_area(feature)
+        assert abs(tile_area - full_area) < 1e-3 * full_area
+
+    # tiles sit in a directory next to the layer file
+    assert os.path.isdir(layer.layer_data.replace('.geojson.gz', '.tiles/5'))
+    assert layer.get_tile_data(9, 0, 0) is None
+    assert WrfLayer(layer.data).tile_zooms == layer.tile_zooms
+
+
+def test_vector_tiles() -> None:
+    """
+    Test splitting vector points into tiles
+    :return: None
+    """
+    doc = {'vectors': [{'lon': f'{lon:.2f}', 'lat': f'{lat:.2f}', 'wind_speed': '1.0'}
+                       for lon in numpy.arange(-110, -100, 0.5) for lat in numpy.arange(35, 45, 0.5)],
+           'row_length': '20', 'dx': 20000, 'dy': 20000}
+    tiles = tile_vectors(doc, 5, [-110, 35, -100.5, 44.5])
+
+    assert sum(len(tile['vectors']) for tile in tiles.values()) == len(doc['vectors'])
+    for (x, y), tile in tiles.items():
+        assert tile['dx'] == 20000
+        west, south, east, north = get_tile_bounds(5, x, y)
+        for item in tile['vectors']:
+            assert west <= float(item['lon']) <= east and south <= float(item['lat']) <= north
+
+    # the columnar format gets the same points in each tile
+    columnar = {'lon': [float(item['lon']) for item in doc['vectors']],
+                'lat': [float(item['lat']) for item in doc['vectors']],
+                'wind_speed': [1.0] * len(doc['vectors']), 'row_length': 20, 'dx': 20000, 'dy': 20000}
+    columnar_tiles = tile_vectors(columnar, 5, [-110, 35, -100.5, 44.5])
+    for tile, columnar_tile in columnar_tiles.items():
+        assert columnar_tile['lon'] == [float(item['lon']) for item in tiles[tile]['vectors']]
+        assert len(columnar_tile['wind_speed']) == len(columnar_tile['lat']) == len(columnar_tile['lon'])
+        assert columnar_tile['row_length'] == 20
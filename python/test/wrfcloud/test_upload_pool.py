@@ -0,0 +1,67 @@
+"""
+Test the wrfcloud.runtime.tools.upload_pool module
+"""
+
+
+import time
+from threading import Lock
+from wrfcloud.system import init_environment
+from wrfcloud.runtime.tools.upload_pool import UploadPool
+
+
+# initialize the test environment
+init_environment(env='test')
+
+
+class _FakeS3:
+    """
+    S3 client that records uploads and fails the first few attempts of some files
+    """
+    def __init__(self, failures: dict):
+        """
+        :param failures: Number of times each filename fails before it is uploaded
+        """
+        self.failures = failures
+        self.uploaded = {}
+        self.running = 0
+        self.max_running = 0
+        self.lock = Lock()
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, Config: any = None) -> None:
+        """
+        Pretend to upload a file
+        """
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        with self.lock:
+            self.running -= 1
+            if self.failures.get(Filename, 0) > 0:
+                self.failures[Filename] -= 1
+                raise ConnectionError(f'Failed to upload {Filename}')
+            self.uploaded[Filename] = f's3://{Bucket}/{Key}'
+
+
+def test_upload_pool() -> None:
+    """
+    Test concurrent uploads with retries and per-file failures
+    :return: None
+    """
+    fake_s3 = _FakeS3({'flaky.json.gz': 2, 'broken.json.gz': 10})
+    files = [(f'{i}.json.gz', 'bucket', f'prefix/{i}.json.gz') for i in range(20)]
+    files += [('flaky.json.gz', 'bucket', 'prefix/flaky.json.gz'), ('broken.json.gz', 'bucket', 'prefix/broken.json.gz')]
+
+    with UploadPool(max_workers=4, max_attempts=3, backoff=0) as uploads:
+        uploads.s3 = fake_s3
+        failures = uploads.upload(files)
+
+    # the flaky file succeeds on its last attempt, and the broken file is reported
+    assert len(fake_s3.uploaded) == 21
+    assert fake_s3.uploaded['flaky.json.gz'] == 's3://bucket/prefix/flaky.json.gz'
+    assert [filename for filename, _ in failures] == ['broken.json.gz']
+    assert isinstance(failures[0][1], ConnectionError)
+    assert fake_s3.failures['broken.json.gz'] == 7
+
+    # the uploads run concurrently, but never with more than the maximum number of threads
+    assert 1 < fake_s3.max_running <= 4
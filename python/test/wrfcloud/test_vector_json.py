@@ -0,0 +1,142 @@
+"""
+Test the wrfcloud.runtime.tools.vector_json module
+"""
+
+
+import json
+from datetime import datetime
+from gzip import decompress
+import numpy
+from netCDF4 import Dataset
+from wrfcloud.system import init_environment
+from wrfcloud.jobs import WrfLayer
+from wrfcloud.runtime.tools import field_cache
+from wrfcloud.runtime.tools.vector_json import VectorJson, automate_vector_products
+
+
+# initialize the test environment
+init_environment(env='test')
+
+
+def _write_synthetic_netcdf(path: str, nx: int = 62, ny: int = 41) -> None:
+    """
+    Write a small derived WRF NetCDF file with 10m wind speed and direction on a 5 km grid
+    :param path: Full path to the output file
+    :param nx: Number of grid points in the X dimension
+    :param ny: Number of grid points in the Y dimension
+    """
+    x, y = numpy.meshgrid(numpy.arange(nx), numpy.arange(ny))
+    with Dataset(path, mode='w') as wrf:
+        wrf.setncattr('DX', 5000.0)
+        wrf.setncattr('DY', 5000.0)
+        wrf.createDimension('Time', None)
+        wrf.createDimension('DateStrLen', 19)
+        wrf.createDimension('south_north', ny)
+        wrf.createDimension('west_east', nx)
+        wrf.createVariable('Times', 'S1', ('Time', 'DateStrLen'))
+        wrf['Times'][0] = numpy.array(list('2023-01-02_03:00:00'), dtype='S1')
+        wrf.createVariable('XLAT', 'f4', ('Time', 'south_north', 'west_east'))
+        wrf['XLAT'][0] = 35 + y * 0.045 + x * 0.001
+        wrf.createVariable('XLONG', 'f4', ('Time', 'south_north', 'west_east'))
+        wrf['XLONG'][0] = -105 + x * 0.055 - y * 0.002
+        wrf.createVariable('wind_speed_10', 'f4', ('Time', 'south_north', 'west_east'), fill_value=-999)
+        speed = numpy.ma.masked_where((x == 0) & (y == 0), 5 + 3 * numpy.sin(x / 7.0) * numpy.cos(y / 5.0))
+        wrf['wind_speed_10'][0] = speed
+        wrf.createVariable('wind_dir_10', 'f4', ('Time', 'south_north', 'west_east'))
+        wrf['wind_dir_10'][0] = (x * 7 + y * 3) % 360
+
+
+def test_vector_schemas(tmp_path) -> None:
+    """
+    Test that the columnar and legacy vector documents have the same sampled points
+    :return: None
+    """
+    wrf_file = str(tmp_path / 'wrfderive_d01_2023-01-02_03:00:00.nc')
+    _write_synthetic_netcdf(wrf_file)
+    input_vars = {'speed': 'wind_speed_10', 'direction': 'wind_dir_10'}
+
+    columnar = VectorJson(wrf_file, 'wind', input_vars).convert(None)
+    legacy_converter = VectorJson(wrf_file, 'wind', input_vars, legacy_schema=True)
+    legacy = legacy_converter.convert(None)
+
+    # every fourth row and column is sampled, including the last partial group
+    assert columnar['row_length'] == 16
+    assert len(columnar['lon']) == 16 * 11
+    assert legacy['row_length'] == '16'
+    assert columnar['dx'] == legacy['dx'] == 20000
+
+    # the points match the per-point grid projection
+    item = legacy['vectors'][16 * 2 + 3]
+    lon, lat = legacy_converter._grid_to_lonlat(12, 8)
+    assert item['lon'] == f'{lon:.2f}' and item['lat'] == f'{lat:.2f}'
+
+    # the columns hold the same values as the legacy strings, and masked points are null
+    assert columnar['wind_speed'][0] is None
+    assert legacy['vectors'][0]['wind_speed'] == 'nan'
+    for i, item in enumerate(legacy['vectors'][1:], start=1):
+        assert item['lon'] == f'{columnar["lon"][i]:.2f}'
+        assert item['lat'] == f'{columnar["lat"][i]:.2f}'
+        assert item['wind_speed'] == f'{columnar["wind_speed"][i]:.1f}'
+        assert item['wind_direction'] == f'{columnar["wind_direction"][i]:.1f}'
+
+    # the columnar document is smaller
+    assert len(json.dumps(columnar)) < 0.6 * len(json.dumps(legacy))
+
+
+def test_vector_products(tmp_path, monkeypatch) -> None:
+    """
+    Test that all the vector products are created from a single read of the file
+    :return: None
+    """
+    wrf_file = str(tmp_path / 'wrfderive_d01_2023-01-02_03:00:00.nc')
+    _write_synthetic_netcdf(wrf_file)
+
+    # count the number of times the file is opened
+    opened = []
+
+    def _dataset(path: str, *args, **kwargs) -> Dataset:
+        opened.append(path)
+        return Dataset(path, *args, **kwargs)
+
+    monkeypatch.setattr(field_cache, 'Dataset', _dataset)
+    layers = automate_vector_products(wrf_file)
+    assert opened == [wrf_file]
+
+    # the 3D products are missing from the file, so only the 10m wind layer is created
+    assert len(layers) == 1
+    assert layers[0].dt == datetime(2023, 1, 2, 3).timestamp()
+    with open(layers[0].layer_data, 'rb') as file:
+        doc = json.loads(decompress(file.read()))
+    input_vars = {'speed': 'wind_speed_10', 'direction': 'wind_dir_10'}
+    assert doc == json.loads(json.dumps(VectorJson(wrf_file, 'wind', input_vars).convert(None)))
+
+
+def test_vector_densities(tmp_path) -> None:
+    """
+    Test writing the vector layer in several densities and choosing one for a map scale
+    :return: None
+    """
+    wrf_file = str(tmp_path / 'wrfderive_d01_2023-01-02_03:00:00.nc')
+    _write_synthetic_netcdf(wrf_file)
+    layer = automate_vector_products(wrf_file, densities=WrfLayer.DENSITIES)[0]
+
+    # the native density samples every grid point of the 5 km grid
+    assert layer.densities == {'80km': 80000, '40km': 40000, '20km': 20000, 'native': 5000}
+    counts = {}
+    for density in WrfLayer.DENSITIES:
+        with open(layer.get_density_data(density), 'rb') as file:
+            doc = json.loads(decompress(file.read()))
+        assert doc['dx'] == layer.densities[density]
+        counts[density] = len(doc['lon'])
+    assert counts == {'80km': 4 * 3, '40km': 8 * 6, '20km': 16 * 11, 'native': 62 * 41}
+    assert layer.get_density_data(WrfLayer.DENSITY_DEFAULT) == layer.layer_data
+
+    # zoomed out maps get sparser vectors, and zoomed in maps get denser vectors
+    assert layer.get_density(5000) == '80km'
+    assert layer.get_density(1000) == '40km'
+    assert layer.get_density(500) == '20km'
+    assert layer.get_density(50) == 'native'
+    assert WrfLayer(layer.data).densities == layer.densities
+
+    # layers with only the default density do not choose one
+    assert automate_vector_products(wrf_file)[0].get_density(50) is None
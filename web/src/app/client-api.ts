@@ -1033,10 +1033,10 @@ export interface GetWrfGeoJsonResponse extends ApiResponse
 
 export interface VectorData
 {
-  lon: string;
-  lat: string;
-  wind_speed: string;
-  wind_direction: string;
+  lon: string|number;
+  lat: string|number;
+  wind_speed: string|number|null;
+  wind_direction: string|number|null;
 }
 
 export interface ListJobRequest
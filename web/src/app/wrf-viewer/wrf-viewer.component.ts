@@ -411,14 +411,18 @@ export class WrfViewerComponent implements OnInit
     const spacing: number = new_spacing !== undefined ? new_spacing : this.getVectorSpacing(this.map?.getView().getResolution(), Number(geojsonObject['dx']));
     let features: Feature[] = [];
     const row_length: number = Number(geojsonObject['row_length']);
-    geojsonObject['vectors'].forEach(function(vector: VectorData, i: number){
+    WrfViewerComponent.readVectorData(geojsonObject).forEach(function(vector: VectorData, i: number){
       // skip rows and columns of points based on spacing
       if(i % spacing != 0 || Math.floor(i/row_length) % spacing != 0) {
         return;
       }
+      // skip masked points
+      if(vector['wind_speed'] === null || vector['wind_direction'] === null) {
+        return;
+      }
       // uses EPSG:4326 projection to match projection set by useGeographic()
       const feature = new Feature(
-          new Point(fromLonLat([parseFloat(vector['lon']), parseFloat(vector['lat'])], 'EPSG:4326'))
+          new Point(fromLonLat([Number(vector['lon']), Number(vector['lat'])], 'EPSG:4326'))
       );
       feature.setProperties(vector);
       features.push(feature);
@@ -427,6 +431,27 @@ export class WrfViewerComponent implements OnInit
 
   }
 
+  /**
+   * Get the list of points from a vector document in the columnar or the legacy list of points format
+   * @param geojsonObject Vector document
+   * @private
+   */
+  private static readVectorData(geojsonObject: any): VectorData[]
+  {
+    if (geojsonObject['vectors'] !== undefined)
+      return geojsonObject['vectors'];
+
+    const vectors: VectorData[] = [];
+    for (let i = 0; i < geojsonObject['lon'].length; i++)
+      vectors.push({
+        lon: geojsonObject['lon'][i],
+        lat: geojsonObject['lat'][i],
+        wind_speed: geojsonObject['wind_speed'][i],
+        wind_direction: geojsonObject['wind_direction'][i]
+      });
+    return vectors;
+  }
+
   /**
    *
    * @param layerGroup
@@ -599,8 +624,8 @@ export class WrfViewerComponent implements OnInit
     const wind_direction = feature.get('wind_direction');
     const wind_speed = feature.get('wind_speed');
     // rotate arrow away from wind origin
-    const angle = ((parseFloat(wind_direction) - 180) * Math.PI) / 180;
-    const scale = vectorScale * parseFloat(wind_speed) / 10;
+    const angle = ((Number(wind_direction) - 180) * Math.PI) / 180;
+    const scale = vectorScale * Number(wind_speed) / 10;
     shaft.setScale([1, scale]);
     shaft.setRotation(angle);
     head.setDisplacement([